@@ -0,0 +1,149 @@
+"""ASGI-обёртка над WSGI-обработчиком Django.
+
+Django 2.2 не умеет ни ASGI, ни асинхронные view, поэтому запрос
+обрабатывается обычным кодом в пуле из ASGI_THREADS потоков. Цикл
+событий при этом держит соединения сам: медленные клиенты, загрузка
+тела запроса и отдача ответа не занимают поток Django, поток занят
+только на время работы view.
+
+Асинхронных view здесь нет: view по-прежнему синхронные и читают
+данные последовательно в своём потоке.
+"""
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+
+
+class WsgiToAsgi:
+
+    def __init__(self, wsgi_application, max_workers=None):
+        self.wsgi_application = wsgi_application
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.ASGI_THREADS,
+            thread_name_prefix='asgi',
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError(f'Неподдерживаемый тип соединения: '
+                             f'{scope["type"]}')
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(
+                self.executor, self.run_wsgi, scope, body, send, loop)
+        finally:
+            body.close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=True)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """Тело запроса целиком; большое уходит во временный файл.
+
+        None - клиент отключился, не дождавшись ответа.
+        """
+        body = SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    def run_wsgi(self, scope, body, send, loop):
+        """Выполняется в потоке пула: вызывает Django и отдаёт ответ.
+
+        Каждая часть ответа ждёт, пока цикл событий её отправит, так что
+        поток не накапливает в памяти ответ быстрее, чем читает клиент.
+        """
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        response = {'started': False}
+
+        def start_response(status, headers, exc_info=None):
+            response['status'] = int(status.split(' ', 1)[0])
+            response['headers'] = [
+                (name.lower().encode('latin1'), value.encode('latin1'))
+                for name, value in headers
+            ]
+            return lambda data: None
+
+        def start():
+            if not response['started']:
+                response['started'] = True
+                send_message({'type': 'http.response.start',
+                              'status': response['status'],
+                              'headers': response['headers']})
+
+        result = self.wsgi_application(build_environ(scope, body),
+                                       start_response)
+        try:
+            for chunk in result:
+                if chunk:
+                    start()
+                    send_message({'type': 'http.response.body',
+                                  'body': chunk, 'more_body': True})
+        finally:
+            close = getattr(result, 'close', None)
+            if close is not None:
+                close()
+        start()
+        send_message({'type': 'http.response.body', 'body': b''})
+
+
+def build_environ(scope, body):
+    """WSGI environ для ASGI-запроса."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # WSGI передаёт путь байтами, упакованными в latin-1.
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f'HTTP/{scope.get("http_version", "1.1")}',
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        value = value.decode('latin1')
+        if name in environ:
+            # Cookie по RFC 6265 склеиваются через "; ", остальные
+            # повторённые заголовки - через запятую.
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = f'{environ[name]}{separator}{value}'
+        environ[name] = value
+    return environ
@@ -0,0 +1,50 @@
+"""SQLite, настроенный для одновременной работы читателей и писателей.
+
+Поверх стандартного бэкенда при каждом подключении включаются WAL
+(читатели не ждут писателя), synchronous=NORMAL, mmap, таймаут
+ожидания блокировки и увеличенный страничный кеш. Транзакции
+открываются через BEGIN IMMEDIATE: блокировку на запись транзакция
+берёт сразу и при занятой базе ждёт busy_timeout, а не падает
+с "database is locked", пытаясь повысить блокировку посреди работы.
+
+Всё настраивается через OPTIONS:
+
+    'OPTIONS': {
+        'pragmas': {'mmap_size': 0},
+        'transaction_mode': 'DEFERRED',
+    }
+"""
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    default_pragmas = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'mmap_size': 128 * 1024 * 1024,
+        # Отрицательное значение - размер в КиБ, а не в страницах.
+        'cache_size': -32 * 1024,
+        'temp_store': 'MEMORY',
+    }
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {**self.default_pragmas, **kwargs.pop('pragmas', {})}
+        self.transaction_mode = kwargs.pop(
+            'transaction_mode', 'IMMEDIATE').upper()
+        if self.transaction_mode not in TRANSACTION_MODES:
+            raise ValueError(
+                f'transaction_mode должен быть одним из {TRANSACTION_MODES}')
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,84 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+# Реплика, с которой читает текущий запрос; None - основная база.
+current_replica = ContextVar('current_replica', default=None)
+
+PIN_COOKIE = 'pin_primary'
+
+# Сессии и пользователи всегда читаются с основной базы: отставшая
+# реплика не знает о свежем входе, и Django удалил бы куку сессии.
+PRIMARY_ONLY_APPS = ('auth', 'sessions')
+
+
+class ReplicaRouter:
+    """Отправляет чтение на реплику внутри view с @replica_reads.
+
+    Запись и всё, что выполняется вне таких view, идёт в default.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return 'default'
+        return current_replica.get()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+
+def replica_reads(view):
+    """Разрешает view читать с одной из DATABASE_REPLICAS.
+
+    Если пользователь недавно что-то записал (есть кука PIN_COOKIE),
+    запрос читает с основной базы, чтобы увидеть свои изменения
+    несмотря на отставание реплик.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if (not settings.DATABASE_REPLICAS
+                or request.method not in ('GET', 'HEAD')
+                or PIN_COOKIE in request.COOKIES):
+            return view(request, *args, **kwargs)
+        token = current_replica.set(random.choice(settings.DATABASE_REPLICAS))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            current_replica.reset(token)
+    return wrapper
+
+
+@contextmanager
+def primary_reads():
+    """Читает с основной базы даже внутри view с @replica_reads."""
+    token = current_replica.set(None)
+    try:
+        yield
+    finally:
+        current_replica.reset(token)
+
+
+class ReadYourWritesMiddleware:
+    """После изменяющего запроса закрепляет клиента за основной базой.
+
+    Кука живёт REPLICA_PIN_SECONDS - столько, сколько репликам нужно,
+    чтобы догнать основную базу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (settings.DATABASE_REPLICAS
+                and request.method not in ('GET', 'HEAD', 'OPTIONS')):
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,100 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+# Статистика текущего запроса, её дополняет шаблонный backend.
+current_stats = ContextVar('query_budget_stats', default=None)
+
+IN_LIST_RE = re.compile(r'IN \((?:%s, )*%s\)')
+
+
+class RequestStats:
+    """Работа с базой и шаблонами за один запрос."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.fingerprints = Counter()
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self) -> dict:
+        """Запросы одного вида, выполненные больше одного раза."""
+        return {sql: count for sql, count in self.fingerprints.items()
+                if count > 1}
+
+    @property
+    def total_time(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        return ', '.join((
+            f'db;desc="{self.queries} queries";dur={self.sql_time * 1000:.1f}',
+            f'dup;desc="{sum(self.duplicates.values())} duplicate queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ))
+
+
+def fingerprint(sql: str) -> str:
+    """Вид запроса: SQL с плейсхолдерами, списки IN схлопнуты."""
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+class QueryBudgetMiddleware:
+    """Считает запросы, время SQL и шаблонов для каждого запроса.
+
+    Итоги уходят в заголовок Server-Timing и строку лога, а
+    request.query_stats доступен тестам. Если view превысила
+    бюджет из QUERY_BUDGETS, в лог пишется предупреждение.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        request.query_stats = stats
+        token = current_stats.set(stats)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(stats.record_query))
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+
+        if settings.QUERY_BUDGET_HEADER:
+            response['Server-Timing'] = stats.server_timing()
+        view_name = getattr(request.resolver_match, 'view_name', None)
+        budget = settings.QUERY_BUDGETS.get(view_name)
+        over_budget = budget is not None and stats.queries > budget
+        logger.log(
+            logging.WARNING if over_budget else logging.INFO,
+            '%s %s %s %s queries=%d/%s dup=%d sql=%.1fms tpl=%.1fms '
+            'total=%.1fms',
+            request.method, request.path, view_name, response.status_code,
+            stats.queries, budget if budget is not None else '-',
+            sum(stats.duplicates.values()), stats.sql_time * 1000,
+            stats.template_time * 1000, stats.total_time * 1000,
+        )
+        return response
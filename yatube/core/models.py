@@ -11,3 +11,14 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class RateLimitBucket(models.Model):
+    """Ведро token bucket для core.ratelimit.DatabaseStorage."""
+    key = models.CharField(max_length=200, unique=True)
+    tokens = models.FloatField()
+    # Время последнего пополнения, секунды с начала эпохи.
+    updated = models.FloatField()
+
+    def __str__(self):
+        return self.key
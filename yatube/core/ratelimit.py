@@ -0,0 +1,120 @@
+import math
+import threading
+import time
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from .models import RateLimitBucket
+from .views import too_many_requests
+
+BUCKET_KEY = 'ratelimit:{scope}:{client}'
+
+
+class CacheStorage:
+    """Вёдра в кеше Django: запрос - одно чтение и одна запись.
+
+    Вёдра общие ровно настолько, насколько общий кеш. С LocMemCache из
+    настроек по умолчанию у каждого процесса свои вёдра, и под
+    N процессами сервера клиент получает до N * capacity запросов за
+    period. Для общего лимита нужен общий кеш (Memcached, Redis) или
+    DatabaseStorage.
+
+    Чтение и запись не атомарны между процессами, поэтому при гонке
+    клиент может получить лишний жетон. Внутри процесса вёдра
+    защищены блокировкой.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, period, now):
+        with self._lock:
+            tokens, stamp = cache.get(key, (capacity, now))
+            tokens, allowed = _refill_and_take(
+                tokens, stamp, capacity, period, now)
+            cache.set(key, (tokens, now), period)
+        return allowed, _retry_after(tokens, capacity, period)
+
+
+class DatabaseStorage:
+    """Вёдра в таблице core.RateLimitBucket.
+
+    Точнее кеша при нескольких процессах: ведро читается и
+    обновляется в одной транзакции, а на SQLite она начинается с
+    BEGIN IMMEDIATE, см. core.backends.sqlite3. Зато каждый запрос
+    пишет в базу.
+    """
+
+    def take(self, key, capacity, period, now):
+        with transaction.atomic():
+            bucket, _ = RateLimitBucket.objects.select_for_update(
+            ).get_or_create(
+                key=key, defaults={'tokens': capacity, 'updated': now})
+            bucket.tokens, allowed = _refill_and_take(
+                bucket.tokens, bucket.updated, capacity, period, now)
+            bucket.updated = now
+            bucket.save(update_fields=('tokens', 'updated'))
+        return allowed, _retry_after(bucket.tokens, capacity, period)
+
+
+def get_storage():
+    return _load_storage(settings.RATE_LIMIT_STORAGE)
+
+
+@lru_cache(maxsize=None)
+def _load_storage(path):
+    return import_string(path)()
+
+
+def rate_limit(scope, methods=None):
+    """Ограничивает частоту запросов к view алгоритмом token bucket.
+
+    Лимит берётся из settings.RATE_LIMITS[scope] парой (capacity,
+    period): в ведре до capacity жетонов, за period секунд оно
+    наполняется целиком. Запрос тратит жетон; если ведро пусто,
+    отвечает core.views.too_many_requests со статусом 429. Ведро своё
+    у каждого пользователя, у анонима - у IP. methods - какие методы
+    расходуют жетоны, None - все. Одна scope на нескольких view
+    делит между ними одно ведро.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            limit = settings.RATE_LIMITS.get(scope)
+            if limit is None or (
+                    methods is not None and request.method not in methods):
+                return view(request, *args, **kwargs)
+            capacity, period = limit
+            allowed, retry_after = get_storage().take(
+                BUCKET_KEY.format(scope=scope, client=_client(request)),
+                capacity, period, time.time())
+            if not allowed:
+                return too_many_requests(request, retry_after)
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _client(request) -> str:
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def _refill_and_take(tokens, stamp, capacity, period, now):
+    tokens = min(capacity,
+                 tokens + max(now - stamp, 0) * capacity / period)
+    if tokens < 1:
+        return tokens, False
+    return tokens - 1, True
+
+
+def _retry_after(tokens, capacity, period) -> int:
+    """Через сколько секунд в ведре появится жетон."""
+    if tokens >= 1:
+        return 0
+    return math.ceil((1 - tokens) * period / capacity)
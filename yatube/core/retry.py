@@ -0,0 +1,41 @@
+import logging
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+logger = logging.getLogger(__name__)
+
+
+def is_locked_error(error: Exception) -> bool:
+    return (isinstance(error, OperationalError)
+            and 'database is locked' in str(error))
+
+
+def retry_on_locked(func):
+    """Повторяет функцию, если SQLite ответил "database is locked".
+
+    Декоратор ставится снаружи transaction.atomic: повторять имеет
+    смысл только целую транзакцию, уже откаченную к этому моменту.
+    Внутри чужой транзакции ошибка пробрасывается сразу. Между
+    попытками - экспоненциальная пауза со случайным разбросом,
+    чтобы писатели не просыпались одновременно.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        retries = settings.DB_LOCKED_RETRIES
+        for attempt in range(retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except OperationalError as error:
+                if (not is_locked_error(error) or attempt == retries
+                        or connection.in_atomic_block):
+                    raise
+                delay = (settings.DB_LOCKED_RETRY_DELAY * 2 ** attempt
+                         * random.uniform(0.5, 1.5))
+                logger.warning('%s: база занята, повтор через %.0f мс',
+                               func.__qualname__, delay * 1000)
+                time.sleep(delay)
+    return wrapper
@@ -0,0 +1,27 @@
+from django.conf import settings
+
+
+class QueryBudgetMixin:
+    """Проверки бюджета запросов для TestCase.
+
+    Опирается на request.query_stats, который заполняет
+    core.middleware.QueryBudgetMiddleware.
+    """
+
+    def assertQueryBudget(self, response, budget=None, max_duplicates=0):
+        request = response.wsgi_request
+        stats = request.query_stats
+        view_name = request.resolver_match.view_name
+        if budget is None:
+            budget = settings.QUERY_BUDGETS[view_name]
+        self.assertLessEqual(
+            stats.queries, budget,
+            f'{view_name} выполнила {stats.queries} запросов '
+            f'при бюджете {budget}',
+        )
+        if max_duplicates is not None:
+            duplicates = stats.duplicates
+            self.assertLessEqual(
+                sum(duplicates.values()), max_duplicates,
+                f'{view_name} повторяет запросы: {duplicates}',
+            )
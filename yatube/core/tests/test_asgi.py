@@ -0,0 +1,69 @@
+import asyncio
+from http import HTTPStatus
+from io import BytesIO
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import SimpleTestCase
+
+from ..asgi import WsgiToAsgi, build_environ
+
+
+class AsgiTests(SimpleTestCase):
+
+    def call(self, messages, path='/about/author/'):
+        """Прогоняет запрос через ASGI-приложение, возвращает ответ."""
+        application = WsgiToAsgi(WSGIHandler(), max_workers=2)
+        self.addCleanup(application.executor.shutdown)
+        messages = list(messages)
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path,
+                 'query_string': b'', 'headers': [(b'host', b'testserver')]}
+        asyncio.run(application(scope, receive, send))
+        return sent
+
+    def test_response_streamed_through_event_loop(self):
+        """Страница отдаётся через ASGI целиком."""
+        sent = self.call([{'type': 'http.request', 'body': b''}])
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+        self.assertEqual(sent[0]['status'], HTTPStatus.OK)
+        self.assertIn((b'content-type', b'text/html; charset=utf-8'),
+                      sent[0]['headers'])
+        self.assertFalse(sent[-1].get('more_body', False))
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        self.assertIn('Об авторе'.encode(), body)
+
+    def test_disconnect_before_body(self):
+        """Ушедший клиент не занимает поток Django."""
+        self.assertEqual(self.call([{'type': 'http.disconnect'}]), [])
+
+    def test_environ(self):
+        scope = {
+            'type': 'http', 'method': 'POST', 'path': '/поиск/',
+            'query_string': b'q=1', 'http_version': '1.1',
+            'server': ('example.com', 8000), 'client': ('10.0.0.1', 5000),
+            'headers': [(b'content-type', b'text/plain'),
+                        (b'content-length', b'4'),
+                        (b'accept', b'text/html'),
+                        (b'accept', b'*/*'),
+                        (b'cookie', b'sessionid=abc'),
+                        (b'cookie', b'csrftoken=xyz')],
+        }
+        environ = build_environ(scope, BytesIO(b'body'))
+        self.assertEqual(environ['PATH_INFO'].encode('latin1').decode(),
+                         '/поиск/')
+        self.assertEqual(environ['QUERY_STRING'], 'q=1')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['CONTENT_LENGTH'], '4')
+        self.assertEqual(environ['HTTP_ACCEPT'], 'text/html,*/*')
+        self.assertEqual(environ['HTTP_COOKIE'],
+                         'sessionid=abc; csrftoken=xyz')
+        self.assertEqual(environ['SERVER_PORT'], '8000')
+        self.assertEqual(environ['REMOTE_ADDR'], '10.0.0.1')
+        self.assertEqual(environ['wsgi.input'].read(), b'body')
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import router
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..db_router import PIN_COOKIE, replica_reads
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='writer')
+        cls.post = Post.objects.create(text='Пост', author=cls.user)
+
+    @staticmethod
+    def routed_view(request):
+        return {model: router.db_for_read(model) for model in (Post, User)}
+
+    def call(self, method='get', **cookies):
+        request = getattr(RequestFactory(), method)('/')
+        request.COOKIES.update(cookies)
+        return replica_reads(self.routed_view)(request)
+
+    def test_feed_reads_go_to_replica(self):
+        """Ленты читают посты с реплики, пользователей - с основной."""
+        self.assertEqual(self.call(), {Post: 'replica', User: 'default'})
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+    def test_pinned_and_unsafe_requests_use_primary(self):
+        """После записи и на POST чтение идёт с основной базы."""
+        self.assertEqual(self.call(**{PIN_COOKIE: '1'})[Post], 'default')
+        self.assertEqual(self.call(method='post')[Post], 'default')
+
+    def test_write_pins_client_to_primary(self):
+        """Изменяющий запрос ставит куку на REPLICA_PIN_SECONDS."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'})
+        cookie = response.cookies[PIN_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas_nothing_changes(self):
+        """Без реплик всё читается с основной базы и кука не ставится."""
+        self.assertEqual(self.call()[Post], 'default')
+        response = self.client.post(reverse('posts:post_create'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
@@ -0,0 +1,85 @@
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Post, User
+
+from ..models import RateLimitBucket
+from ..ratelimit import CacheStorage, DatabaseStorage
+
+
+@override_settings(RATE_LIMITS={'post_create': (2, 60), 'follow': (1, 60)})
+class RateLimitTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='limited')
+        cls.author = User.objects.create_user(username='limited_author')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_post_create_limited(self):
+        """Лишний пост получает 429, открытие формы жетонов не тратит."""
+        url = reverse('posts:post_create')
+        for _ in range(3):
+            self.assertEqual(self.client.get(url).status_code, HTTPStatus.OK)
+        for number in range(2):
+            response = self.client.post(url, {'text': f'Пост {number}'})
+            self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        response = self.client.post(url, {'text': 'Лишний'})
+        self.assertEqual(response.status_code,
+                         HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertTemplateUsed(response, 'core/429.html')
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertFalse(Post.objects.filter(text='Лишний').exists())
+
+    @override_settings(RATE_LIMITS={'add_comment': (1, 60)})
+    def test_comment_get_not_limited(self):
+        """GET на адрес комментария только перенаправляет, жетон цел."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        url = reverse('posts:add_comment', kwargs={'post_id': post.pk})
+        for _ in range(2):
+            self.assertEqual(self.client.get(url).status_code,
+                             HTTPStatus.FOUND)
+        self.client.post(url, {'text': 'Комментарий'})
+        self.assertTrue(Comment.objects.filter(post=post).exists())
+
+    def test_follow_and_unfollow_share_bucket(self):
+        kwargs = {'username': self.author.username}
+        self.client.get(reverse('posts:profile_follow', kwargs=kwargs))
+        response = self.client.get(
+            reverse('posts:profile_unfollow', kwargs=kwargs))
+        self.assertEqual(response.status_code,
+                         HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertTrue(Follow.objects.filter(
+            user=self.user, author=self.author).exists())
+        other = Client()
+        other.force_login(self.author)
+        response = other.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.user}))
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+
+    def test_storages_refill_bucket(self):
+        """Ведро пополняется со временем одинаково в кеше и в базе."""
+        for storage in (CacheStorage(), DatabaseStorage()):
+            with self.subTest(storage=type(storage).__name__):
+                take = storage.take
+                self.assertEqual(take('bucket', 2, 10, 100), (True, 0))
+                self.assertEqual(take('bucket', 2, 10, 100), (True, 5))
+                self.assertEqual(take('bucket', 2, 10, 101), (False, 4))
+                self.assertEqual(take('bucket', 2, 10, 105), (True, 5))
+        self.assertEqual(RateLimitBucket.objects.get().tokens, 0)
+
+    @override_settings(RATE_LIMIT_STORAGE='core.ratelimit.DatabaseStorage')
+    def test_database_storage(self):
+        url = reverse('posts:post_create')
+        for number in range(3):
+            response = self.client.post(url, {'text': f'Пост {number}'})
+        self.assertEqual(response.status_code,
+                         HTTPStatus.TOO_MANY_REQUESTS)
+        self.assertEqual(RateLimitBucket.objects.get().key,
+                         f'ratelimit:post_create:user:{self.user.pk}')
@@ -0,0 +1,34 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import User
+
+from ..testing import QueryBudgetMixin
+
+
+class QueryBudgetMixinTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='budget')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_budget_exceeded(self):
+        """Лишний запрос валит проверку с именем view в сообщении."""
+        response = self.client.get(reverse('posts:index'))
+        queries = response.wsgi_request.query_stats.queries
+        self.assertQueryBudget(response, budget=queries)
+        with self.assertRaisesMessage(AssertionError, 'posts:index'):
+            self.assertQueryBudget(response, budget=queries - 1)
+
+    @override_settings(QUERY_BUDGET_HEADER=True)
+    def test_server_timing_header(self):
+        """Итоги запроса отдаются в заголовке Server-Timing."""
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        queries = response.wsgi_request.query_stats.queries
+        self.assertIn(f'db;desc="{queries} queries"', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertGreater(response.wsgi_request.query_stats.template_time, 0)
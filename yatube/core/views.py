@@ -14,6 +14,14 @@ def permission_denied(request, exception):
     return render(request, 'core/403.html', {'path': request.path}, status=403)
 
 
+def too_many_requests(request, retry_after):
+    response = render(request, 'core/429.html',
+                      {'path': request.path, 'retry_after': retry_after},
+                      status=429)
+    response['Retry-After'] = str(retry_after)
+    return response
+
+
 def server_error(request):
     return render(HttpResponseServerError, 'core/500.html',
                   {'path': request.path}, status=500)
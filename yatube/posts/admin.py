@@ -1,9 +1,65 @@
+from collections import Counter
+
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db import transaction
 
+from . import (cache_tags, counters, follow_graph, groups, hot, page_cache,
+               timeline)
 from .models import Post, Group, Follow, Comment
+from .utils import EstimatedCountPaginator
+
+
+class ScalableAdmin(admin.ModelAdmin):
+    """Список без COUNT(*) по всей таблице и без N+1 в __str__."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+
+class PreloadedAutocompleteSelect(AutocompleteSelect):
+    """AutocompleteSelect, которому форма передаёт выбранный объект.
+
+    Стандартный виджет достаёт подпись выбранного значения отдельным
+    запросом, в list_editable - на каждую строку списка.
+    """
+    preloaded = None
+
+    def optgroups(self, name, value, attr=None):
+        if self.preloaded is None:
+            return super().optgroups(name, value, attr)
+        options = []
+        if not self.is_required:
+            options.append(self.create_option(name, '', '', False, 0))
+        if str(self.preloaded.pk) in value:
+            options.append(self.create_option(
+                name, self.preloaded.pk,
+                self.choices.field.label_from_instance(self.preloaded),
+                True, len(options)))
+        return [(None, options, 0)]
 
 
-class PostAdmin(admin.ModelAdmin):
+class PostChangeListForm(forms.ModelForm):
+    """Строка списка постов: группа уже загружена list_select_related."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        widget = self.fields['group'].widget
+        widget = getattr(widget, 'widget', widget)
+        if self.instance.group_id is not None:
+            widget.preloaded = self.instance.group
+
+
+@admin.register(Group)
+class GroupAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'title', 'slug', 'posts_count')
+    search_fields = ('title', 'slug')
+    readonly_fields = ('posts_count',)
+
+
+@admin.register(Post)
+class PostAdmin(ScalableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,13 +67,118 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     list_editable = ('group',)
+    date_hierarchy = 'pub_date'
+    raw_id_fields = ('author',)
+    autocomplete_fields = ('group',)
+    readonly_fields = ('comments_count',)
     empty_value_display = '-пусто-'
+    actions = ('remove_from_group',)
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'group':
+            kwargs['widget'] = PreloadedAutocompleteSelect(
+                db_field.remote_field, self.admin_site,
+                using=kwargs.get('using'))
+        return super().formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def get_changelist_form(self, request, **kwargs):
+        kwargs.setdefault('form', PostChangeListForm)
+        return super().get_changelist_form(request, **kwargs)
+
+    @transaction.atomic
+    def remove_from_group(self, request, queryset):
+        """Убирает посты из групп одним UPDATE.
+
+        update() не шлёт сигналов, поэтому счётчики групп и кеш страниц
+        и каталога групп поправляются здесь же.
+        """
+        queryset = queryset.exclude(group=None)
+        rows = list(queryset.values_list(
+            'pk', 'group_id', 'group__slug', 'author__username', 'author_id'))
+        updated = queryset.update(group=None)
+        counters.posts_ungrouped(Counter(row[1] for row in rows))
+        groups.posts_ungrouped(Counter((row[1], row[4]) for row in rows))
+        tags = {page_cache.GLOBAL_FEED_TAG}
+        for post_id, _, slug, username, _ in rows:
+            tags |= {page_cache.post_tag(post_id), page_cache.group_tag(slug),
+                     page_cache.author_tag(username)}
+        cache_tags.purge(*tags)
+        self.message_user(request, f'Убрано из групп постов: {updated}.')
+    remove_from_group.short_description = 'Убрать из группы'
+
+
+@admin.register(Comment)
+class CommentAdmin(ScalableAdmin):
+    list_display = ('pk', 'text', 'author', 'post', 'pub_date')
+    list_select_related = ('author', 'post')
+    search_fields = ('text',)
+    raw_id_fields = ('author', 'post')
+    actions = ('delete_comments',)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Стандартное удаление сначала строит страницу подтверждения со
+        # строкой на каждый комментарий.
+        actions.pop('delete_selected', None)
+        return actions
+
+    @transaction.atomic
+    def delete_comments(self, request, queryset):
+        """Удаляет комментарии одним DELETE без страницы подтверждения.
+
+        QuerySet.delete() слал бы post_delete на каждую строку, и
+        счётчики с счётом популярности правились бы по комментарию.
+        Здесь то же, что делают обработчики в posts.signals, выполняется
+        пачкой: число запросов не зависит от числа комментариев.
+        """
+        rows = list(queryset.values_list('post_id', 'pub_date'))
+        deleted = queryset._raw_delete(queryset.db)
+        counters.comments_deleted(Counter(post_id for post_id, _ in rows))
+        hot.comments_removed(rows)
+        cache_tags.purge(*{page_cache.post_tag(post_id)
+                           for post_id, _ in rows})
+        self.message_user(request, f'Удалено комментариев: {deleted}.')
+    delete_comments.short_description = 'Удалить выбранные комментарии'
+    delete_comments.allowed_permissions = ('delete',)
+
+
+@admin.register(Follow)
+class FollowAdmin(ScalableAdmin):
+    list_display = ('pk', 'user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    raw_id_fields = ('user', 'author')
+    actions = ('delete_follows',)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
 
+    @transaction.atomic
+    def delete_follows(self, request, queryset):
+        """Удаляет подписки одним DELETE без страницы подтверждения.
 
-admin.site.register(Post, PostAdmin)
-admin.site.register(Group)
-admin.site.register(Follow)
-admin.site.register(Comment)
+        Всё, что при отписке делают сигналы, - счётчики, ленты, кеш
+        подписок и страниц профилей - выполняется пачкой.
+        """
+        rows = list(queryset.values_list(
+            'user_id', 'author_id', 'user__username', 'author__username'))
+        deleted = queryset._raw_delete(queryset.db)
+        pairs = [(user_id, author_id) for user_id, author_id, _, _ in rows]
+        user_ids = {user_id for user_id, _ in pairs}
+        author_ids = {author_id for _, author_id in pairs}
+        counters.follows_deleted(pairs)
+        timeline.followers_changed(*author_ids)
+        timeline.prune_unfollowed(user_ids, author_ids)
+        follow_graph.invalidate(*user_ids)
+        cache_tags.purge(*{
+            page_cache.author_tag(username)
+            for _, _, user, author in rows for username in (user, author)})
+        self.message_user(request, f'Удалено подписок: {deleted}.')
+    delete_follows.short_description = 'Удалить выбранные подписки'
+    delete_follows.allowed_permissions = ('delete',)
@@ -0,0 +1,142 @@
+"""JSON-версия лент для мобильного клиента.
+
+Те же выборки, что у index, group_posts и profile, но без шаблонов
+и без экземпляров моделей: посты читаются через values() только
+с запрошенными колонками (?fields=id,text,author) и листаются
+курсором (?cursor=..., ?limit=...). Ответы кешируются и отдают 304
+по тем же тегам, что и HTML-страницы.
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import JsonResponse
+
+from core.db_router import replica_reads
+
+from .models import Group, ImageVariant, Post, User
+from .page_cache import (GLOBAL_FEED_TAG, USERS_TAG, author_tag,
+                         cache_public_page, group_tag)
+from .utils import CursorPaginator
+
+# Поле ответа -> путь для values().
+FIELDS = {
+    'id': 'id',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+}
+# Нужны курсору, поэтому выбираются всегда.
+CURSOR_FIELDS = ('id', 'pub_date')
+
+
+@replica_reads
+@cache_public_page(lambda: [GLOBAL_FEED_TAG, USERS_TAG])
+def index(request):
+    return feed_response(request, Post.objects.all())
+
+
+@replica_reads
+@cache_public_page(lambda slug: [group_tag(slug), USERS_TAG])
+def group_posts(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'id', flat=True).first()
+    if group_id is None:
+        return error_response('Группа не найдена.', status=404)
+    return feed_response(request, Post.objects.filter(group_id=group_id))
+
+
+@replica_reads
+@cache_public_page(lambda username: [author_tag(username)])
+def profile(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'id', flat=True).first()
+    if author_id is None:
+        return error_response('Автор не найден.', status=404)
+    return feed_response(request, Post.objects.filter(author_id=author_id))
+
+
+def feed_response(request, posts):
+    """Страница постов в JSON со ссылками на соседние страницы."""
+    try:
+        fields = parse_fields(request.GET.get('fields'))
+        limit = parse_limit(request.GET.get('limit'))
+    except ValueError as error:
+        return error_response(str(error))
+    columns = {FIELDS[name] for name in (*fields, *CURSOR_FIELDS)}
+    page = CursorPaginator(posts.values(*columns), limit).get_page(
+        request.GET.get('cursor'))
+    variants = (get_variants([row['id'] for row in page if row['image']])
+                if 'image' in fields else {})
+    return json_response({
+        'results': [serialize(row, fields, variants) for row in page],
+        'next': page_url(request, page.next_cursor),
+        'previous': page_url(request, page.previous_cursor),
+    })
+
+
+def parse_fields(value):
+    if not value:
+        return list(FIELDS)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown:
+        raise ValueError(f'Неизвестные поля: {", ".join(unknown)}.')
+    return fields
+
+
+def parse_limit(value):
+    if not value:
+        return settings.COUNT_OF_POSTS_DEFAULT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise ValueError('limit должен быть числом.') from None
+    if not 1 <= limit <= settings.API_MAX_LIMIT:
+        raise ValueError(
+            f'limit должен быть от 1 до {settings.API_MAX_LIMIT}.')
+    return limit
+
+
+def get_variants(post_ids):
+    """post_id -> готовые варианты картинки, одним запросом."""
+    variants = {}
+    rows = ImageVariant.objects.filter(post_id__in=post_ids).values(
+        'post_id', 'format', 'width', 'height', 'image').order_by('width')
+    for row in rows:
+        variants.setdefault(row['post_id'], []).append({
+            'format': row['format'],
+            'width': row['width'],
+            'height': row['height'],
+            'url': default_storage.url(row['image']),
+        })
+    return variants
+
+
+def serialize(row, fields, variants):
+    data = {name: row[FIELDS[name]] for name in fields}
+    if data.get('image'):
+        data['image'] = {
+            'url': default_storage.url(row['image']),
+            'variants': variants.get(row['id'], []),
+        }
+    elif 'image' in data:
+        data['image'] = None
+    return data
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+
+
+def error_response(message, status=400):
+    return json_response({'detail': message}, status=status)
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status,
+                        json_dumps_params={'ensure_ascii': False})
@@ -0,0 +1,326 @@
+"""Нагрузочный прогон лент и форм через тестовый клиент.
+
+seed() наполняет базу данными заданного объёма через mixer, run()
+гоняет сценарии и собирает p50/p95 времени ответа, число запросов
+и пиковый объём выделенной памяти, compare() сравнивает результаты
+с сохранённым эталоном.
+
+concurrency() отдельно от HTTP нагружает SQLite параллельными
+писателями и читателями и сравнивает настройки бэкенда.
+"""
+import os
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from io import BytesIO
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import OperationalError, connections, transaction
+from django.db.models import F
+from django.test import Client, override_settings
+from django.urls import reverse
+from faker import Faker
+from mixer.backend.django import mixer
+from PIL import Image
+
+from core.retry import is_locked_error
+
+from . import thumbnails
+from .models import Comment, Follow, Group, Post, User
+
+
+@dataclass
+class Volumes:
+    users: int = 50
+    groups: int = 5
+    follows: int = 200
+    posts: int = 500
+    images: float = 0.2
+    comments: int = 1000
+
+
+@dataclass
+class Result:
+    p50: float
+    p95: float
+    queries: int
+    alloc_kib: float
+
+
+def seed(volumes: Volumes, seed_value: int = 0) -> None:
+    """Создаёт пользователей, группы, подписки, посты и комментарии."""
+    rng = random.Random(seed_value)
+    Faker.seed(seed_value)
+    users = [
+        mixer.blend(User, username=f'bench{number}')
+        for number in range(volumes.users)
+    ]
+    groups = [
+        mixer.blend(Group, slug=f'bench-{number}')
+        for number in range(volumes.groups)
+    ]
+    pairs = {(reader.pk, author.pk)
+             for reader, author in ((rng.choice(users), rng.choice(users))
+                                    for _ in range(volumes.follows))
+             if reader != author}
+    for user_id, author_id in sorted(pairs):
+        Follow.objects.create(user_id=user_id, author_id=author_id)
+    image = _image_content()
+    posts = []
+    for _ in range(volumes.posts):
+        post = mixer.blend(
+            Post, author=rng.choice(users),
+            group=rng.choice(groups + [None]), image='')
+        if rng.random() < volumes.images:
+            # Как после загрузки через форму: миниатюры и варианты готовы.
+            post.image.save('bench.png', ContentFile(image))
+            thumbnails.pregenerate(post.image.name)
+        posts.append(post)
+    for _ in range(volumes.comments):
+        mixer.blend(Comment, post=rng.choice(posts), author=rng.choice(users))
+
+
+def scenarios(rng):
+    """Сценарии: имя -> (метод, функция URL, функция данных)."""
+    def random_post():
+        return rng.choice(post_ids)
+
+    post_ids = list(Post.objects.values_list('id', flat=True))
+    slugs = list(Group.objects.values_list('slug', flat=True))
+    usernames = list(User.objects.filter(
+        username__startswith='bench').values_list('username', flat=True))
+    return {
+        'index': ('get', lambda: reverse('posts:index'), None),
+        'group_posts': ('get', lambda: reverse(
+            'posts:group_list', kwargs={'slug': rng.choice(slugs)}), None),
+        'profile': ('get', lambda: reverse(
+            'posts:profile',
+            kwargs={'username': rng.choice(usernames)}), None),
+        'post_detail': ('get', lambda: reverse(
+            'posts:post_detail', kwargs={'post_id': random_post()}), None),
+        'follow_index': ('get', lambda: reverse('posts:follow_index'), None),
+        'post_create': ('post', lambda: reverse('posts:post_create'),
+                        lambda: {'text': f'Новый пост {rng.random()}'}),
+        'add_comment': ('post', lambda: reverse(
+            'posts:add_comment', kwargs={'post_id': random_post()}),
+            lambda: {'text': f'Комментарий {rng.random()}'}),
+    }
+
+
+def run(iterations: int = 50, warmup: int = 5, alloc_iterations: int = 10,
+        only=None, seed_value: int = 0) -> dict:
+    """Гоняет сценарии от имени самого активного читателя.
+
+    Страницы читаются авторизованным клиентом, то есть мимо кеша
+    страниц для анонимов: измеряется работа view, а не кеша. Лимиты
+    частоты запросов на время прогона отключены, иначе формы после
+    первых запросов отвечали бы 429.
+    """
+    with override_settings(RATE_LIMITS={}):
+        return _run(iterations, warmup, alloc_iterations, only, seed_value)
+
+
+def _run(iterations, warmup, alloc_iterations, only, seed_value) -> dict:
+    rng = random.Random(seed_value)
+    reader = User.objects.filter(username__startswith='bench').order_by(
+        '-stats__following_count').first()
+    client = Client()
+    client.force_login(reader)
+    results = {}
+    for name, (method, get_url, get_data) in scenarios(rng).items():
+        if only and name not in only:
+            continue
+        request = getattr(client, method)
+
+        def call():
+            data = get_data() if get_data else None
+            return request(get_url(), data)
+
+        cache.clear()
+        for _ in range(warmup):
+            call()
+        durations, queries = [], []
+        for _ in range(iterations):
+            cache.clear()
+            started = time.perf_counter()
+            response = call()
+            durations.append((time.perf_counter() - started) * 1000)
+            queries.append(response.wsgi_request.query_stats.queries)
+        results[name] = Result(
+            p50=statistics.median(durations),
+            p95=_percentile(durations, 95),
+            queries=max(queries),
+            alloc_kib=_allocations(call, alloc_iterations),
+        )
+    return {name: asdict(result) for name, result in results.items()}
+
+
+def compare(results: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """Регрессии относительно эталона: (сценарий, метрика, было, стало).
+
+    Время и память сравниваются с допуском tolerance, число
+    запросов - строго.
+    """
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ('p50', 'p95', 'alloc_kib'):
+            if current[metric] > previous[metric] * (1 + tolerance):
+                regressions.append(
+                    (name, metric, previous[metric], current[metric]))
+        if current['queries'] > previous['queries']:
+            regressions.append(
+                (name, 'queries', previous['queries'], current['queries']))
+    return regressions
+
+
+# Настройки SQLite, которые сравнивает concurrency().
+SQLITE_SETUPS = {
+    'plain': {'ENGINE': 'django.db.backends.sqlite3'},
+    'tuned': {'ENGINE': 'core.backends.sqlite3'},
+}
+
+
+@dataclass
+class ConcurrencyResult:
+    writes: int
+    reads: int
+    locked: int
+    write_p95: float
+    read_p95: float
+
+
+def concurrency(setup: str, directory: str, writers: int = 4,
+                readers: int = 4, seconds: float = 5.0,
+                posts: int = 200) -> dict:
+    """Параллельные писатели и читатели на отдельном файле SQLite.
+
+    Писатель в транзакции читает пост и добавляет к нему комментарий
+    (чтение, затем запись - как add_comment), читатель выбирает первую
+    страницу ленты. Ошибки "database is locked" не повторяются, а
+    считаются: так видно, сколько запросов упало бы без retry.
+    """
+    alias = f'concurrency_{setup}'
+    path = os.path.join(directory, f'{setup}.sqlite3')
+    connections.databases[alias] = {**SQLITE_SETUPS[setup], 'NAME': path}
+    connections.ensure_defaults(alias)
+    connections.prepare_test_settings(alias)
+    samples = {'write': [], 'read': [], 'locked': 0}
+    try:
+        post_ids, author_id = _seed_concurrency(alias, posts)
+        stop = threading.Event()
+        lock = threading.Lock()
+        threads = [
+            threading.Thread(target=_worker, args=(
+                alias, 'write', _write, (post_ids, author_id), number,
+                samples, lock, stop))
+            for number in range(writers)
+        ] + [
+            threading.Thread(target=_worker, args=(
+                alias, 'read', _read, (), number, samples, lock, stop))
+            for number in range(readers)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.databases[alias]
+    return asdict(ConcurrencyResult(
+        writes=len(samples['write']),
+        reads=len(samples['read']),
+        locked=samples['locked'],
+        write_p95=_percentile(samples['write'] or [0.0], 95),
+        read_p95=_percentile(samples['read'] or [0.0], 95),
+    ))
+
+
+def _worker(alias, kind, action, args, number, samples, lock, stop):
+    rng = random.Random(number)
+    try:
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                action(alias, rng, *args)
+            except OperationalError as error:
+                if not is_locked_error(error):
+                    raise
+                with lock:
+                    samples['locked'] += 1
+                continue
+            with lock:
+                samples[kind].append((time.perf_counter() - started) * 1000)
+    finally:
+        connections[alias].close()
+
+
+def _write(alias, rng, post_ids, author_id):
+    with transaction.atomic(using=alias):
+        post = Post.objects.using(alias).only('id').get(
+            pk=rng.choice(post_ids))
+        Comment.objects.using(alias).bulk_create([Comment(
+            post=post, author_id=author_id, text='Комментарий')])
+        Post.objects.using(alias).filter(pk=post.pk).update(
+            comments_count=F('comments_count') + 1)
+
+
+def _read(alias, rng):
+    list(Post.objects.using(alias).select_related(
+        'author', 'group').order_by('-pub_date')[:10])
+
+
+def _seed_concurrency(alias, posts):
+    """Схема и данные для concurrency(): только нужные таблицы."""
+    with connections[alias].schema_editor() as editor:
+        for model in (User, Group, Post, Comment):
+            editor.create_model(model)
+    User.objects.using(alias).bulk_create([User(username='writer')])
+    author = User.objects.using(alias).get(username='writer')
+    Post.objects.using(alias).bulk_create(
+        Post(author=author, text=f'Пост {number}') for number in range(posts))
+    return (list(Post.objects.using(alias).values_list('id', flat=True)),
+            author.pk)
+
+
+def _allocations(call, iterations) -> float:
+    # Пик сбрасывается перезапуском трассировки: tracemalloc.reset_peak()
+    # появился только в Python 3.9.
+    peaks = []
+    for _ in range(iterations):
+        cache.clear()
+        tracemalloc.start()
+        try:
+            call()
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+    return statistics.median(peaks) if peaks else 0.0
+
+
+def _percentile(values, percent) -> float:
+    """Перцентиль с линейной интерполяцией между соседними значениями.
+
+    statistics.quantiles() есть только с Python 3.8.
+    """
+    values = sorted(values)
+    position = (len(values) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (
+        position - lower)
+
+
+def _image_content() -> bytes:
+    buffer = BytesIO()
+    Image.new('RGB', (1200, 600), color=(90, 140, 200)).save(buffer, 'PNG')
+    return buffer.getvalue()
@@ -0,0 +1,50 @@
+import time
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+TAG_KEY = 'cache_tag:{}'
+
+
+def get_versions(tags) -> dict:
+    """Текущие версии тегов кеша.
+
+    Версия - метка времени последнего сброса тега в наносекундах.
+    Ключи кеша, в которые входят версии, устаревают сами собой, когда
+    тег сбрасывают.
+    """
+    keys = {TAG_KEY.format(tag): tag for tag in tags}
+    stored = cache.get_many(keys)
+    missing = {key: _stamp() for key in keys if key not in stored}
+    if missing:
+        cache.set_many(missing, None)
+        stored.update(missing)
+    return {keys[key]: version for key, version in stored.items()}
+
+
+def purged_within(versions: dict, seconds: float) -> bool:
+    """Сбрасывался ли какой-то из тегов за последние seconds секунд."""
+    return max(versions.values(), default=0) > _stamp() - seconds * 10**9
+
+
+def purge(*tags) -> None:
+    """Сбрасывает теги сразу и ещё раз после коммита транзакции.
+
+    Параллельный запрос может прочитать данные до коммита и
+    закешировать их под версией первого сброса; второй сброс делает
+    такой кеш недоступным.
+    """
+    if not tags:
+        return
+    _set_versions(tags)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _set_versions(tags))
+
+
+def _set_versions(tags) -> None:
+    stamp = _stamp()
+    cache.set_many({TAG_KEY.format(tag): stamp for tag in tags}, None)
+
+
+def _stamp() -> int:
+    return time.time_ns()
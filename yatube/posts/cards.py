@@ -0,0 +1,20 @@
+from . import cache_tags
+
+
+def card_version(post) -> str:
+    """Версия карточки поста для ключа фрагментного кеша.
+
+    Складывается из версий самого поста, его автора и группы, поэтому
+    правка любого из них делает закешированную карточку недоступной.
+    """
+    tags = (
+        f'card:post:{post.pk}',
+        f'card:author:{post.author_id}',
+        f'card:group:{post.group_id}',
+    )
+    versions = cache_tags.get_versions(tags)
+    return '.'.join(str(versions[tag]) for tag in tags)
+
+
+def invalidate(kind: str, pk) -> None:
+    cache_tags.purge(f'card:{kind}:{pk}')
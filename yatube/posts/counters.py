@@ -0,0 +1,180 @@
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from .models import AuthorStats, Comment, Follow, Group, Post
+from .utils import bulk_subtract
+
+POSTS_TOTAL_KEY = 'counters:posts_total'
+
+
+def get_posts_total() -> int:
+    """Общее число постов, закешированное на POSTS_TOTAL_CACHE_TIMEOUT."""
+    total = cache.get(POSTS_TOTAL_KEY)
+    if total is None:
+        total = Post.objects.count()
+        cache.set(POSTS_TOTAL_KEY, total, settings.POSTS_TOTAL_CACHE_TIMEOUT)
+    return total
+
+
+def get_author_posts_count(author) -> int:
+    stats = getattr(author, 'stats', None)
+    return stats.posts_count if stats is not None else 0
+
+
+def count_author_stats(user_id: int) -> dict:
+    """Точные значения счётчиков автора, посчитанные по таблицам."""
+    return {
+        'posts_count': Post.objects.filter(author_id=user_id).count(),
+        'followers_count': Follow.objects.filter(author_id=user_id).count(),
+        'following_count': Follow.objects.filter(user_id=user_id).count(),
+    }
+
+
+def post_added(post: Post) -> None:
+    cache.delete(POSTS_TOTAL_KEY)
+    _bump_group(post.group_id, 1)
+    _bump_author(post.author_id, 'posts_count', 1)
+
+
+def post_removed(post: Post) -> None:
+    cache.delete(POSTS_TOTAL_KEY)
+    _bump_group(post.group_id, -1)
+    _bump_author(post.author_id, 'posts_count', -1)
+
+
+def post_regrouped(old_group_id, new_group_id) -> None:
+    _bump_group(old_group_id, -1)
+    _bump_group(new_group_id, 1)
+
+
+def comment_added(comment: Comment) -> None:
+    _bump(Post.objects.filter(pk=comment.post_id), 'comments_count', 1)
+
+
+def comment_removed(comment: Comment) -> None:
+    _bump(Post.objects.filter(pk=comment.post_id), 'comments_count', -1)
+
+
+def follow_added(follow: Follow) -> None:
+    _bump_author(follow.author_id, 'followers_count', 1)
+    _bump_author(follow.user_id, 'following_count', 1)
+
+
+def follow_removed(follow: Follow) -> None:
+    _bump_author(follow.author_id, 'followers_count', -1)
+    _bump_author(follow.user_id, 'following_count', -1)
+
+
+def posts_ungrouped(group_counts: dict) -> None:
+    """После массового UPDATE: {group_id: сколько постов ушло из группы}."""
+    for group_id, total in group_counts.items():
+        _bump_group(group_id, -total)
+
+
+def comments_added(post_counts: dict) -> None:
+    """После bulk_create: {post_id: сколько комментариев добавлено}."""
+    for post_id, total in post_counts.items():
+        _bump(Post.objects.filter(pk=post_id), 'comments_count', total)
+
+
+def comments_deleted(post_counts: dict) -> None:
+    """После массового DELETE: {post_id: сколько комментариев удалено}."""
+    bulk_subtract(Post, 'pk', 'comments_count', post_counts)
+
+
+def follows_added(pairs) -> None:
+    """После bulk_create подписок: пары (user_id, author_id)."""
+    for field, user_ids in (
+            ('following_count', (user_id for user_id, _ in pairs)),
+            ('followers_count', (author_id for _, author_id in pairs))):
+        for user_id, total in Counter(user_ids).items():
+            _bump_author(user_id, field, total)
+
+
+def follows_deleted(pairs) -> None:
+    """После массового DELETE подписок: пары (user_id, author_id)."""
+    bulk_subtract(AuthorStats, 'user_id', 'following_count',
+                  Counter(user_id for user_id, _ in pairs))
+    bulk_subtract(AuthorStats, 'user_id', 'followers_count',
+                  Counter(author_id for _, author_id in pairs))
+
+
+def rebuild(verify: bool = False) -> list:
+    """Пересчитывает все счётчики разом.
+
+    Возвращает список расхождений (модель, pk, поле, было, стало).
+    При verify=True ничего не исправляет.
+    """
+    mismatches = []
+    mismatches += _sync(
+        Group.objects.annotate(actual=Count('posts')),
+        'posts_count', verify)
+    mismatches += _sync(
+        Post.objects.annotate(actual=Count('comments')),
+        'comments_count', verify)
+    expected = {}
+    for field, rows in (
+            ('posts_count', Post.objects.values_list('author')),
+            ('followers_count', Follow.objects.values_list('author')),
+            ('following_count', Follow.objects.values_list('user'))):
+        for user_id, total in rows.order_by().annotate(
+                total=Count('id')).iterator():
+            expected.setdefault(user_id, {})[field] = total
+    changed = []
+    for stats in AuthorStats.objects.iterator():
+        actual = expected.pop(stats.user_id, {})
+        for field in ('posts_count', 'followers_count', 'following_count'):
+            if getattr(stats, field) != actual.get(field, 0):
+                mismatches.append((AuthorStats.__name__, stats.pk, field,
+                                   getattr(stats, field),
+                                   actual.get(field, 0)))
+                setattr(stats, field, actual.get(field, 0))
+                changed.append(stats)
+    missing = [AuthorStats(user_id=user_id, **fields)
+               for user_id, fields in expected.items()]
+    mismatches += [(AuthorStats.__name__, stats.user_id, None, None, None)
+                   for stats in missing]
+    if not verify:
+        AuthorStats.objects.bulk_update(
+            set(changed),
+            ('posts_count', 'followers_count', 'following_count'),
+            batch_size=settings.COUNTERS_BATCH_SIZE,
+        )
+        AuthorStats.objects.bulk_create(
+            missing, batch_size=settings.COUNTERS_BATCH_SIZE)
+    return mismatches
+
+
+def _sync(annotated, field: str, verify: bool) -> list:
+    mismatches = []
+    changed = []
+    for obj in annotated.exclude(**{field: F('actual')}).iterator():
+        mismatches.append((obj.__class__.__name__, obj.pk, field,
+                           getattr(obj, field), obj.actual))
+        setattr(obj, field, obj.actual)
+        changed.append(obj)
+    if changed and not verify:
+        annotated.model.objects.bulk_update(
+            changed, (field,), batch_size=settings.COUNTERS_BATCH_SIZE)
+    return mismatches
+
+
+def _bump_author(user_id: int, field: str, delta: int) -> None:
+    updated = _bump(AuthorStats.objects.filter(user_id=user_id), field, delta)
+    if not updated and delta > 0:
+        AuthorStats.objects.get_or_create(
+            user_id=user_id, defaults=count_author_stats(user_id))
+
+
+def _bump_group(group_id, delta: int) -> None:
+    if group_id is not None:
+        _bump(Group.objects.filter(pk=group_id), 'posts_count', delta)
+
+
+def _bump(queryset, field: str, delta: int) -> int:
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    return queryset.update(**{field: F(field) + delta})
@@ -0,0 +1,61 @@
+"""Кеш подписок: для каждого пользователя - множество id авторов.
+
+В кеше множество лежит компактно, отсортированным массивом 64-битных
+целых, и сбрасывается при подписке и отписке. Ответ на вопрос «на кого
+из этих авторов подписан пользователь» для целой страницы стоит одного
+обращения к кешу, а при промахе - одного запроса.
+"""
+from array import array
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+
+from .models import Follow
+
+FOLLOWING_KEY = 'following:{}'
+# Подписки и отписки из очереди posts.write_queue, ещё не записанные в
+# базу: множество id авторов и {id автора: время отписки}.
+PENDING_KEY = 'following:pending:{}'
+REMOVED_KEY = 'following:removed:{}'
+TYPECODE = 'Q'
+
+
+def following_ids(user) -> frozenset:
+    """id авторов, на которых подписан пользователь."""
+    if not user.is_authenticated:
+        return frozenset()
+    key = FOLLOWING_KEY.format(user.pk)
+    pending_key = PENDING_KEY.format(user.pk)
+    removed_key = REMOVED_KEY.format(user.pk)
+    cached = cache.get_many((key, pending_key, removed_key))
+    pending = cached.get(pending_key, frozenset())
+    removed = cached.get(removed_key, {})
+    packed = cached.get(key)
+    if packed is None:
+        author_ids = Follow.objects.filter(user_id=user.pk).values_list(
+            'author_id', flat=True)
+        packed = array(TYPECODE, sorted(author_ids)).tobytes()
+        cache.set(key, packed, settings.FOLLOWING_CACHE_TIMEOUT)
+    return (frozenset(array(TYPECODE, packed)) | pending) - removed.keys()
+
+
+def is_following(user, authors) -> dict:
+    """author_id -> подписан ли user, для пользователей или их id."""
+    followed = following_ids(user)
+    author_ids = (getattr(author, 'pk', author) for author in authors)
+    return {author_id: author_id in followed for author_id in author_ids}
+
+
+def invalidate(*user_ids) -> None:
+    """Сбрасывает подписки сразу и ещё раз после коммита транзакции.
+
+    Как и cache_tags.purge: запрос, прочитавший подписки до коммита,
+    успел бы положить в кеш старое множество.
+    """
+    if not user_ids:
+        return
+    keys = [FOLLOWING_KEY.format(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys))
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
 from django.forms import ModelForm
 
+from . import thumbnails, uploads
 from .models import Post, Comment
 
 
@@ -19,6 +23,33 @@ class PostForm(ModelForm):
             'image': 'Картинка поста',
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Файл сверх лимита не передаётся в ImageField: Pillow не
+        # должен его открывать, а ошибка будет про размер, а не формат.
+        self.oversized_image = None
+        image = self.files.get(self.add_prefix('image'))
+        if image is not None and image.size > settings.POST_IMAGE_MAX_BYTES:
+            self.files = self.files.copy()
+            del self.files[self.add_prefix('image')]
+            self.oversized_image = image
+
+    def clean_image(self):
+        if self.oversized_image is not None:
+            uploads.check_size(self.oversized_image)
+        image = self.cleaned_data['image']
+        if isinstance(image, UploadedFile):
+            image = uploads.process_image(image)
+        return image
+
+    def save(self, commit=True):
+        post = super().save(commit)
+        if (commit and settings.THUMBNAIL_PREGENERATE
+                and 'image' in self.changed_data and post.image):
+            image_name = post.image.name
+            transaction.on_commit(lambda: thumbnails.schedule(image_name))
+        return post
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,186 @@
+"""Каталог групп и кеш групп по slug.
+
+Для каталога у каждой группы есть строка GroupStats: время последнего
+поста и логины самых активных авторов. При записи постов она
+правится одним UPDATE, как счётчики в posts.counters: время последнего
+поста сдвигается по дате поста, а заново ищется, только если удалён
+самый новый пост; авторы берутся из GroupAuthorStats (число постов
+автора в группе). Страница каталога - один запрос без агрегатов по
+Post. Число постов хранится в Group.posts_count, см. posts.counters.
+
+get_group() держит найденные по slug группы в памяти процесса
+GROUP_CACHE_TTL секунд. Правка группы и её постов сбрасывает запись
+сразу только в своём процессе, в остальных название, описание и
+число постов группы обновятся по истечении срока.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import (Case, Count, DateTimeField, F, Subquery,
+                              Value, When)
+from django.http import Http404
+
+from . import cache_tags
+from .models import Group, GroupAuthorStats, GroupStats, Post
+
+# Сбрасывается при любом изменении данных каталога.
+GROUPS_TAG = 'groups'
+
+_by_slug = {}
+_lock = threading.Lock()
+
+
+def get_group(slug) -> Group:
+    """Группа по slug или Http404."""
+    entry = _by_slug.get(slug)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+    try:
+        group = Group.objects.get(slug=slug)
+    except Group.DoesNotExist:
+        raise Http404('Группа не найдена')
+    with _lock:
+        if len(_by_slug) >= settings.GROUP_CACHE_SIZE:
+            _by_slug.clear()
+        _by_slug[slug] = (time.monotonic() + settings.GROUP_CACHE_TTL, group)
+    return group
+
+
+def forget_group(group) -> None:
+    """Убирает группу из кеша процесса, в том числе под старым slug."""
+    _forget(group.pk)
+    with _lock:
+        _by_slug.pop(group.slug, None)
+
+
+def post_added(post: Post) -> None:
+    if post.group_id is not None:
+        _bump_author(post.group_id, post.author_id, 1)
+        _update(post.group_id, _post_arrived(post.pub_date))
+        cache_tags.purge(GROUPS_TAG)
+
+
+def post_removed(post: Post) -> None:
+    if post.group_id is not None:
+        _bump_author(post.group_id, post.author_id, -1)
+        _update(post.group_id, _post_left(post.group_id, post.pub_date))
+        cache_tags.purge(GROUPS_TAG)
+
+
+def post_regrouped(post: Post, old_group_id) -> None:
+    if old_group_id is not None:
+        _bump_author(old_group_id, post.author_id, -1)
+        _update(old_group_id, _post_left(old_group_id, post.pub_date))
+    if post.group_id is not None:
+        _bump_author(post.group_id, post.author_id, 1)
+        _update(post.group_id, _post_arrived(post.pub_date))
+    cache_tags.purge(GROUPS_TAG)
+
+
+def posts_ungrouped(author_counts: dict) -> None:
+    """После массового UPDATE: {(group_id, author_id): сколько постов}."""
+    for (group_id, author_id), total in author_counts.items():
+        _bump_author(group_id, author_id, -total)
+    for group_id in {group_id for group_id, _ in author_counts}:
+        _update(group_id, _latest_pub_date(group_id))
+    if author_counts:
+        cache_tags.purge(GROUPS_TAG)
+
+
+def author_renamed(user_id: int) -> None:
+    """Логины авторов хранятся в GroupStats, их надо переписать."""
+    group_ids = list(GroupAuthorStats.objects.filter(
+        author_id=user_id, posts_count__gt=0,
+    ).values_list('group_id', flat=True))
+    for group_id in group_ids:
+        _update(group_id, F('last_post_at'))
+    if group_ids:
+        cache_tags.purge(GROUPS_TAG)
+
+
+def refresh(*group_ids) -> None:
+    """Пересчитывает строки GroupStats целиком, создавая недостающие."""
+    if not group_ids:
+        return
+    for group_id in group_ids:
+        GroupStats.objects.update_or_create(
+            group_id=group_id, defaults={
+                'last_post_at': Post.objects.filter(
+                    group_id=group_id).order_by('-pub_date').values_list(
+                    'pub_date', flat=True).first(),
+                'top_authors': _top_authors(group_id),
+            })
+    cache_tags.purge(GROUPS_TAG)
+
+
+def rebuild() -> int:
+    """Пересчитывает статистику всех групп по таблице постов."""
+    GroupAuthorStats.objects.all().delete()
+    GroupAuthorStats.objects.bulk_create(
+        (GroupAuthorStats(group_id=group_id, author_id=author_id,
+                          posts_count=total)
+         for group_id, author_id, total in Post.objects.exclude(
+             group=None).order_by().values_list('group', 'author').annotate(
+             total=Count('id')).iterator()),
+        batch_size=settings.COUNTERS_BATCH_SIZE,
+    )
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+    GroupStats.objects.exclude(group_id__in=group_ids).delete()
+    refresh(*group_ids)
+    return len(group_ids)
+
+
+def _update(group_id, last_post_at) -> None:
+    """Одним UPDATE: время последнего поста и логины авторов."""
+    _forget(group_id)
+    GroupStats.objects.filter(group_id=group_id).update(
+        last_post_at=last_post_at, top_authors=_top_authors(group_id))
+
+
+def _post_arrived(pub_date):
+    """Время последнего поста после появления поста с pub_date."""
+    return Case(
+        When(last_post_at__gte=pub_date, then=F('last_post_at')),
+        default=Value(pub_date, output_field=DateTimeField()),
+    )
+
+
+def _post_left(group_id, pub_date):
+    """То же после ухода поста: ищется, только если ушёл самый новый."""
+    return Case(
+        When(last_post_at__gt=pub_date, then=F('last_post_at')),
+        default=_latest_pub_date(group_id),
+    )
+
+
+def _latest_pub_date(group_id):
+    return Subquery(Post.objects.filter(group_id=group_id).order_by(
+        '-pub_date').values('pub_date')[:1])
+
+
+def _top_authors(group_id) -> str:
+    return ','.join(GroupAuthorStats.objects.filter(
+        group_id=group_id, posts_count__gt=0,
+    ).order_by('-posts_count', 'author_id').values_list(
+        'author__username', flat=True)[:settings.GROUP_TOP_AUTHORS])
+
+
+def _forget(group_id) -> None:
+    with _lock:
+        for slug, entry in list(_by_slug.items()):
+            if entry[1].pk == group_id:
+                del _by_slug[slug]
+
+
+def _bump_author(group_id, author_id, delta: int) -> None:
+    queryset = GroupAuthorStats.objects.filter(
+        group_id=group_id, author_id=author_id)
+    if delta < 0:
+        queryset = queryset.filter(posts_count__gte=-delta)
+    updated = queryset.update(posts_count=F('posts_count') + delta)
+    if not updated and delta > 0:
+        GroupAuthorStats.objects.get_or_create(
+            group_id=group_id, author_id=author_id,
+            defaults={'posts_count': Post.objects.filter(
+                group_id=group_id, author_id=author_id).count()})
@@ -0,0 +1,130 @@
+"""Лента «Популярное»: посты по убыванию hot_score.
+
+Счёт растёт сразу при событиях: новый пост получает вес по числу
+подписчиков автора, каждый комментарий добавляет HOT_COMMENT_WEIGHT
+одним UPDATE. Затухает он периодически: команда decay_hot_scores
+умножает все счёты на 0.5 ** (интервал / HOT_HALF_LIFE). Свежая
+активность поэтому весит больше старой, а лента читается проходом по
+индексу (-hot_score, -id), как хронологическая по pub_date.
+"""
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, F, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import cache_tags
+from .models import AuthorStats, Comment, Post
+from .utils import bulk_subtract
+
+HOT_ORDERING = ('-hot_score', '-id')
+# Сбрасывается при изменении счёта: после комментариев и затухания.
+HOT_TAG = 'hot'
+
+
+def author_weight(followers_count: int) -> float:
+    return settings.HOT_AUTHOR_WEIGHT * math.log1p(followers_count)
+
+
+def decay_factor(seconds: float) -> float:
+    return 0.5 ** (seconds / settings.HOT_HALF_LIFE)
+
+
+def score_new_post(post: Post) -> None:
+    """Начальный счёт поста, выставляется до INSERT."""
+    followers = AuthorStats.objects.filter(
+        user_id=post.author_id).values_list(
+        'followers_count', flat=True).first()
+    post.hot_score = author_weight(followers or 0)
+
+
+def comment_added(comment: Comment) -> None:
+    Post.objects.filter(pk=comment.post_id).update(
+        hot_score=F('hot_score') + settings.HOT_COMMENT_WEIGHT)
+    cache_tags.purge(HOT_TAG)
+
+
+def comments_added(post_counts: dict) -> None:
+    """comment_added() для пачки: {post_id: сколько комментариев}."""
+    for post_id, total in post_counts.items():
+        Post.objects.filter(pk=post_id).update(
+            hot_score=F('hot_score') + settings.HOT_COMMENT_WEIGHT * total)
+    if post_counts:
+        cache_tags.purge(HOT_TAG)
+
+
+def comment_removed(comment: Comment) -> None:
+    """Снимает вклад комментария, затухший с момента его записи."""
+    weight = _decayed(
+        settings.HOT_COMMENT_WEIGHT, comment.pub_date, timezone.now())
+    Post.objects.filter(pk=comment.post_id).update(
+        hot_score=Greatest(F('hot_score') - weight, 0.0))
+    cache_tags.purge(HOT_TAG)
+
+
+def comments_removed(rows) -> None:
+    """comment_removed() для пачки: пары (post_id, pub_date)."""
+    now = timezone.now()
+    weights = defaultdict(float)
+    for post_id, pub_date in rows:
+        weights[post_id] += _decayed(
+            settings.HOT_COMMENT_WEIGHT, pub_date, now)
+    bulk_subtract(Post, 'pk', 'hot_score', weights)
+    if weights:
+        cache_tags.purge(HOT_TAG)
+
+
+def decay(seconds: float) -> int:
+    """Затухание за прошедшие seconds одним UPDATE.
+
+    Счёт ниже HOT_SCORE_FLOOR обнуляется, чтобы старые посты не
+    переписывались при каждом запуске.
+    """
+    factor = decay_factor(seconds)
+    updated = Post.objects.filter(hot_score__gt=0).update(hot_score=Case(
+        When(hot_score__lt=settings.HOT_SCORE_FLOOR / factor, then=0.0),
+        default=F('hot_score') * factor,
+    ))
+    cache_tags.purge(HOT_TAG)
+    return updated
+
+
+def rebuild(now=None) -> int:
+    """Пересчитывает счёт всех постов по комментариям и подписчикам.
+
+    Даёт то же, что накопили бы post_added, comment_added и decay,
+    если бы затухание шло непрерывно. Посты, появившиеся после чтения
+    списка постов, не трогаются: их счёт уже ведут post_added и
+    comment_added.
+    """
+    now = now or timezone.now()
+    followers = dict(AuthorStats.objects.values_list(
+        'user_id', 'followers_count'))
+    scores = {}
+    for post_id, author_id, pub_date in Post.objects.order_by().values_list(
+            'id', 'author_id', 'pub_date').iterator():
+        scores[post_id] = _decayed(
+            author_weight(followers.get(author_id, 0)), pub_date, now)
+    for post_id, pub_date in Comment.objects.order_by().values_list(
+            'post_id', 'pub_date').iterator():
+        if post_id in scores:
+            scores[post_id] += _decayed(
+                settings.HOT_COMMENT_WEIGHT, pub_date, now)
+    posts = [
+        Post(pk=post_id, hot_score=_floor(score))
+        for post_id, score in scores.items()
+    ]
+    Post.objects.bulk_update(
+        posts, ('hot_score',), batch_size=settings.COUNTERS_BATCH_SIZE)
+    cache_tags.purge(HOT_TAG)
+    return len(posts)
+
+
+def _decayed(weight, moment, now) -> float:
+    return weight * decay_factor(max((now - moment).total_seconds(), 0))
+
+
+def _floor(score) -> float:
+    return score if score >= settings.HOT_SCORE_FLOOR else 0.0
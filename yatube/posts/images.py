@@ -0,0 +1,89 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from PIL import Image, ImageOps
+
+from . import cards
+from .models import ImageVariant, Post
+from .page_cache import purge_for_post
+
+# Формат варианта: (имя кодека Pillow, MIME-тип для <source>).
+FORMATS = {
+    'avif': ('AVIF', 'image/avif'),
+    'webp': ('WEBP', 'image/webp'),
+    'jpeg': ('JPEG', 'image/jpeg'),
+}
+
+
+def available_formats() -> list:
+    """Форматы из IMAGE_VARIANT_FORMATS, которые умеет сохранять Pillow.
+
+    AVIF есть не в каждой сборке Pillow, такой формат пропускается.
+    """
+    Image.init()
+    return [name for name in settings.IMAGE_VARIANT_FORMATS
+            if FORMATS[name][0] in Image.SAVE]
+
+
+def variant_height(width: int) -> int:
+    aspect_width, aspect_height = settings.IMAGE_VARIANT_ASPECT
+    return round(width * aspect_height / aspect_width)
+
+
+def build_variants(post: Post) -> int:
+    """Пересоздаёт варианты картинки поста, возвращает их число.
+
+    Картинка кадрируется по центру под IMAGE_VARIANT_ASPECT и
+    уменьшается до каждой ширины из IMAGE_VARIANT_WIDTHS, которая
+    не больше исходной (самая маленькая создаётся всегда).
+    """
+    if not post.image or not default_storage.exists(post.image.name):
+        _replace(post, [])
+        return 0
+    with default_storage.open(post.image.name) as file:
+        source = ImageOps.exif_transpose(Image.open(file))
+        source = source.convert('RGB')
+    widths = sorted(settings.IMAGE_VARIANT_WIDTHS)
+    widths = [width for width in widths if width <= source.width] or widths[:1]
+    stem = os.path.splitext(os.path.basename(post.image.name))[0]
+    variants = []
+    for width in widths:
+        height = variant_height(width)
+        resized = ImageOps.fit(source, (width, height), Image.LANCZOS)
+        for name in available_formats():
+            buffer = BytesIO()
+            resized.save(buffer, FORMATS[name][0],
+                         quality=settings.IMAGE_VARIANT_QUALITY)
+            variant = ImageVariant(
+                post=post, format=name, width=width, height=height)
+            variant.image.save(f'{stem}-{width}w.{name}',
+                               ContentFile(buffer.getvalue()), save=False)
+            variants.append(variant)
+    _replace(post, variants)
+    return len(variants)
+
+
+def build_for_image(image_name: str) -> int:
+    """Создаёт варианты для постов с картинкой image_name."""
+    posts = Post.objects.filter(image=image_name).select_related(
+        'author', 'group')
+    return sum(build_variants(post) for post in posts)
+
+
+def _replace(post, variants) -> None:
+    stale = list(post.image_variants.values_list('image', flat=True))
+    if not stale and not variants:
+        return
+    with transaction.atomic():
+        post.image_variants.all().delete()
+        ImageVariant.objects.bulk_create(variants)
+    new_names = {variant.image.name for variant in variants}
+    for name in stale:
+        if name not in new_names:
+            default_storage.delete(name)
+    cards.invalidate('post', post.pk)
+    purge_for_post(post)
@@ -0,0 +1,95 @@
+import json
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Наполняет отдельную тестовую базу данными и измеряет '
+            'ленты и формы: p50/p95, запросы, память.')
+
+    def add_arguments(self, parser):
+        defaults = benchmark.Volumes()
+        for name, value in vars(defaults).items():
+            parser.add_argument(
+                f'--{name}', type=type(value), default=value,
+                help=f'Объём данных: {name} (по умолчанию {value}).')
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--alloc-iterations', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--only', nargs='+', metavar='SCENARIO',
+            help='Запустить только указанные сценарии.')
+        parser.add_argument(
+            '--save', metavar='PATH', help='Сохранить результаты в JSON.')
+        parser.add_argument(
+            '--baseline', metavar='PATH',
+            help='Сравнить с результатами, сохранёнными через --save.')
+        parser.add_argument(
+            '--tolerance', type=float, default=0.2,
+            help='Допустимое ухудшение времени и памяти (0.2 = 20%%).')
+
+    def handle(self, *args, **options):
+        volumes = benchmark.Volumes(**{
+            name: options[name] for name in vars(benchmark.Volumes())})
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+
+        media_root = tempfile.mkdtemp()
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True)
+        try:
+            with override_settings(MEDIA_ROOT=media_root,
+                                   THUMBNAIL_PREGENERATE=False):
+                self.stdout.write(f'Наполнение базы: {volumes}')
+                benchmark.seed(volumes, options['seed'])
+                results = benchmark.run(
+                    iterations=options['iterations'],
+                    warmup=options['warmup'],
+                    alloc_iterations=options['alloc_iterations'],
+                    only=options['only'],
+                    seed_value=options['seed'],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        self._report(results, baseline and baseline['results'])
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                json.dump({'volumes': vars(volumes), 'results': results},
+                          file, indent=2, ensure_ascii=False)
+        if baseline:
+            if baseline['volumes'] != vars(volumes):
+                self.stderr.write('Эталон снят на других объёмах данных.')
+            regressions = benchmark.compare(
+                results, baseline['results'], options['tolerance'])
+            for name, metric, before, after in regressions:
+                self.stderr.write(
+                    f'{name}: {metric} {before:.1f} -> {after:.1f}')
+            if regressions:
+                raise CommandError(f'Регрессий: {len(regressions)}')
+
+    def _report(self, results, baseline):
+        self.stdout.write(
+            f'{"сценарий":<14}{"p50, мс":>10}{"p95, мс":>10}'
+            f'{"запросы":>10}{"память, КиБ":>14}')
+        for name, result in results.items():
+            line = (f'{name:<14}{result["p50"]:>10.1f}{result["p95"]:>10.1f}'
+                    f'{result["queries"]:>10}{result["alloc_kib"]:>14.1f}')
+            previous = (baseline or {}).get(name)
+            if previous:
+                change = (result['p95'] / previous['p95'] - 1) * 100
+                line += f'   p95 {change:+.0f}%'
+            self.stdout.write(line)
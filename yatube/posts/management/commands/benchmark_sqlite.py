@@ -0,0 +1,44 @@
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает стандартный SQLite и core.backends.sqlite3 под '
+            'параллельной записью и чтением на временных файлах базы.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--posts', type=int, default=200)
+        parser.add_argument(
+            '--setups', nargs='+', choices=list(benchmark.SQLITE_SETUPS),
+            default=list(benchmark.SQLITE_SETUPS))
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"настройка":<10}{"записей/с":>11}{"чтений/с":>11}'
+            f'{"locked":>8}{"p95 записи":>12}{"p95 чтения":>12}')
+        directory = tempfile.mkdtemp()
+        try:
+            for setup in options['setups']:
+                result = benchmark.concurrency(
+                    setup, directory,
+                    writers=options['writers'],
+                    readers=options['readers'],
+                    seconds=options['seconds'],
+                    posts=options['posts'],
+                )
+                seconds = options['seconds']
+                self.stdout.write(
+                    f'{setup:<10}{result["writes"] / seconds:>11.1f}'
+                    f'{result["reads"] / seconds:>11.1f}'
+                    f'{result["locked"]:>8}'
+                    f'{result["write_p95"]:>10.1f}мс'
+                    f'{result["read_p95"]:>10.1f}мс')
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
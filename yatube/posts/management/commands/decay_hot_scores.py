@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import hot
+
+
+class Command(BaseCommand):
+    help = ('Уменьшает счёт популярности постов. Запускается по '
+            'расписанию раз в HOT_DECAY_INTERVAL секунд.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=settings.HOT_DECAY_INTERVAL,
+            help='Сколько секунд прошло с прошлого запуска.')
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Пересчитать счёт всех постов с нуля.')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            total = hot.rebuild()
+            self.stdout.write(self.style.SUCCESS(
+                f'Пересчитано постов: {total}'))
+            return
+        updated = hot.decay(options['interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Затухание x{hot.decay_factor(options["interval"]):.4f}, '
+            f'постов: {updated}'))
@@ -0,0 +1,120 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import urls
+from posts.models import Group, Post, User
+
+# GET-запрос к этим view меняет подписки, их запросы не разбираются.
+SKIPPED_VIEWS = ('profile_follow', 'profile_unfollow')
+
+# Строки плана с чтением всей таблицы и с сортировкой после выборки.
+SCAN_PATTERNS = {
+    'sqlite': re.compile(r'\bSCAN (?:TABLE )?\w+(?!.*\bUSING\b)'),
+    'postgresql': re.compile(r'Seq Scan on \w+'),
+    'mysql': re.compile(r'\bALL\b'),
+}
+SORT_PATTERNS = {
+    'sqlite': re.compile(r'USE TEMP B-TREE FOR ORDER BY'),
+    'postgresql': re.compile(r'^\s*(?:->\s*)?Sort\b'),
+    'mysql': re.compile(r'Using filesort'),
+}
+
+
+class Command(BaseCommand):
+    help = ('Выполняет view из posts.views, разбирает EXPLAIN их '
+            'запросов и сообщает о запросах без подходящих индексов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--username',
+            help='От чьего имени открывать страницы (по умолчанию '
+                 'автор первого поста).',
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Завершиться с ошибкой, если найдены проблемы.',
+        )
+
+    def handle(self, *args, **options):
+        post = Post.objects.select_related('author', 'group').first()
+        if post is None:
+            raise CommandError('Нужен хотя бы один пост.')
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(
+                    f'Пользователь {options["username"]} не найден.')
+        else:
+            user = post.author
+        sample_kwargs = {
+            'post_id': post.pk,
+            'username': post.author.username,
+            'slug': (post.group or Group.objects.first() or Group()).slug,
+        }
+
+        problems = 0
+        for pattern in urls.urlpatterns:
+            if pattern.name in SKIPPED_VIEWS:
+                continue
+            kwargs = {name: sample_kwargs[name]
+                      for name in pattern.pattern.converters}
+            if not all(kwargs.values()):
+                self.stdout.write(f'{pattern.name}: нет данных для URL')
+                continue
+            queries = self._run_view(pattern, kwargs, user)
+            view_problems = 0
+            for sql in queries:
+                issues = self._explain(sql)
+                if issues:
+                    view_problems += 1
+                    self.stdout.write(self.style.WARNING(
+                        f'{pattern.name}: {"; ".join(issues)}'))
+                    self.stdout.write(f'    {sql}')
+            self.stdout.write(
+                f'{pattern.name}: запросов {len(queries)}, '
+                f'без индекса {view_problems}')
+            problems += view_problems
+
+        if problems and options['strict']:
+            raise CommandError(f'Запросов без индекса: {problems}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Запросов без индекса: {problems}'))
+
+    @staticmethod
+    def _run_view(pattern, kwargs, user):
+        request = RequestFactory().get(
+            reverse(f'{urls.app_name}:{pattern.name}', kwargs=kwargs))
+        request.user = user
+        with CaptureQueriesContext(connection) as context:
+            with transaction.atomic():
+                pattern.callback(request, **kwargs)
+                transaction.set_rollback(True)
+        return [
+            query['sql'] for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith('SELECT')
+        ]
+
+    @staticmethod
+    def _explain(sql):
+        prefix = 'EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite' else (
+            'EXPLAIN')
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}')
+            plan = [' '.join(map(str, row)) for row in cursor.fetchall()]
+        # Полное чтение маленького справочника без условий и сортировка
+        # нескольких строк без LIMIT - не проблема. Плохо, когда фильтр
+        # идёт мимо индекса или ради первых N строк сортируется вся
+        # выборка.
+        checks = []
+        if ' WHERE ' in sql:
+            checks.append(SCAN_PATTERNS.get(connection.vendor))
+        if ' LIMIT ' in sql:
+            checks.append(SORT_PATTERNS.get(connection.vendor))
+        return [line.strip() for line in plan for regex in checks
+                if regex is not None and regex.search(line)]
@@ -0,0 +1,48 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии или подписки '
+            'в NDJSON или CSV.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--model', choices=tuple(transfer.KINDS), default='posts')
+        parser.add_argument(
+            '--output', default='-',
+            help='Файл для выгрузки, "-" - стандартный вывод.')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS,
+            help='По умолчанию определяется по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        data_format = options['format'] or transfer.detect_format(
+            options['output'])
+        rows = transfer.export_rows(options['model'], options['batch_size'])
+        started = time.monotonic()
+        written = 0
+        if options['output'] == '-':
+            file = sys.stdout
+        else:
+            file = open(options['output'], 'w', encoding='utf-8', newline='')
+        try:
+            for written in transfer.write_rows(
+                    rows, file, data_format, options['model']):
+                if written % options['batch_size'] == 0:
+                    self._progress(written, started)
+        finally:
+            if file is not sys.stdout:
+                file.close()
+        self._progress(written, started)
+
+    def _progress(self, written, started):
+        elapsed = time.monotonic() - started
+        self.stderr.write(
+            f'Выгружено строк: {written}, '
+            f'{written / elapsed if elapsed else 0:.0f} строк/с')
@@ -0,0 +1,103 @@
+import json
+import os
+import time
+from itertools import islice
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = ('Загружает группы, посты, комментарии или подписки из NDJSON '
+            'или CSV пачками через bulk_create.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--model', choices=tuple(transfer.KINDS), default='posts')
+        parser.add_argument(
+            '--format', choices=transfer.FORMATS,
+            help='По умолчанию определяется по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл, где запоминается число загруженных строк; с него '
+                 'импорт продолжается после сбоя. По умолчанию '
+                 '<path>.checkpoint.')
+        parser.add_argument(
+            '--no-rebuild', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        kind = options['model']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        data_format = options['format'] or transfer.detect_format(path)
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        done = self._load_checkpoint(checkpoint, path, kind)
+        if done:
+            self.stdout.write(f'Продолжаем со строки {done + 1}')
+
+        started = time.monotonic()
+        saved = skipped = 0
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = islice(transfer.read_rows(file, data_format), done, None)
+            while True:
+                batch = list(islice(rows, options['batch_size']))
+                if not batch:
+                    break
+                batch_saved, batch_skipped = transfer.import_batch(
+                    kind, batch)
+                saved += batch_saved
+                skipped += batch_skipped
+                done += len(batch)
+                self._save_checkpoint(checkpoint, path, kind, done)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Обработано строк: {done}, '
+                    f'{(saved + skipped) / elapsed:.0f} строк/с')
+        transfer.reset_sequences([kind])
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        if not options['no_rebuild']:
+            self._rebuild(kind)
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено: {saved}, пропущено: {skipped}, '
+            f'за {time.monotonic() - started:.1f} с'))
+
+    def _rebuild(self, kind):
+        """bulk_create не шлёт сигналы: производные данные считаются заново."""
+        call_command('rebuild_stats', stdout=self.stdout)
+        if kind in ('posts', 'follows'):
+            call_command('rebuild_timelines', stdout=self.stdout)
+        if kind in ('posts', 'comments'):
+            call_command('decay_hot_scores', rebuild=True, stdout=self.stdout)
+        if kind == 'posts':
+            try:
+                call_command('reindex_posts', stdout=self.stdout)
+            except CommandError as error:
+                self.stderr.write(str(error))
+
+    @staticmethod
+    def _load_checkpoint(checkpoint, path, kind):
+        if not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as file:
+            state = json.load(file)
+        if state.get('path') != os.path.abspath(path) or (
+                state.get('model') != kind):
+            raise CommandError(
+                f'{checkpoint} относится к другому импорту, удалите его.')
+        return state['rows']
+
+    @staticmethod
+    def _save_checkpoint(checkpoint, path, kind, rows):
+        temporary = f'{checkpoint}.tmp'
+        with open(temporary, 'w') as file:
+            json.dump({'path': os.path.abspath(path), 'model': kind,
+                       'rows': rows}, file)
+        os.replace(temporary, checkpoint)
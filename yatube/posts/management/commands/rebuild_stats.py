@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import counters, groups
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счётчики постов, '
+            'подписчиков, комментариев и статистику групп.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить счётчики, ничего не исправляя.',
+        )
+
+    def handle(self, *args, **options):
+        mismatches = counters.rebuild(verify=options['verify'])
+        for model, pk, field, stored, actual in mismatches:
+            if field is None:
+                self.stdout.write(f'{model} {pk}: нет записи')
+            else:
+                self.stdout.write(
+                    f'{model} {pk}: {field} {stored} -> {actual}')
+        if options['verify'] and mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        if not options['verify']:
+            self.stdout.write(
+                f'Статистика групп пересчитана: {groups.rebuild()}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Расхождений: {len(mismatches)}'))
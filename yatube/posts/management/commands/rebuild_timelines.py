@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок.'
+
+    def handle(self, *args, **options):
+        timeline.sync_fanout_modes()
+        deleted, _ = TimelineEntry.objects.all().delete()
+        follows = Follow.objects.values_list('user_id', 'author_id')
+        processed = 0
+        for user_id, author_id in follows.iterator():
+            timeline.backfill(user_id, author_id)
+            processed += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей: {deleted}, обработано подписок: {processed}'
+        ))
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not search.fts_available():
+            raise CommandError(
+                'Полнотекстовый индекс недоступен: нужна SQLite с FTS5 '
+                'и применённые миграции posts.')
+        started = time.monotonic()
+        indexed = search.reindex(
+            batch_size=options['batch_size'],
+            progress=lambda done: self.stdout.write(
+                f'Проиндексировано: {done}'),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано постов: {indexed} '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
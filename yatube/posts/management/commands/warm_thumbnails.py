@@ -0,0 +1,57 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для уже загруженных картинок постов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.THUMBNAIL_WORKERS)
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        done = failed = 0
+        images = Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True)
+        batch = []
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for image_name in images.iterator():
+                batch.append(image_name)
+                if len(batch) >= options['batch_size']:
+                    done, failed = self._warm(pool, batch, done, failed)
+                    batch = []
+            done, failed = self._warm(pool, batch, done, failed)
+        self.stdout.write(self.style.SUCCESS(
+            f'Картинок обработано: {done}, с ошибкой: {failed}, '
+            f'за {time.monotonic() - started:.1f} с'
+        ))
+
+    def _warm(self, pool, batch, done, failed):
+        for image_name, error in zip(batch, pool.map(self._warm_one, batch)):
+            if error is None:
+                done += 1
+            else:
+                failed += 1
+                self.stderr.write(f'{image_name}: {error}')
+        if batch:
+            self.stdout.write(f'Обработано картинок: {done + failed}')
+        return done, failed
+
+    @staticmethod
+    def _warm_one(image_name):
+        try:
+            thumbnails.pregenerate(image_name)
+        except Exception as error:
+            return error
+        finally:
+            connections.close_all()
+        return None
@@ -0,0 +1,49 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:18
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    for row in Comment.objects.order_by().values('post').annotate(
+            total=Count('id')).iterator():
+        Post.objects.filter(pk=row['post']).update(
+            comments_count=row['total'])
+    for group_by, field in (('author', 'followers_count'),
+                            ('user', 'following_count')):
+        for row in Follow.objects.order_by().values(group_by).annotate(
+                total=Count('id')).iterator():
+            stats, _ = AuthorStats.objects.get_or_create(
+                user_id=row[group_by])
+            setattr(stats, field, row['total'])
+            stats.save(update_fields=[field])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='followers_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='authorstats',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество комментариев'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 2.2.16 on 2026-10-17 07:38
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    duplicates = Follow.objects.order_by().values('user', 'author').annotate(
+        first_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for row in duplicates.iterator():
+        Follow.objects.filter(
+            user_id=row['user'], author_id=row['author'],
+        ).exclude(pk=row['first_id']).delete()
+        extra = row['total'] - 1
+        AuthorStats.objects.filter(user_id=row['author']).update(
+            followers_count=F('followers_count') - extra)
+        AuthorStats.objects.filter(user_id=row['user']).update(
+            following_count=F('following_count') - extra)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='authorstats',
+            name='followers_count',
+            field=models.PositiveIntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ('pub_date',)},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'pub_date', 'id'], name='comment_post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.RunPython(
+            remove_duplicate_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+    ]
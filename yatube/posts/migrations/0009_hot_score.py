@@ -0,0 +1,55 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:06
+
+import math
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fill_hot_scores(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    now = timezone.now()
+
+    def decayed(weight, moment):
+        age = max((now - moment).total_seconds(), 0)
+        return weight * 0.5 ** (age / settings.HOT_HALF_LIFE)
+
+    followers = dict(AuthorStats.objects.values_list(
+        'user_id', 'followers_count'))
+    scores = {
+        post_id: decayed(settings.HOT_AUTHOR_WEIGHT * math.log1p(
+            followers.get(author_id, 0)), pub_date)
+        for post_id, author_id, pub_date in Post.objects.order_by(
+        ).values_list('id', 'author_id', 'pub_date').iterator()
+    }
+    for post_id, pub_date in Comment.objects.order_by().values_list(
+            'post_id', 'pub_date').iterator():
+        scores[post_id] += decayed(settings.HOT_COMMENT_WEIGHT, pub_date)
+    Post.objects.bulk_update(
+        [Post(pk=post_id, hot_score=score)
+         for post_id, score in scores.items()
+         if score >= settings.HOT_SCORE_FLOOR],
+        ('hot_score',), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False, verbose_name='Популярность'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_hot_score_idx'),
+        ),
+        migrations.RunPython(fill_hot_scores, migrations.RunPython.noop),
+    ]
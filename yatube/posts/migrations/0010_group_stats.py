@@ -0,0 +1,79 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:09
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+# Значения настроек на момент миграции: её результат не зависит от
+# того, с какими настройками она запущена.
+TOP_AUTHORS = 3
+BATCH_SIZE = 500
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    GroupAuthorStats = apps.get_model('posts', 'GroupAuthorStats')
+    posts = Post.objects.exclude(group=None).order_by()
+    totals = posts.values_list('group', 'author', 'author__username').annotate(
+        total=models.Count('id')).order_by('group', '-total', 'author')
+    author_stats = []
+    top_authors = {}
+    for group_id, author_id, username, total in totals.iterator():
+        author_stats.append(GroupAuthorStats(
+            group_id=group_id, author_id=author_id, posts_count=total))
+        authors = top_authors.setdefault(group_id, [])
+        if len(authors) < TOP_AUTHORS:
+            authors.append(username)
+    GroupAuthorStats.objects.bulk_create(author_stats, batch_size=BATCH_SIZE)
+    last_post_at = dict(posts.values_list('group').annotate(
+        last=models.Max('pub_date')))
+    GroupStats.objects.bulk_create(
+        [GroupStats(group_id=group_id,
+                    last_post_at=last_post_at.get(group_id),
+                    top_authors=','.join(top_authors.get(group_id, ())))
+         for group_id in Group.objects.values_list('id', flat=True)],
+        batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0009_hot_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='posts.Group')),
+                ('last_post_at', models.DateTimeField(blank=True, null=True)),
+                ('top_authors', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GroupAuthorStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='group_stats', to=settings.AUTH_USER_MODEL)),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='author_stats', to='posts.Group')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='groupauthorstats',
+            index=models.Index(fields=['group', '-posts_count'], name='group_author_posts_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='groupauthorstats',
+            constraint=models.UniqueConstraint(fields=('group', 'author'), name='unique_group_author'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['-posts_count', 'title'], name='group_posts_count_idx'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
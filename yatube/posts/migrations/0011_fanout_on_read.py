@@ -0,0 +1,30 @@
+# Generated by Django 2.2.16 on 2026-10-17 08:30
+
+from django.db import migrations, models
+
+# TIMELINE_FANOUT_MAX_FOLLOWERS на момент миграции. Флаги по текущему
+# порогу выставляет команда rebuild_timelines.
+MAX_FOLLOWERS = 1000
+
+
+def fill_fanout_on_read(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.filter(
+        followers_count__gt=MAX_FOLLOWERS,
+    ).update(fanout_on_read=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_group_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='fanout_on_read',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(fill_fanout_on_read, migrations.RunPython.noop),
+    ]
@@ -8,6 +8,17 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False,
+    )
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('-posts_count', 'title'),
+                         name='group_posts_count_idx'),
+        )
 
     def __str__(self):
         return self.title
@@ -38,9 +49,27 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False,
+    )
+    hot_score = models.FloatField(
+        'Популярность',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(fields=('-hot_score', '-id'),
+                         name='post_hot_score_idx'),
+            models.Index(fields=('group', '-pub_date', '-id'),
+                         name='post_group_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='post_author_pub_date_idx'),
+        )
 
     def __str__(self):
         return self.text
@@ -60,6 +89,13 @@ class Comment(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ('pub_date',)
+        indexes = (
+            models.Index(fields=('post', 'pub_date', 'id'),
+                         name='comment_post_pub_date_idx'),
+        )
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -73,5 +109,149 @@ class Follow(models.Model):
         related_name='following',
     )
 
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow',
+            ),
+        )
+
     def __str__(self):
         return f'{self.user} подписался на {self.author}'
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики автора."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    # Индекс нужен для выборки авторов с fan-out-on-read.
+    followers_count = models.PositiveIntegerField(default=0, db_index=True)
+    following_count = models.PositiveIntegerField(default=0)
+    # Посты автора не раскладываются по лентам, а подмешиваются при
+    # чтении, см. posts.timeline.followers_changed.
+    fanout_on_read = models.BooleanField(default=False, db_index=True)
+
+    def __str__(self):
+        return f'Статистика {self.user}'
+
+
+class GroupStats(models.Model):
+    """Данные группы для каталога групп, обновляются при записи постов."""
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+    )
+    last_post_at = models.DateTimeField(null=True, blank=True)
+    # Логины самых активных авторов через запятую, по убыванию постов.
+    top_authors = models.TextField(blank=True)
+
+    def __str__(self):
+        return f'Статистика {self.group}'
+
+    @property
+    def top_author_list(self):
+        return self.top_authors.split(',') if self.top_authors else []
+
+
+class GroupAuthorStats(models.Model):
+    """Сколько постов автор написал в группе."""
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='author_stats',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='group_stats',
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=('group', 'author'),
+                                    name='unique_group_author'),
+        )
+        indexes = (
+            models.Index(fields=('group', '-posts_count'),
+                         name='group_author_posts_idx'),
+        )
+
+    def __str__(self):
+        return f'{self.author} в {self.group}: {self.posts_count}'
+
+
+class TimelineEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя.
+
+    Заполняется при публикации поста (fan-out-on-write), поэтому лента
+    читается одним проходом по индексу (user, -pub_date).
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry',
+            ),
+        )
+        indexes = (
+            models.Index(fields=('user', '-pub_date'),
+                         name='timeline_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='timeline_user_author_idx'),
+        )
+
+
+class ImageVariant(models.Model):
+    """Уменьшенная копия картинки поста в одном из форматов.
+
+    Шаблон собирает из вариантов srcset, и браузер выбирает файл
+    под ширину экрана и поддерживаемый формат.
+    """
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='image_variants',
+    )
+    image = models.ImageField(upload_to='posts/variants/')
+    format = models.CharField(max_length=10)
+    width = models.PositiveIntegerField()
+    height = models.PositiveIntegerField()
+
+    class Meta:
+        ordering = ('width',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('post', 'format', 'width'),
+                name='unique_image_variant',
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.image.name} ({self.format}, {self.width}w)'
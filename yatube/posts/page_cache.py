@@ -0,0 +1,108 @@
+import hashlib
+from contextlib import nullcontext
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import quote_etag
+
+from core.db_router import current_replica, primary_reads
+
+from . import cache_tags
+
+GLOBAL_FEED_TAG = 'feed'
+# Сбрасывается при правке пользователей: их имена видны на всех лентах.
+USERS_TAG = 'users'
+PAGE_KEY = 'page_cache:{path}:{etag}'
+
+
+def author_tag(username) -> str:
+    return f'author:{username}'
+
+
+def group_tag(slug) -> str:
+    return f'group:{slug}'
+
+
+def post_tag(post_id) -> str:
+    return f'post:{post_id}'
+
+
+def cache_anonymous_page(get_tags):
+    """Кеширует ответ view целиком для анонимных GET-запросов.
+
+    get_tags получает аргументы view и возвращает теги страницы.
+    Ключ кеша и ETag строятся из URL и версий тегов, поэтому сброс
+    любого тега (purge) делает страницу устаревшей, а клиенты могут
+    перепроверять её условными запросами и получать 304.
+
+    Если тег сброшен меньше REPLICA_PIN_SECONDS назад, страница для
+    кеша собирается с основной базы: отставшая реплика отдала бы
+    старые данные, и они попали бы в кеш под новой версией тега.
+    """
+    return _cache_tagged_page(get_tags, anonymous_only=True)
+
+
+def cache_public_page(get_tags):
+    """То же для ответов, одинаковых для всех пользователей.
+
+    Кешируются и получают 304 запросы и авторизованных клиентов,
+    ответ не зависит от Cookie.
+    """
+    return _cache_tagged_page(get_tags, anonymous_only=False)
+
+
+def _cache_tagged_page(get_tags, anonymous_only):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method not in ('GET', 'HEAD')
+                    or anonymous_only and request.user.is_authenticated):
+                return view(request, *args, **kwargs)
+
+            versions = cache_tags.get_versions(get_tags(*args, **kwargs))
+            path = request.get_full_path()
+            etag = hashlib.md5(
+                f'{path}:{sorted(versions.items())}'.encode()
+            ).hexdigest()
+
+            # Только ETag: Last-Modified с точностью до секунды дал бы
+            # 304 на запрос, пришедший в ту же секунду после сброса.
+            response = get_conditional_response(
+                request, etag=quote_etag(etag))
+            if response is None:
+                key = PAGE_KEY.format(
+                    path=hashlib.md5(path.encode()).hexdigest(), etag=etag)
+                response = cache.get(key)
+                if response is None:
+                    with _fill_reads(versions):
+                        response = view(request, *args, **kwargs)
+                    if response.status_code != 200:
+                        return response
+                    cache.set(key, response, settings.PAGE_CACHE_TIMEOUT)
+
+            response['ETag'] = quote_etag(etag)
+            patch_cache_control(response, max_age=0)
+            if anonymous_only:
+                patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
+
+
+def _fill_reads(versions):
+    if current_replica.get() is not None and cache_tags.purged_within(
+            versions, settings.REPLICA_PIN_SECONDS):
+        return primary_reads()
+    return nullcontext()
+
+
+def purge_for_post(post, *extra_groups) -> None:
+    """Сбрасывает страницы, на которых виден пост."""
+    tags = [GLOBAL_FEED_TAG, post_tag(post.pk),
+            author_tag(post.author.username)]
+    tags += [group_tag(group.slug)
+             for group in (post.group, *extra_groups) if group is not None]
+    cache_tags.purge(*tags)
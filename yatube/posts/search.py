@@ -0,0 +1,189 @@
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+
+WORD_RE = re.compile(r'\w+')
+
+_fts_databases = set()
+
+
+def fts_available() -> bool:
+    """Есть ли в базе полнотекстовый индекс SQLite FTS5."""
+    if connection.vendor != 'sqlite':
+        return False
+    if connection.settings_dict['NAME'] in _fts_databases:
+        return True
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s",
+            [FTS_TABLE],
+        )
+        found = cursor.fetchone() is not None
+    if found:
+        _fts_databases.add(connection.settings_dict['NAME'])
+    return found
+
+
+def index_post(post: Post) -> None:
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)',
+            [post.pk, post.text],
+        )
+
+
+def unindex_post(post_id: int) -> None:
+    if not fts_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+
+def reindex(batch_size: int = 1000, progress=None) -> int:
+    """Перестраивает индекс по всем постам пачками по batch_size."""
+    if not fts_available():
+        return 0
+    indexed = 0
+    batch = []
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        rows = Post.objects.order_by().values_list('id', 'text')
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                indexed += _insert_batch(cursor, batch)
+                batch = []
+                if progress is not None:
+                    progress(indexed)
+        indexed += _insert_batch(cursor, batch)
+    return indexed
+
+
+def search(query: str, group=None, author=None):
+    """Посты, найденные по запросу, в порядке релевантности.
+
+    Возвращает ленивую последовательность, которую можно отдать
+    в get_page_obj: считается и нарезается она на стороне базы.
+    """
+    terms = [term.lower() for term in WORD_RE.findall(query)]
+    if not terms:
+        return Post.objects.none()
+    filters = {}
+    if group is not None:
+        filters['group_id'] = group.pk
+    if author is not None:
+        filters['author_id'] = author.pk
+    if fts_available():
+        return FtsResults(terms, filters)
+    return ScanResults(terms, filters)
+
+
+class FtsResults:
+    """Результаты поиска по FTS5, ранжированные по bm25."""
+
+    def __init__(self, terms, filters):
+        self.match = ' '.join(f'"{term}"*' for term in terms)
+        self.where = ''.join(
+            f' AND p.{column} = %s' for column in filters)
+        self.params = [self.match, *filters.values()]
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            with connection.cursor() as cursor:
+                cursor.execute(self._sql('COUNT(*)'), self.params)
+                self._count = cursor.fetchone()[0]
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start = index.start or 0
+        limit = -1 if index.stop is None else max(index.stop - start, 0)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                self._sql('p.id')
+                + f' ORDER BY bm25({FTS_TABLE}) LIMIT %s OFFSET %s',
+                [*self.params, limit, start],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+        return _posts_in_order(ids)
+
+    def _sql(self, columns):
+        return (
+            f'SELECT {columns} FROM {FTS_TABLE} '
+            f'JOIN {Post._meta.db_table} AS p ON p.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s{self.where}'
+        )
+
+
+class ScanResults:
+    """Запасной поиск без FTS: отбор по LIKE и ранжирование в Python.
+
+    По отобранным постам строится маленький инвертированный индекс,
+    и документы сортируются по tf-idf. Кандидатов не больше
+    SEARCH_SCAN_LIMIT, чтобы поиск не читал всю таблицу.
+    """
+
+    def __init__(self, terms, filters):
+        candidates = Post.objects.filter(**filters).order_by('-pub_date')
+        for term in terms:
+            candidates = candidates.filter(text__icontains=term)
+        candidates = candidates.values_list('id', 'text')
+        self.ids = _rank(terms, candidates[:settings.SEARCH_SCAN_LIMIT])
+
+    def count(self):
+        return len(self.ids)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        return _posts_in_order(self.ids[index])
+
+
+def _rank(terms, documents) -> list:
+    documents = list(documents)
+    postings = {}
+    for post_id, text in documents:
+        counts = Counter(word.lower() for word in WORD_RE.findall(text))
+        for term in terms:
+            frequency = sum(count for word, count in counts.items()
+                            if word.startswith(term))
+            if frequency:
+                postings.setdefault(term, {})[post_id] = frequency
+    total = len({post_id for docs in postings.values() for post_id in docs})
+    scores = Counter({post_id: 0 for post_id, _ in documents})
+    for docs in postings.values():
+        idf = math.log(1 + total / len(docs))
+        for post_id, frequency in docs.items():
+            scores[post_id] += (1 + math.log(frequency)) * idf
+    return [post_id for post_id, _ in scores.most_common()]
+
+
+def _posts_in_order(ids) -> list:
+    posts = Post.objects.select_related('author', 'group').prefetch_related(
+        'image_variants').in_bulk(ids)
+    return [posts[post_id] for post_id in ids if post_id in posts]
+
+
+def _insert_batch(cursor, batch) -> int:
+    if batch:
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, text) VALUES (%s, %s)', batch)
+    return len(batch)
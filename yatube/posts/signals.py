@@ -0,0 +1,119 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import (cache_tags, cards, counters, follow_graph, groups, hot,
+               page_cache, search, timeline)
+from .models import Comment, Follow, Group, Post, User
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._saved_group_id = None
+    if instance.pk is not None:
+        instance._saved_group_id = Post.objects.filter(
+            pk=instance.pk).values_list('group_id', flat=True).first()
+
+
+@receiver(pre_save, sender=Post)
+def score_new_post(sender, instance, **kwargs):
+    if instance._state.adding:
+        hot.score_new_post(instance)
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance._saved_slug = None
+    if instance.pk is not None:
+        instance._saved_slug = Group.objects.filter(
+            pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    search.index_post(instance)
+    if created:
+        counters.post_added(instance)
+        groups.post_added(instance)
+        timeline.fan_out_post(instance)
+        page_cache.purge_for_post(instance)
+        return
+    cards.invalidate('post', instance.pk)
+    if instance._saved_group_id != instance.group_id:
+        counters.post_regrouped(instance._saved_group_id, instance.group_id)
+        groups.post_regrouped(instance, instance._saved_group_id)
+        page_cache.purge_for_post(
+            instance, *Group.objects.filter(pk=instance._saved_group_id))
+    else:
+        page_cache.purge_for_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.unindex_post(instance.pk)
+    counters.post_removed(instance)
+    groups.post_removed(instance)
+    cards.invalidate('post', instance.pk)
+    page_cache.purge_for_post(instance)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.comment_added(instance)
+        hot.comment_added(instance)
+    cache_tags.purge(page_cache.post_tag(instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.comment_removed(instance)
+    hot.comment_removed(instance)
+    cache_tags.purge(page_cache.post_tag(instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.follow_added(instance)
+        timeline.followers_changed(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+        follow_graph.invalidate(instance.user_id)
+        _purge_follow_pages(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    counters.follow_removed(instance)
+    timeline.followers_changed(instance.author_id)
+    timeline.prune(instance.user_id, instance.author_id)
+    follow_graph.invalidate(instance.user_id)
+    _purge_follow_pages(instance)
+
+
+@receiver(post_save, sender=User)
+def author_saved(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    cards.invalidate('author', instance.pk)
+    groups.author_renamed(instance.pk)
+    cache_tags.purge(page_cache.USERS_TAG,
+                     page_cache.author_tag(instance.username))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    cards.invalidate('group', instance.pk)
+    groups.forget_group(instance)
+    if kwargs.get('created'):
+        groups.refresh(instance.pk)
+    slugs = {instance.slug, getattr(instance, '_saved_slug', None)} - {None}
+    cache_tags.purge(page_cache.GLOBAL_FEED_TAG, groups.GROUPS_TAG,
+                     *map(page_cache.group_tag, slugs))
+
+
+def _purge_follow_pages(follow):
+    usernames = User.objects.filter(
+        pk__in=(follow.user_id, follow.author_id),
+    ).values_list('username', flat=True)
+    cache_tags.purge(*map(page_cache.author_tag, usernames))
@@ -0,0 +1,25 @@
+from django import template
+
+from posts import follow_graph
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def is_following(context, author):
+    """Подписан ли текущий пользователь на автора.
+
+    {% is_following post.author as followed %}. Множество подписок
+    читается один раз за запрос, сколько бы карточек ни было на
+    странице.
+    """
+    request = context.get('request')
+    user = context.get('user') or getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return False
+    followed = getattr(request, '_following_ids', None)
+    if followed is None:
+        followed = follow_graph.following_ids(user)
+        if request is not None:
+            request._following_ids = followed
+    return getattr(author, 'pk', author) in followed
@@ -0,0 +1,16 @@
+from django import template
+from django.conf import settings
+
+from posts import cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_card_version(post):
+    return cards.card_version(post)
+
+
+@register.simple_tag
+def post_card_timeout():
+    return settings.POST_CARD_CACHE_TIMEOUT
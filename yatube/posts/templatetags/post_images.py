@@ -0,0 +1,37 @@
+from django import template
+from django.conf import settings
+
+from posts.images import FORMATS
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(post):
+    """<picture> с вариантами картинки поста по форматам и ширинам.
+
+    Варианты лучше выбирать через prefetch_related('image_variants').
+    Пока фоновая задача их не создала, выводится миниатюра sorl из
+    POST_THUMBNAIL_SIZES, которую та же задача создаёт первой.
+    """
+    by_format = {}
+    for variant in post.image_variants.all():
+        by_format.setdefault(variant.format, []).append(variant)
+    sources = [
+        {
+            'type': FORMATS[name][1],
+            'srcset': ', '.join(
+                f'{variant.image.url} {variant.width}w'
+                for variant in by_format[name]),
+            'variants': by_format[name],
+        }
+        for name in settings.IMAGE_VARIANT_FORMATS if name in by_format
+    ]
+    fallback = sources.pop() if sources else None
+    return {
+        'post': post,
+        'sources': sources,
+        'fallback': fallback,
+        'default': fallback and fallback['variants'][-1],
+        'sizes': settings.IMAGE_VARIANT_SIZES,
+    }
@@ -1,13 +1,25 @@
+import os
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 
+from PIL import Image
+
+from .. import images, thumbnails
+from ..forms import PostForm
+from ..uploads import LimitedTemporaryFileUploadHandler
 from ..models import Post, Group, Comment
 
 User = get_user_model()
@@ -145,3 +157,263 @@ class PostCreateFormTests(TestCase):
             reverse('posts:post_detail', kwargs={'post_id': self.post.id}))
         image_object = response.context['post'].image
         self.assertEqual(image_object, self.post.image)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   IMAGE_VARIANT_FORMATS=('webp', 'jpeg'))
+class ImageVariantTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Photographer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 500), color=(200, 0, 0)).save(buffer, 'PNG')
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('wide.png', buffer.getvalue()),
+        )
+
+    def test_build_variants(self):
+        """Варианты создаются для каждой ширины и формата."""
+        self.assertEqual(images.build_variants(self.post), 4)
+        variants = self.post.image_variants.order_by('format', 'width')
+        self.assertEqual(
+            [(v.format, v.width, v.height) for v in variants],
+            [('jpeg', 480, 170), ('jpeg', 960, 339),
+             ('webp', 480, 170), ('webp', 960, 339)],
+        )
+        with Image.open(variants[3].image.path) as image:
+            self.assertEqual(image.format, 'WEBP')
+            self.assertEqual(image.size, (960, 339))
+
+    def test_rebuild_replaces_variants(self):
+        """Повторная сборка не оставляет старых вариантов и файлов."""
+        images.build_variants(self.post)
+        old_paths = [v.image.path for v in self.post.image_variants.all()]
+        images.build_variants(self.post)
+        self.assertEqual(self.post.image_variants.count(), 4)
+        self.assertFalse(any(map(os.path.exists, old_paths)))
+
+    def test_feed_renders_srcset(self):
+        """Лента отдаёт <picture> с srcset, пока вариантов нет - миниатюру."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotContains(response, '<picture>')
+        self.assertContains(
+            response, 'class="card-img my-2" src="/media/cache/')
+        self.assertNotContains(response, self.post.image.url)
+
+        images.build_variants(self.post)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, '-480w.jpeg 480w')
+        self.assertContains(response, 'width="960" height="339"')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT,
+                   IMAGE_VARIANT_FORMATS=('webp', 'jpeg'))
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='Thumbnailer')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        buffer = BytesIO()
+        Image.new('RGB', (1000, 500), color=(0, 0, 200)).save(buffer, 'PNG')
+        self.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=self.user,
+            image=SimpleUploadedFile('thumb.png', buffer.getvalue()),
+        )
+
+    @staticmethod
+    def save_and_commit(form):
+        """Сохраняет форму и вызывает колбэки on_commit, как после коммита."""
+        with mock.patch('django.db.transaction.on_commit') as on_commit:
+            post = form.save()
+        for call in on_commit.call_args_list:
+            call[0][0]()
+        return post
+
+    def test_schedule_generates_in_memory_db_inline(self):
+        """С базой SQLite в памяти миниатюры создаются сразу."""
+        thumbnails.schedule(self.post.image.name)
+        self.assertEqual(self.post.image_variants.count(), 4)
+
+    def test_schedule_submits_to_pool(self):
+        """С обычной базой генерация уходит в пул, запрос её не ждёт."""
+        executor = mock.Mock()
+        with mock.patch.object(thumbnails, '_get_executor',
+                               return_value=executor), \
+                mock.patch('django.db.backends.sqlite3.base.DatabaseWrapper.'
+                           'is_in_memory_db', return_value=False):
+            thumbnails.schedule(self.post.image.name)
+        executor.submit.assert_called_once_with(
+            thumbnails._run, self.post.image.name)
+        self.assertFalse(self.post.image_variants.exists())
+
+    def test_form_save_schedules_after_commit(self):
+        """PostForm ставит генерацию после коммита и только для картинки."""
+        buffer = BytesIO()
+        Image.new('RGB', (20, 20)).save(buffer, 'PNG')
+        form = PostForm(data={'text': 'Новый пост'}, files={
+            'image': SimpleUploadedFile('new.png', buffer.getvalue())})
+        form.instance.author = self.user
+        self.assertTrue(form.is_valid(), form.errors)
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            post = self.save_and_commit(form)
+            schedule.assert_called_once_with(post.image.name)
+
+            form = PostForm(data={'text': 'Правка'}, instance=post)
+            self.assertTrue(form.is_valid(), form.errors)
+            schedule.reset_mock()
+            self.save_and_commit(form)
+            schedule.assert_not_called()
+
+    def test_warm_thumbnails(self):
+        """Команда обрабатывает все картинки и считает ошибки."""
+        Post.objects.create(text='Битая', author=self.user,
+                            image='posts/broken.png')
+        out, err = StringIO(), StringIO()
+        with mock.patch.object(thumbnails, 'pregenerate',
+                               side_effect=[5, OSError('broken')]) as warm:
+            call_command('warm_thumbnails', workers=1, batch_size=1,
+                         stdout=out, stderr=err)
+        self.assertEqual(warm.call_count, 2)
+        self.assertIn('Картинок обработано: 1, с ошибкой: 1', out.getvalue())
+        self.assertIn('broken', err.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class UploadProcessingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    @staticmethod
+    def get_upload(size, image_format='JPEG', name='photo.jpg', **options):
+        buffer = BytesIO()
+        Image.new('RGB', size, color=(0, 120, 0)).save(
+            buffer, image_format, **options)
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def get_form(self, upload):
+        return PostForm(data={'text': 'Текст'}, files={'image': upload})
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_oversized_file_rejected(self):
+        """Файл больше лимита отклоняется с ошибкой про размер."""
+        form = self.get_form(self.get_upload((50, 50)))
+        self.assertFalse(form.is_valid())
+        self.assertIn('МБ', form.errors['image'][0])
+
+    @override_settings(POST_IMAGE_MAX_BYTES=10)
+    def test_handler_stops_writing_over_limit(self):
+        """Обработчик не пишет на диск байты сверх лимита."""
+        handler = LimitedTemporaryFileUploadHandler()
+        handler.new_file('image', 'big.jpg', 'image/jpeg', 32)
+        for start in range(0, 32, 8):
+            handler.receive_data_chunk(b'x' * 8, start)
+        upload = handler.file_complete(32)
+        self.assertEqual(upload.size, 32)
+        self.assertEqual(len(upload.read()), 8)
+        upload.close()
+
+    @override_settings(POST_IMAGE_MAX_BYTES=100)
+    def test_post_create_rejects_oversized_upload(self):
+        """View создания поста отклоняет файл сверх лимита."""
+        client = Client()
+        client.force_login(User.objects.create_user(username='uploader'))
+        response = client.post(reverse('posts:post_create'), {
+            'text': 'Текст', 'image': self.get_upload((50, 50))})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertFalse(Post.objects.exists())
+
+    def test_post_create_checks_csrf(self):
+        """Замена обработчиков загрузки не отключает проверку CSRF."""
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(User.objects.create_user(username='uploader'))
+        response = client.post(
+            reverse('posts:post_create'), {'text': 'Текст'})
+        self.assertTemplateUsed(response, 'core/403csrf.html')
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels_rejected(self):
+        """Картинка с лишними пикселями отклоняется по заголовку."""
+        form = self.get_form(self.get_upload((200, 100)))
+        self.assertFalse(form.is_valid())
+        self.assertIn('200x100', form.errors['image'][0])
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_downscales_and_strips_exif(self):
+        """Большая картинка уменьшается и сохраняется без EXIF."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        form = self.get_form(
+            self.get_upload((400, 200), exif=exif.tobytes()))
+        self.assertTrue(form.is_valid(), form.errors)
+        form.instance.author = User.objects.create_user(username='Camera')
+        post = form.save()
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (100, 50))
+            self.assertNotIn('exif', image.info)
+
+    def test_small_image_kept(self):
+        """Небольшая картинка без EXIF сохраняется как есть."""
+        upload = self.get_upload((40, 20), 'PNG', name='small.png')
+        content = upload.read()
+        upload.seek(0)
+        form = self.get_form(upload)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertIs(form.cleaned_data['image'], upload)
+        upload.seek(0)
+        self.assertEqual(upload.read(), content)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, FILE_UPLOAD_MAX_MEMORY_SIZE=0,
+                   THUMBNAIL_PREGENERATE=False, DB_LOCKED_RETRY_DELAY=0)
+class PostCreateRetryTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_locked_write_retried_with_uploaded_file(self):
+        """Повтор после "database is locked" сохраняет пост с картинкой."""
+        client = Client()
+        client.force_login(User.objects.create_user(username='retry'))
+        buffer = BytesIO()
+        Image.new('RGB', (40, 20)).save(buffer, 'GIF')
+        original_save = Post.save
+        calls = []
+
+        def locked_once(post, *args, **kwargs):
+            original_save(post, *args, **kwargs)
+            calls.append(post.pk)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+
+        with mock.patch.object(Post, 'save', locked_once), \
+                self.assertLogs('core.retry', 'WARNING'):
+            client.post(reverse('posts:post_create'), {
+                'text': 'Пост с картинкой',
+                'image': SimpleUploadedFile('retry.gif', buffer.getvalue()),
+            })
+        self.assertEqual(len(calls), 2)
+        post = Post.objects.get()
+        self.assertTrue(os.path.exists(post.image.path))
@@ -1,6 +1,19 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
 
-from ..models import Group, Post, User
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, transaction
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from core.retry import retry_on_locked
+
+from .. import benchmark, transfer
+
+from ..models import AuthorStats, Comment, Follow, Group, Post, User
 
 
 class PostModelTest(TestCase):
@@ -28,3 +41,258 @@ class PostModelTest(TestCase):
                          msg='Post text error!!!')
         self.assertEqual(str_title, self.group.title,
                          msg='Group title error!!!')
+
+
+class CountersTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counter')
+        cls.group = Group.objects.create(
+            title='Первая группа',
+            slug='first',
+            description='Тестовое описание',
+        )
+        cls.other_group = Group.objects.create(
+            title='Вторая группа',
+            slug='second',
+            description='Тестовое описание',
+        )
+
+    def test_counters_follow_post_writes(self):
+        """Счётчики группы и автора меняются при записи постов."""
+        post = Post.objects.create(author=self.user, text='Пост',
+                                   group=self.group)
+        Post.objects.create(author=self.user, text='Ещё пост')
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(AuthorStats.objects.get(user=self.user).posts_count,
+                         2)
+
+        post.group = self.other_group
+        post.save()
+        self.group.refresh_from_db()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+        self.assertEqual(self.other_group.posts_count, 1)
+
+        post.delete()
+        self.other_group.refresh_from_db()
+        self.assertEqual(self.other_group.posts_count, 0)
+        self.assertEqual(AuthorStats.objects.get(user=self.user).posts_count,
+                         1)
+
+    def test_counters_follow_comment_and_follow_writes(self):
+        """Счётчики подписок и комментариев меняются при записи."""
+        reader = User.objects.create_user(username='reader')
+        post = Post.objects.create(author=self.user, text='Пост')
+        follow = Follow.objects.create(user=reader, author=self.user)
+        Comment.objects.create(post=post, author=reader, text='Коммент')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.user.stats.followers_count, 1)
+        self.assertEqual(AuthorStats.objects.get(user=reader).following_count,
+                         1)
+
+        follow.delete()
+        self.assertEqual(AuthorStats.objects.get(user=self.user)
+                         .followers_count, 0)
+
+    def test_rebuild_stats_command_fixes_counters(self):
+        """rebuild_stats находит и исправляет рассинхронизацию."""
+        Post.objects.create(author=self.user, text='Пост', group=self.group)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=7)
+        AuthorStats.objects.filter(user=self.user).update(posts_count=0)
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_stats', verify=True, stdout=StringIO())
+        call_command('rebuild_stats', stdout=StringIO())
+        call_command('rebuild_stats', verify=True, stdout=StringIO())
+
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(AuthorStats.objects.get(user=self.user).posts_count,
+                         1)
+
+
+class FeedIndexesTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='indexed')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='indexed', description='Описание')
+        post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+        Comment.objects.create(post=post, author=cls.reader, text='Да')
+
+    def test_follow_is_unique(self):
+        """Повторная подписка на того же автора запрещена базой."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_explain_views_finds_no_unindexed_queries(self):
+        """Запросы лент идут по индексам без сортировки после выборки."""
+        out = StringIO()
+        call_command('explain_views', strict=True, stdout=out)
+        self.assertIn('group_list: запросов', out.getvalue())
+        self.assertIn('Запросов без индекса: 0', out.getvalue())
+
+
+class TransferCommandsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.mkdtemp()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='writer')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='transfer', description='Описание')
+        self.posts = [
+            Post.objects.create(text=f'Пост {number}', author=self.author,
+                                group=self.group)
+            for number in range(5)
+        ]
+        Post.objects.filter(pk=self.posts[0].pk).update(
+            pub_date='2001-02-03T04:05:06Z')
+        Comment.objects.create(
+            post=self.posts[0], author=self.reader, text='Комментарий')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def export(self, model, name):
+        call_command('export_posts', model=model, output=self.path(name),
+                     stderr=StringIO())
+
+    def import_(self, model, name, **options):
+        call_command('import_posts', self.path(name), model=model,
+                     stdout=StringIO(), stderr=StringIO(), **options)
+
+    def test_round_trip(self):
+        """Выгруженные данные загружаются обратно со связями и датами."""
+        files = (('groups', 'groups.csv'), ('posts', 'posts.ndjson'),
+                 ('comments', 'comments.csv'), ('follows', 'follows.ndjson'))
+        for model, name in files:
+            self.export(model, name)
+        old_date = Post.objects.get(pk=self.posts[0].pk).pub_date
+        User.objects.all().delete()
+        Group.objects.all().delete()
+
+        for model, name in files:
+            self.import_(model, name, batch_size=2)
+
+        post = Post.objects.get(pk=self.posts[0].pk)
+        self.assertEqual(post.pub_date, old_date)
+        self.assertEqual(post.group.slug, 'transfer')
+        self.assertEqual(post.author.username, 'writer')
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Post.objects.count(), 5)
+        reader = User.objects.get(username='reader')
+        self.assertEqual(reader.timeline.count(), 5)
+        self.assertEqual(AuthorStats.objects.get(
+            user__username='writer').followers_count, 1)
+
+    def test_reimport_is_idempotent(self):
+        """Повторный импорт не дублирует строки."""
+        self.export('posts', 'posts.ndjson')
+        self.import_('posts', 'posts.ndjson')
+        self.assertEqual(Post.objects.count(), 5)
+
+    def test_import_batch_counts_inserted_rows(self):
+        """Уже сохранённые строки и повторы в пачке не считаются."""
+        self.export('posts', 'posts.ndjson')
+        with open(self.path('posts.ndjson'), encoding='utf-8') as file:
+            rows = list(transfer.read_rows(file, 'ndjson'))
+        old_date = Post.objects.get(pk=self.posts[0].pk).pub_date
+        Post.objects.filter(
+            pk__in=[self.posts[0].pk, self.posts[1].pk]).delete()
+
+        saved = transfer.import_batch('posts', rows + rows[:1])
+        self.assertEqual(saved, (2, 4))
+        self.assertEqual(transfer.import_batch('posts', rows), (0, 5))
+        self.assertEqual(Post.objects.get(pk=self.posts[0].pk).pub_date,
+                         old_date)
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+
+    def test_resume_from_checkpoint(self):
+        """Импорт продолжается со строки, сохранённой в checkpoint."""
+        self.export('posts', 'posts.ndjson')
+        Post.objects.all().delete()
+        with open(self.path('posts.ndjson.checkpoint'), 'w') as file:
+            json.dump({'path': self.path('posts.ndjson'), 'model': 'posts',
+                       'rows': 3}, file)
+        self.import_('posts', 'posts.ndjson')
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertFalse(os.path.exists(self.path('posts.ndjson.checkpoint')))
+
+
+@override_settings(DB_LOCKED_RETRIES=2, DB_LOCKED_RETRY_DELAY=0)
+class SQLiteTuningTest(SimpleTestCase):
+    databases = {'default'}
+
+    def test_pragmas_applied_on_connect(self):
+        """Подключение получает прагмы из core.backends.sqlite3."""
+        with connection.cursor() as cursor:
+            for pragma, expected in (('synchronous', 1),
+                                     ('busy_timeout', 5000),
+                                     ('cache_size', -32 * 1024),
+                                     ('temp_store', 2)):
+                cursor.execute(f'PRAGMA {pragma}')
+                self.assertEqual(cursor.fetchone()[0], expected, pragma)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_retry_on_locked(self):
+        """Занятая база - повтор, исчерпанные попытки - ошибка."""
+        calls = []
+
+        @retry_on_locked
+        def flaky(failures):
+            calls.append(1)
+            if len(calls) <= failures:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        with self.assertLogs('core.retry', 'WARNING'):
+            self.assertEqual(flaky(2), 'ok')
+        self.assertEqual(len(calls), 3)
+        calls.clear()
+        with self.assertLogs('core.retry', 'WARNING'):
+            with self.assertRaises(OperationalError):
+                flaky(3)
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_not_retried(self):
+        calls = []
+
+        @retry_on_locked
+        def broken():
+            calls.append(1)
+            raise OperationalError('no such table: posts_post')
+
+        with self.assertRaises(OperationalError):
+            broken()
+        self.assertEqual(len(calls), 1)
+
+    def test_concurrency_benchmark(self):
+        """Под параллельной записью настроенный бэкенд не падает."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        result = benchmark.concurrency(
+            'tuned', directory, writers=3, readers=2, seconds=0.5, posts=20)
+        self.assertGreater(result['writes'], 0)
+        self.assertGreater(result['reads'], 0)
+        self.assertEqual(result['locked'], 0)
@@ -1,10 +1,39 @@
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from array import array
+from http import HTTPStatus
+from importlib import import_module
+from io import StringIO
+from unittest import mock
+
 from django import forms
+from django.apps import apps
 from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import TestCase, Client
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, router
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.test import (SimpleTestCase, TestCase, Client, RequestFactory,
+                         override_settings)
+from django.template import Context, Template
 from django.urls import reverse
 
-from ..models import Post, Group, User, Follow
+from core.db_router import replica_reads
+from core.testing import QueryBudgetMixin
+
+from .. import (benchmark, cache_tags, follow_graph, groups, hot,
+                write_queue)
+from ..models import (AuthorStats, Comment, Post, Group, GroupAuthorStats,
+                      GroupStats, User, Follow, ImageVariant, TimelineEntry)
+from ..page_cache import cache_anonymous_page
+from ..search import FTS_TABLE, ScanResults
+from ..utils import FeedPaginator
 
 
 class PostPagesTests(TestCase):
@@ -29,6 +58,7 @@ class PostPagesTests(TestCase):
         )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.user)
 
@@ -107,15 +137,55 @@ class PostPagesTests(TestCase):
         """Тестирование кеширования главной страницы."""
         cache.clear()
         response = self.client.get(reverse('posts:index'))
-        post = Post.objects.get(id=1)
         cache_save = response.content
-        post.delete()
+        Post.objects.filter(id=1).update(text='Правка в обход сигналов')
         response = self.client.get(reverse('posts:index'))
         self.assertEqual(response.content, cache_save)
         cache.clear()
         response = self.client.get(reverse('posts:index'))
         self.assertNotEqual(response.content, cache_save)
 
+    def test_cache_index_page_purged_on_post_delete(self):
+        """Удаление поста сбрасывает закешированную главную."""
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        cache_save = response.content
+        Post.objects.get(id=1).delete()
+        response = self.client.get(reverse('posts:index'))
+        self.assertNotEqual(response.content, cache_save)
+
+    def test_index_page_revalidated_with_etag(self):
+        """Главная отвечает 304 на условный запрос с актуальным ETag."""
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = self.client.get(reverse('posts:index'),
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_purge_repeated_after_commit(self):
+        """Страница, закешированная до коммита, сбрасывается после него."""
+        cache.clear()
+        callbacks = len(connection.run_on_commit)
+        Post.objects.create(text='Новый', author=self.user)
+        purges = connection.run_on_commit[callbacks:]
+        etag = self.client.get(reverse('posts:index'))['ETag']
+        for _, callback in purges:
+            callback()
+        response = self.client.get(reverse('posts:index'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_old_group_url_purged_on_slug_change(self):
+        cache.clear()
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.client.get(url)
+        group = Group.objects.get(pk=self.group.pk)
+        group.slug = 'renamed'
+        group.save()
+        self.assertEqual(self.client.get(url).status_code,
+                         HTTPStatus.NOT_FOUND)
+
 
 class FollowPagesTests(TestCase):
 
@@ -136,6 +206,7 @@ class FollowPagesTests(TestCase):
             )
 
     def setUp(self):
+        cache.clear()
         self.follower_client = Client()
         self.follower_client.force_login(self.follower_user)
         self.unfollower_client = Client()
@@ -177,6 +248,55 @@ class FollowPagesTests(TestCase):
         follow_posts = len(response.context['page_obj'])
         self.assertEqual(follow_posts, 0)
 
+    def test_follow_state_cached_and_invalidated(self):
+        """Подписки на целую страницу авторов - не больше одного запроса,
+        подписка и отписка сразу видны."""
+        authors = [self.author, self.unfollower_user]
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                follow_graph.is_following(self.follower_user, authors),
+                {self.author.pk: True, self.unfollower_user.pk: False})
+        with self.assertNumQueries(0):
+            follow_graph.is_following(self.follower_user, authors)
+            follow_graph.is_following(AnonymousUser(), authors)
+        self.follower_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'noname'}))
+        self.assertTrue(follow_graph.is_following(
+            self.follower_user, [self.unfollower_user.pk])[
+                self.unfollower_user.pk])
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': 'following'}))
+        self.assertEqual(follow_graph.following_ids(self.follower_user),
+                         {self.unfollower_user.pk})
+
+    def test_follow_state_invalidated_after_commit(self):
+        """Подписки, прочитанные до коммита, сбрасываются после него."""
+        callbacks = len(connection.run_on_commit)
+        follow = Follow.objects.create(
+            user=self.follower_user, author=self.unfollower_user)
+        invalidations = connection.run_on_commit[callbacks:]
+        cache.set(follow_graph.FOLLOWING_KEY.format(self.follower_user.pk),
+                  array(follow_graph.TYPECODE).tobytes())
+        for _, callback in invalidations:
+            callback()
+        self.assertIn(follow.author_id,
+                      follow_graph.following_ids(self.follower_user))
+
+    def test_follow_state_tag(self):
+        """Тег is_following читает подписки один раз на запрос."""
+        template = Template(
+            '{% load follow_state %}{% for author in authors %}'
+            '{% is_following author as followed %}'
+            '{% if followed %}1{% else %}0{% endif %} '
+            '{% endfor %}')
+        request = RequestFactory().get('/')
+        request.user = self.follower_user
+        authors = [self.author, self.unfollower_user] * 5
+        with self.assertNumQueries(1):
+            rendered = template.render(
+                Context({'request': request, 'authors': authors}))
+        self.assertEqual(rendered.split(), ['1', '0'] * 5)
+
 
 class PaginatorViewsTest(TestCase):
     @classmethod
@@ -196,6 +316,7 @@ class PaginatorViewsTest(TestCase):
             )
 
     def setUp(self):
+        cache.clear()
         self.authorized_client = Client()
 
     def test_index_page_contains_ten_records(self):
@@ -240,3 +361,995 @@ class PaginatorViewsTest(TestCase):
         self.assertEqual(len(response.context['page_obj']),
                          (Post.objects.count()
                           - settings.COUNT_OF_POSTS_DEFAULT))
+
+    def test_index_cursor_pages(self):
+        """Keyset-пагинация index: 10 постов, затем 3, и обратно."""
+        response = self.client.get(reverse('posts:index'), {'cursor': ''})
+        first_page = response.context['page_obj']
+        self.assertEqual(len(first_page), settings.COUNT_OF_POSTS_DEFAULT)
+        self.assertFalse(first_page.has_previous())
+
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': first_page.next_cursor})
+        second_page = response.context['page_obj']
+        self.assertEqual(len(second_page), (Post.objects.count()
+                                            - settings.COUNT_OF_POSTS_DEFAULT))
+        self.assertFalse(second_page.has_next())
+
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': second_page.previous_cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+
+    def test_group_list_broken_cursor_returns_first_page(self):
+        """Испорченный курсор group_list открывает первую страницу."""
+        response = self.client.get(reverse('posts:group_list', kwargs={
+            'slug': 'test_slug'}), {'cursor': 'not-a-cursor'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj[0],
+                         Post.objects.order_by('-pub_date', '-id').first())
+        self.assertEqual(len(page_obj), settings.COUNT_OF_POSTS_DEFAULT)
+
+
+class TimelineTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.follower = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.old_post = Post.objects.create(
+            text='Пост до подписки',
+            author=cls.author,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def test_timeline_filled_on_follow_and_post(self):
+        """Лента заполняется при подписке и при публикации поста."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(
+            set(self.follower.timeline.values_list('post_id', flat=True)),
+            {self.old_post.id, new_post.id},
+        )
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [new_post, self.old_post])
+
+    def test_timeline_pruned_on_unfollow(self):
+        """После отписки посты автора пропадают из ленты."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        self.follower_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertFalse(self.follower.timeline.exists())
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=0)
+    def test_fanout_on_read_for_popular_authors(self):
+        """Посты популярных авторов подмешиваются в ленту при чтении."""
+        Follow.objects.create(user=self.follower, author=self.author)
+        cache.clear()
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(self.follower.timeline.filter(
+            post=new_post).exists())
+        response = self.follower_client.get(reverse('posts:follow_index'))
+        self.assertIn(new_post, response.context['page_obj'])
+
+    @override_settings(TIMELINE_FANOUT_MAX_FOLLOWERS=1)
+    def test_timelines_reconciled_when_author_drops_below_limit(self):
+        """Посты и подписки периода fan-out-on-read попадают в ленты."""
+        other = User.objects.create_user(username='other_reader')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=other, author=self.author)
+        self.assertTrue(AuthorStats.objects.get(
+            user=self.author).fanout_on_read)
+        late = User.objects.create_user(username='late_reader')
+        Follow.objects.create(user=late, author=self.author)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertFalse(TimelineEntry.objects.filter(post=new_post).exists())
+
+        Follow.objects.filter(user=other).get().delete()
+        Follow.objects.filter(user=late).get().delete()
+        self.assertFalse(AuthorStats.objects.get(
+            user=self.author).fanout_on_read)
+        self.assertEqual(
+            set(self.follower.timeline.values_list('post_id', flat=True)),
+            {self.old_post.id, new_post.id},
+        )
+
+
+class PageWindowTest(TestCase):
+
+    def test_page_window_is_bounded(self):
+        """Окно пагинатора не зависит от общего числа страниц."""
+        paginator = FeedPaginator(Post.objects.all(), 10, count=10_000)
+        page_window = paginator.get_page_window(500, on_each_side=3)
+        self.assertEqual(list(page_window), list(range(497, 504)))
+        self.assertEqual(list(paginator.get_page_window(1, on_each_side=3)),
+                         [1, 2, 3, 4])
+
+
+class PostCardCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='card_author')
+        cls.group = Group.objects.create(
+            slug='cards',
+            title='Карточки',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            text='Исходный текст',
+            author=cls.user,
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('posts:group_list', kwargs={'slug': 'cards'})
+
+    def test_card_is_served_from_cache(self):
+        """Карточка берётся из кеша, пока пост не менялся через ORM."""
+        self.client.get(self.url)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Исходный текст')
+
+    def test_card_invalidated_on_post_edit(self):
+        """Правка поста сбрасывает его карточку."""
+        self.client.get(self.url)
+        self.post.text = 'Новый текст'
+        self.post.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Новый текст')
+
+    def test_card_invalidated_on_author_change(self):
+        """Правка автора сбрасывает карточки его постов."""
+        self.client.get(self.url)
+        self.user.first_name = 'Лев'
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, 'Лев')
+
+
+class SearchViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='searcher')
+        cls.group = Group.objects.create(
+            slug='cats',
+            title='Коты',
+            description='Тестовое описание',
+        )
+        cls.best = Post.objects.create(
+            text='Кот кот кот и ещё раз кот',
+            author=cls.user,
+            group=cls.group,
+        )
+        cls.other = Post.objects.create(
+            text='Один кот среди собак',
+            author=cls.user,
+        )
+        Post.objects.create(text='Про собак', author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_search_ranks_results(self):
+        """Поиск находит посты и ставит релевантные выше."""
+        response = self.client.get(reverse('posts:search'), {'q': 'КОТ'})
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.best, self.other])
+
+    @override_settings(FEED_CURSOR_PAGINATION=True, COUNT_OF_POSTS_DEFAULT=1)
+    def test_search_paginated_by_pages_in_cursor_mode(self):
+        """Поиск листается по ?page= и при ленте в keyset-режиме."""
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(list(response.context['page_obj']), [self.best])
+        self.assertContains(
+            response, 'href="?q=%D0%BA%D0%BE%D1%82&amp;page=2"')
+
+    def test_search_filters_by_group(self):
+        """Поиск можно ограничить группой."""
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': 'кот', 'group': 'cats'})
+        self.assertEqual(list(response.context['page_obj']), [self.best])
+
+    def test_search_follows_post_edits(self):
+        """Индекс обновляется при правке и удалении поста."""
+        other = Post.objects.get(pk=self.other.pk)
+        other.text = 'Теперь про попугаев'
+        other.save()
+        Post.objects.get(pk=self.best.pk).delete()
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+        response = self.client.get(reverse('posts:search'),
+                                   {'q': 'попугаев'})
+        self.assertEqual(list(response.context['page_obj']), [self.other])
+
+    def test_scan_fallback_ranks_results(self):
+        """Запасной поиск без FTS ранжирует так же."""
+        results = ScanResults(['кот'], {})
+        self.assertEqual(results[0:10], [self.best, self.other])
+
+    def test_reindex_command_restores_index(self):
+        """reindex_posts заполняет индекс заново."""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        call_command('reindex_posts', stdout=StringIO())
+        response = self.client.get(reverse('posts:search'), {'q': 'собак'})
+        self.assertEqual(len(response.context['page_obj']), 2)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='budget')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='budget', description='Описание')
+        for number in range(15):
+            Post.objects.create(
+                text=f'Пост номер {number}', author=cls.author,
+                group=cls.group)
+        cls.post = Post.objects.first()
+        for number in range(5):
+            Comment.objects.create(
+                post=cls.post, author=User.objects.create_user(
+                    username=f'commenter{number}'), text='Комментарий')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_views_fit_query_budgets(self):
+        """Страницы укладываются в QUERY_BUDGETS и не повторяют запросы."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:hot'),
+            reverse('posts:group_index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'budget'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:search') + '?q=пост',
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertQueryBudget(response)
+
+    def test_comment_authors_are_not_queried_one_by_one(self):
+        """Авторы комментариев загружаются вместе с комментариями."""
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}))
+        stats = response.wsgi_request.query_stats
+        self.assertEqual(stats.duplicates, {})
+        self.assertEqual(len(response.context['comments']), 5)
+
+
+@override_settings(COMMENTS_PER_PAGE=10)
+class CommentFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='commented')
+        cls.post = Post.objects.create(text='Обсуждаемый', author=cls.author)
+        cls.users = [User.objects.create_user(username=f'user{number}')
+                     for number in range(25)]
+        for number, user in enumerate(cls.users):
+            Comment.objects.create(
+                post=cls.post, author=user, text=f'Комментарий {number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_detail(self, **params):
+        return self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            params)
+
+    def test_first_page_of_comments(self):
+        """Под постом первая порция комментариев и курсор дальше."""
+        response = self.get_detail()
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            [f'Комментарий {number}' for number in range(10)])
+        self.assertTrue(comments.has_next())
+        self.assertContains(response, 'Показать ещё')
+
+    def test_load_more_returns_next_comments(self):
+        """Фрагмент по курсору продолжает ленту комментариев."""
+        cursor = self.get_detail().context['comments'].next_cursor
+        response = self.client.get(
+            reverse('posts:post_comments', kwargs={'post_id': self.post.pk}),
+            {'cursor': cursor})
+        texts = [comment.text for comment in response.context['comments']]
+        self.assertEqual(texts[0], 'Комментарий 10')
+        self.assertEqual(len(texts), 10)
+        self.assertNotContains(response, '<html')
+
+    def test_query_count_does_not_grow_with_comments(self):
+        """Число запросов не зависит от количества комментариев."""
+        queries = self.get_detail().wsgi_request.query_stats.queries
+        for user in self.users:
+            Comment.objects.create(post=self.post, author=user, text='Ещё')
+        cache.clear()
+        self.assertEqual(
+            self.get_detail().wsgi_request.query_stats.queries, queries)
+
+
+class BenchmarkTests(TestCase):
+
+    def test_seed_and_run(self):
+        """Прогон на маленьком объёме даёт метрики по сценариям."""
+        volumes = benchmark.Volumes(
+            users=4, groups=1, follows=6, posts=12, images=0, comments=5)
+        benchmark.seed(volumes)
+        self.assertEqual(Post.objects.count(), 12)
+        results = benchmark.run(iterations=2, warmup=0, alloc_iterations=1,
+                                only=('index', 'add_comment'))
+        self.assertEqual(set(results), {'index', 'add_comment'})
+        for result in results.values():
+            self.assertGreater(result['queries'], 0)
+            self.assertGreaterEqual(result['p95'], result['p50'])
+
+    @override_settings(RATE_LIMITS={'add_comment': (1, 60)})
+    def test_run_ignores_rate_limits(self):
+        """Все запросы прогона доходят до view, а не получают 429."""
+        benchmark.seed(benchmark.Volumes(
+            users=2, groups=1, follows=2, posts=2, images=0, comments=0))
+        benchmark.run(iterations=2, warmup=2, alloc_iterations=1,
+                      only=('add_comment',))
+        self.assertEqual(Comment.objects.count(), 5)
+
+    def test_percentile(self):
+        """Перцентиль считается без statistics.quantiles."""
+        self.assertEqual(benchmark._percentile([5.0], 95), 5.0)
+        self.assertEqual(benchmark._percentile([4, 1, 3, 2], 50), 2.5)
+        self.assertAlmostEqual(
+            benchmark._percentile(list(range(101)), 95), 95)
+
+    def test_compare_reports_regressions(self):
+        """Рост запросов и времени сверх допуска считается регрессией."""
+        baseline = {'index': {'p50': 10, 'p95': 20, 'queries': 5,
+                              'alloc_kib': 100}}
+        results = {'index': {'p50': 11, 'p95': 30, 'queries': 6,
+                             'alloc_kib': 100}}
+        self.assertEqual(
+            benchmark.compare(results, baseline, tolerance=0.2),
+            [('index', 'p95', 20, 30), ('index', 'queries', 5, 6)])
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaPageCacheTests(SimpleTestCase):
+
+    def test_page_cache_filled_from_primary_after_purge(self):
+        """Сразу после сброса тега страница для кеша читается с основной."""
+        cache.clear()
+
+        @replica_reads
+        @cache_anonymous_page(lambda: ['replica-test'])
+        def view(request):
+            return HttpResponse(router.db_for_read(Post))
+
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        cache_tags.purge('replica-test')
+        self.assertEqual(view(request).content, b'default')
+
+        cache.set(cache_tags.TAG_KEY.format('replica-test'),
+                  time.time_ns() - 10**9 * (settings.REPLICA_PIN_SECONDS + 1))
+        self.assertEqual(view(request).content, b'replica')
+
+
+class ApiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='api_author')
+        cls.group = Group.objects.create(title='API', slug='api')
+        cls.posts = [
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Пост {number}')
+            for number in range(12)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages_and_sparse_fields(self):
+        """Курсор обходит всю ленту, в ответе только запрошенные поля."""
+        url = reverse('posts:api_group_list', kwargs={'slug': 'api'})
+        response = self.client.get(url, {'fields': 'id,author', 'limit': 5})
+        ids = []
+        while True:
+            data = response.json()
+            for item in data['results']:
+                self.assertEqual(set(item), {'id', 'author'})
+                self.assertEqual(item['author'], 'api_author')
+            ids += [item['id'] for item in data['results']]
+            if data['next'] is None:
+                break
+            response = self.client.get(data['next'])
+        self.assertEqual(ids, [post.pk for post in reversed(self.posts)])
+
+    def test_image_urls_in_two_queries(self):
+        """Картинка с вариантами добавляется одним запросом на страницу."""
+        post = self.posts[-1]
+        Post.objects.filter(pk=post.pk).update(image='posts/api.png')
+        ImageVariant.objects.create(
+            post=post, image='posts/variants/api-480.webp', format='webp',
+            width=480, height=170)
+        with self.assertNumQueries(2):
+            response = self.client.get(
+                reverse('posts:api_index'), {'fields': 'id,image'})
+        first, second = response.json()['results'][:2]
+        self.assertEqual(first['image'], {
+            'url': '/media/posts/api.png',
+            'variants': [{'format': 'webp', 'width': 480, 'height': 170,
+                          'url': '/media/posts/variants/api-480.webp'}],
+        })
+        self.assertIsNone(second['image'])
+
+    def test_conditional_get(self):
+        """Неизменившаяся лента отдаёт 304 и авторизованным клиентам."""
+        client = Client()
+        client.force_login(self.author)
+        url = reverse('posts:api_profile', kwargs={'username': 'api_author'})
+        etag = client.get(url)['ETag']
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            HTTPStatus.NOT_MODIFIED)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'][0]['text'], 'Свежий пост')
+
+    def test_errors(self):
+        response = self.client.get(reverse('posts:api_index'),
+                                   {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('password', response.json()['detail'])
+        response = self.client.get(reverse('posts:api_index'),
+                                   {'limit': 1000})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.get(
+            reverse('posts:api_profile', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class AdminChangelistTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.group = Group.objects.create(title='Админка', slug='admin')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def add_rows(self, number):
+        for _ in range(number):
+            author = User.objects.create_user(
+                username=f'author{User.objects.count()}')
+            post = Post.objects.create(author=author, group=self.group,
+                                       text='Пост')
+            Comment.objects.create(post=post, author=author, text='Текст')
+            Follow.objects.create(user=self.admin, author=author)
+
+    def changelist_queries(self, model):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse(f'admin:posts_{model}_changelist'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        return [query['sql'] for query in queries.captured_queries]
+
+    def test_changelists_without_n_plus_one_and_count(self):
+        """Число запросов не растёт со строками, COUNT(*) не нужен."""
+        for model in ('post', 'comment', 'follow'):
+            with self.subTest(model=model):
+                self.add_rows(2)
+                before = self.changelist_queries(model)
+                self.add_rows(5)
+                after = self.changelist_queries(model)
+                self.assertEqual(len(after), len(before))
+                self.assertFalse(
+                    [sql for sql in after if 'COUNT(' in sql.upper()])
+
+    def run_action(self, model, action, objects):
+        return self.client.post(
+            reverse(f'admin:posts_{model}_changelist'),
+            {'action': action,
+             '_selected_action': [obj.pk for obj in objects]})
+
+    def test_remove_from_group_single_update(self):
+        self.add_rows(3)
+        posts = list(Post.objects.all())
+        self.run_action('post', 'remove_from_group', posts)
+        self.assertFalse(Post.objects.exclude(group=None).exists())
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_delete_comments_updates_counters(self):
+        self.add_rows(3)
+        comments = list(Comment.objects.all()[:2])
+        scores = dict(Post.objects.values_list('pk', 'hot_score'))
+        self.run_action('comment', 'delete_comments', comments)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(
+            sorted(Post.objects.values_list('comments_count', flat=True)),
+            [0, 0, 1])
+        for comment in comments:
+            self.assertAlmostEqual(
+                Post.objects.get(pk=comment.post_id).hot_score,
+                scores[comment.post_id] - settings.HOT_COMMENT_WEIGHT,
+                places=3)
+
+    def test_bulk_deletes_take_fixed_number_of_queries(self):
+        """Запросов столько же, сколько бы строк ни удалялось."""
+        for model, action in ((Comment, 'delete_comments'),
+                              (Follow, 'delete_follows')):
+            with self.subTest(action=action):
+                counts = []
+                for rows in (2, 6):
+                    self.add_rows(rows)
+                    with CaptureQueriesContext(connection) as queries:
+                        self.run_action(model._meta.model_name, action,
+                                        model.objects.all())
+                    self.assertFalse(model.objects.exists())
+                    counts.append(len(queries))
+                self.assertEqual(counts[0], counts[1])
+
+    def test_delete_follows_like_unfollow(self):
+        """Массовая отписка правит счётчики, ленты и кеш подписок."""
+        self.add_rows(3)
+        self.assertEqual(len(follow_graph.following_ids(self.admin)), 3)
+        self.run_action('follow', 'delete_follows', Follow.objects.all())
+        self.assertFalse(Follow.objects.exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(follow_graph.following_ids(self.admin), set())
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.admin).following_count, 0)
+        self.assertEqual(set(AuthorStats.objects.exclude(
+            user=self.admin).values_list('followers_count', flat=True)), {0})
+
+
+@override_settings(HOT_COMMENT_WEIGHT=1.0, HOT_AUTHOR_WEIGHT=0.5,
+                   HOT_HALF_LIFE=3600, HOT_SCORE_FLOOR=0.01)
+class HotFeedTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='hot_author')
+        cls.reader = User.objects.create_user(username='hot_reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.quiet = Post.objects.create(author=cls.reader, text='Тихий')
+        cls.popular = Post.objects.create(author=cls.author, text='Горячий')
+
+    def setUp(self):
+        cache.clear()
+
+    def score(self, post):
+        return Post.objects.values_list('hot_score', flat=True).get(
+            pk=post.pk)
+
+    def test_scores_updated_incrementally(self):
+        """Новый пост получает вес автора, комментарий - прибавку."""
+        self.assertEqual(self.score(self.quiet), 0)
+        self.assertAlmostEqual(self.score(self.popular),
+                               0.5 * math.log1p(1))
+        before = self.score(self.quiet)
+        Comment.objects.create(post=self.quiet, author=self.author,
+                               text='Комментарий')
+        self.assertAlmostEqual(self.score(self.quiet), before + 1)
+
+    def test_feed_ordered_by_score(self):
+        for _ in range(2):
+            Comment.objects.create(post=self.quiet, author=self.author,
+                                   text='Комментарий')
+        response = self.client.get(reverse('posts:hot'))
+        self.assertEqual(list(response.context['page_obj'])[:2],
+                         [self.quiet, self.popular])
+        self.assertContains(response, 'Популярное')
+
+    def test_comment_purges_hot_feed(self):
+        """Новый комментарий сразу меняет порядок в кеше ленты."""
+        url = reverse('posts:hot')
+        self.assertEqual(self.client.get(url).context['page_obj'][0],
+                         self.popular)
+        for _ in range(2):
+            Comment.objects.create(post=self.quiet, author=self.author,
+                                   text='Комментарий')
+        self.assertEqual(self.client.get(url).context['page_obj'][0],
+                         self.quiet)
+
+    @override_settings(FEED_CURSOR_PAGINATION=True)
+    def test_feed_paginated_by_page_numbers(self):
+        """Счёт меняется между запросами, поэтому курсоров в ленте нет."""
+        response = self.client.get(reverse('posts:hot'))
+        self.assertFalse(getattr(response.context['page_obj'],
+                                 'is_cursor', False))
+
+    def test_decay_halves_and_floors_scores(self):
+        """За период полураспада счёт падает вдвое, малый - до нуля."""
+        Post.objects.filter(pk=self.quiet.pk).update(hot_score=0.015)
+        popular = self.score(self.popular)
+        etag = self.client.get(reverse('posts:hot'))['ETag']
+        call_command('decay_hot_scores', interval=3600, stdout=StringIO())
+        self.assertAlmostEqual(self.score(self.popular), popular / 2)
+        self.assertEqual(self.score(self.quiet), 0)
+        response = self.client.get(reverse('posts:hot'),
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_rebuild_matches_incremental_scores(self):
+        Comment.objects.create(post=self.quiet, author=self.author,
+                               text='Комментарий')
+        expected = {post.pk: self.score(post)
+                    for post in (self.quiet, self.popular)}
+        Post.objects.update(hot_score=0)
+        call_command('decay_hot_scores', rebuild=True, stdout=StringIO())
+        for post_id, score in expected.items():
+            self.assertAlmostEqual(
+                Post.objects.get(pk=post_id).hot_score, score, places=3)
+
+    def test_rebuild_skips_posts_created_meanwhile(self):
+        """Комментарий к посту, которого не было в выборке, не ломает счёт."""
+        Comment.objects.create(post=self.popular, author=self.reader,
+                               text='Комментарий')
+        before = self.score(self.popular)
+        meanwhile = Post.objects.exclude(pk=self.popular.pk).order_by()
+        with mock.patch.object(Post.objects, 'order_by',
+                               return_value=meanwhile):
+            self.assertEqual(hot.rebuild(), 1)
+        self.assertEqual(self.score(self.popular), before)
+
+
+class GroupIndexTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.group = Group.objects.create(
+            title='Каталог', slug='catalog', description='Описание')
+        cls.other = Group.objects.create(
+            title='Другая', slug='other', description='Описание')
+        cls.authors = [User.objects.create_user(username=f'member{number}')
+                       for number in range(4)]
+        for number, author in enumerate(cls.authors):
+            for _ in range(number + 1):
+                Post.objects.create(author=author, group=cls.group,
+                                    text='Пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def test_stats_follow_post_writes(self):
+        """Статистика группы меняется при создании, переносе и удалении."""
+        stats = self.stats(self.group)
+        self.assertEqual(stats.top_author_list,
+                         ['member3', 'member2', 'member1'])
+        self.assertEqual(stats.last_post_at, self.group.posts.latest(
+            'pub_date').pub_date)
+        moved = list(self.authors[3].posts.all())
+        for post in moved[:3]:
+            post.group = self.other
+            post.save()
+        self.assertEqual(self.stats(self.group).top_author_list,
+                         ['member2', 'member1', 'member0'])
+        self.assertEqual(self.stats(self.other).top_author_list,
+                         ['member3'])
+        self.authors[2].posts.all().delete()
+        self.assertEqual(self.stats(self.group).top_author_list,
+                         ['member1', 'member0', 'member3'])
+
+    def test_stats_updated_without_recount(self):
+        """Пост в группе - три запроса, удаление нового сдвигает время."""
+        post = Post(author=self.authors[0], group=self.group, text='Пост')
+        post.save()
+        self.assertEqual(self.stats(self.group).last_post_at, post.pub_date)
+        groups.post_removed(post)
+        with self.assertNumQueries(3):
+            groups.post_added(post)
+        previous = self.group.posts.exclude(pk=post.pk).latest(
+            'pub_date').pub_date
+        post.delete()
+        self.assertEqual(self.stats(self.group).last_post_at, previous)
+
+    def test_rebuild_matches_incremental_stats(self):
+        expected = list(GroupStats.objects.order_by('pk').values_list(
+            'group_id', 'last_post_at', 'top_authors'))
+        GroupStats.objects.all().delete()
+        call_command('rebuild_stats', stdout=StringIO())
+        self.assertEqual(list(GroupStats.objects.order_by('pk').values_list(
+            'group_id', 'last_post_at', 'top_authors')), expected)
+
+    def test_migration_fills_stats_in_fixed_queries(self):
+        """Миграция считает статистику всех групп за пять запросов."""
+        migration = import_module('posts.migrations.0010_group_stats')
+        expected = list(GroupStats.objects.order_by('pk').values_list(
+            'group_id', 'last_post_at', 'top_authors'))
+        GroupStats.objects.all().delete()
+        GroupAuthorStats.objects.all().delete()
+        with self.assertNumQueries(5):
+            migration.fill_group_stats(apps, None)
+        self.assertEqual(list(GroupStats.objects.order_by('pk').values_list(
+            'group_id', 'last_post_at', 'top_authors')), expected)
+        self.assertEqual(GroupAuthorStats.objects.count(), 4)
+
+    def test_index_lists_groups_with_stats(self):
+        response = self.client.get(reverse('posts:group_index'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.group, self.other])
+        self.assertContains(response, 'Постов: 10')
+        self.assertContains(response, reverse(
+            'posts:profile', kwargs={'username': 'member3'}))
+        Post.objects.create(author=self.authors[0], group=self.other,
+                            text='Новый пост')
+        response = self.client.get(reverse('posts:group_index'))
+        self.assertContains(response, 'member0</a>')
+        self.assertContains(response, 'Постов: 1')
+
+    def test_group_cached_in_process(self):
+        """Группа по slug читается из памяти, правка группы сбрасывает её."""
+        url = reverse('posts:group_list', kwargs={'slug': 'catalog'})
+        client = Client()
+        client.force_login(self.authors[0])
+        client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(groups.get_group('catalog'), self.group)
+        self.assertEqual(len(queries), 0)
+        Group.objects.filter(pk=self.group.pk).update(title='Не видно')
+        self.assertEqual(groups.get_group('catalog').title, 'Каталог')
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Новое название'
+        group.save()
+        response = client.get(url)
+        self.assertEqual(response.context['group'].title, 'Новое название')
+
+    def test_missing_group_is_404(self):
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'missing'}))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+JOURNAL_DIR = tempfile.mkdtemp()
+
+
+@override_settings(WRITE_BEHIND=True, WRITE_BEHIND_FLUSH_INTERVAL=None,
+                   WRITE_BEHIND_JOURNAL_DIR=JOURNAL_DIR)
+class WriteBehindTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='queued')
+        cls.author = User.objects.create_user(username='queued_author')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def tearDown(self):
+        write_queue.flush()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(JOURNAL_DIR, ignore_errors=True)
+
+    def test_comment_visible_to_author_until_flushed(self):
+        """Комментарий из очереди видит только его автор."""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Из очереди'})
+        self.assertFalse(Comment.objects.exists())
+        self.assertContains(self.client.get(detail), 'Из очереди')
+        other = Client()
+        other.force_login(self.author)
+        self.assertNotContains(other.get(detail), 'Из очереди')
+        score = Post.objects.get(pk=self.post.pk).hot_score
+
+        write_queue.flush()
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.comments.get().text, 'Из очереди')
+        self.assertEqual(post.comments_count, 1)
+        self.assertAlmostEqual(post.hot_score, score + 1)
+        self.assertContains(self.client.get(detail), 'Из очереди', count=1)
+        self.assertContains(other.get(detail), 'Из очереди')
+
+    def test_failed_batch_requeued(self):
+        """Пачка с ошибкой записи не теряется и видна автору из кеша."""
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Повтор'})
+        with mock.patch.object(write_queue, '_write',
+                               side_effect=OperationalError('disk I/O')), \
+                self.assertLogs('posts.write_queue', 'ERROR'):
+            write_queue.flush()
+        self.assertFalse(Comment.objects.exists())
+        self.assertContains(self.client.get(detail), 'Повтор')
+        write_queue.flush()
+        self.assertEqual(Comment.objects.get().text, 'Повтор')
+        self.assertContains(self.client.get(detail), 'Повтор', count=1)
+        self.assertEqual(os.listdir(JOURNAL_DIR), [
+            f'{write_queue._journal["owner"]}.lock'])
+
+    def test_comment_of_deleted_user_skipped(self):
+        """Комментарий удалённого пользователя не ломает пачку."""
+        gone = User.objects.create_user(username='gone')
+        for author in (gone, self.user):
+            write_queue.add_comment(Comment(
+                post=self.post, author=author, text=author.username))
+        gone.delete()
+        write_queue.flush()
+        self.assertEqual(Comment.objects.get().text, self.user.username)
+        self.assertFalse(write_queue._queue)
+
+    def test_rejected_op_dropped(self):
+        """Операция, которую не принимает база, не возвращается в очередь."""
+        write = write_queue._write
+
+        def reject(batch):
+            if any(op.get('text') == 'Плохой' for op in batch):
+                raise IntegrityError('FOREIGN KEY constraint failed')
+            return write(batch)
+
+        for text in ('Плохой', 'Хороший'):
+            write_queue.add_comment(Comment(
+                post=self.post, author=self.user, text=text))
+        with mock.patch.object(write_queue, '_write', side_effect=reject), \
+                self.assertLogs('posts.write_queue', 'WARNING') as logs:
+            write_queue.flush()
+        self.assertEqual(Comment.objects.get().text, 'Хороший')
+        self.assertFalse(write_queue._queue)
+        self.assertIn('Плохой', logs.output[-1])
+        self.assertEqual(os.listdir(JOURNAL_DIR), [
+            f'{write_queue._journal["owner"]}.lock'])
+
+    def test_journal_of_dead_process_recovered(self):
+        """Очередь процесса, убитого до сброса, записывает другой."""
+        with open(os.path.join(JOURNAL_DIR, 'dead.lock'), 'w'), \
+                open(os.path.join(JOURNAL_DIR, 'dead.0.jsonl'), 'w') as file:
+            file.write(json.dumps({
+                'op': 'comment', 'post_id': self.post.pk,
+                'author_id': self.user.pk, 'text': 'Из журнала',
+                'pub_date': '2026-01-01T00:00:00+00:00'}) + '\n')
+            file.write(json.dumps({
+                'op': 'follow', 'user_id': self.user.pk,
+                'author_id': self.author.pk}) + '\n')
+        with self.assertLogs('posts.write_queue', 'WARNING'):
+            write_queue.flush()
+        self.assertEqual(Comment.objects.get().text, 'Из журнала')
+        self.assertTrue(Follow.objects.filter(
+            user=self.user, author=self.author).exists())
+        self.assertFalse([name for name in os.listdir(JOURNAL_DIR)
+                          if name.startswith('dead.')])
+
+    @override_settings(WRITE_BEHIND=False)
+    def test_journals_left_alone_when_disabled(self):
+        with open(os.path.join(JOURNAL_DIR, 'off.lock'), 'w'), \
+                open(os.path.join(JOURNAL_DIR, 'off.0.jsonl'), 'w') as file:
+            file.write(json.dumps({
+                'op': 'follow', 'user_id': self.user.pk,
+                'author_id': self.author.pk}) + '\n')
+        with mock.patch('atexit.register') as register:
+            write_queue.flush()
+        self.assertFalse(Follow.objects.exists())
+        register.assert_not_called()
+        with self.settings(WRITE_BEHIND=True), \
+                self.assertLogs('posts.write_queue', 'WARNING'):
+            write_queue.flush()
+        self.assertTrue(Follow.objects.exists())
+
+    def test_follows_coalesced_into_one_write(self):
+        kwargs = {'username': self.author.username}
+        profile = reverse('posts:profile', kwargs=kwargs)
+        for _ in range(2):
+            self.client.get(reverse('posts:profile_follow', kwargs=kwargs))
+        self.assertFalse(Follow.objects.exists())
+        self.assertTrue(self.client.get(profile).context['following'])
+
+        with CaptureQueriesContext(connection) as queries:
+            write_queue.flush()
+        inserts = [query['sql'] for query in queries
+                   if query['sql'].startswith('INSERT')
+                   and '"posts_follow"' in query['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Follow.objects.get().author, self.author)
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).followers_count, 1)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.user, post=self.post).exists())
+        self.assertTrue(self.client.get(profile).context['following'])
+
+        self.client.get(reverse('posts:profile_follow', kwargs=kwargs))
+        write_queue.flush()
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).followers_count, 1)
+
+    def test_unfollow_queued_as_delete(self):
+        """Отписка пишется пачкой, а до этого видна автору из кеша."""
+        Follow.objects.create(user=self.user, author=self.author)
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': self.author.username}))
+        self.assertTrue(Follow.objects.exists())
+        self.assertFalse(follow_graph.following_ids(self.user))
+        write_queue.flush()
+        self.assertFalse(Follow.objects.exists())
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).followers_count, 0)
+        self.assertFalse(follow_graph.following_ids(self.user))
+
+    def test_follow_older_than_unfollow_skipped(self):
+        """Подписка из чужой очереди не отменяет более позднюю отписку."""
+        write_queue.remove_follow(self.user.pk, self.author.pk)
+        write_queue.flush()
+        write_queue._enqueue({'op': 'follow', 'user_id': self.user.pk,
+                              'author_id': self.author.pk,
+                              'at': time.time() - 10})
+        write_queue.flush()
+        self.assertFalse(Follow.objects.exists())
+
+    def test_unfollow_cancels_queued_follow(self):
+        kwargs = {'username': self.author.username}
+        self.client.get(reverse('posts:profile_follow', kwargs=kwargs))
+        self.client.get(reverse('posts:profile_unfollow', kwargs=kwargs))
+        self.assertFalse(follow_graph.following_ids(self.user))
+        write_queue.flush()
+        self.assertFalse(Follow.objects.exists())
+
+    def test_comment_to_missing_post_is_404(self):
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': 0}),
+            {'text': 'Некуда'})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+
+class WriteTransactionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='locker')
+        cls.post = Post.objects.create(text='Пост', author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.author)
+
+    def transactions(self, method, url, data=None):
+        """Сколько транзакций открыл запрос (внутри теста - savepoint)."""
+        with CaptureQueriesContext(connection) as queries:
+            getattr(self.client, method)(url, data)
+        return sum(query['sql'].startswith('SAVEPOINT')
+                   for query in queries)
+
+    def test_reads_do_not_take_write_lock(self):
+        """Форма на GET и редиректы не открывают транзакцию."""
+        kwargs = {'post_id': self.post.pk}
+        self.assertEqual(self.transactions(
+            'get', reverse('posts:post_edit', kwargs=kwargs)), 0)
+        self.assertEqual(self.transactions(
+            'get', reverse('posts:add_comment', kwargs=kwargs)), 0)
+        self.assertEqual(self.transactions(
+            'post', reverse('posts:post_edit', kwargs=kwargs),
+            {'text': 'Правка'}), 1)
+        self.assertEqual(self.transactions(
+            'post', reverse('posts:add_comment', kwargs=kwargs),
+            {'text': 'Комментарий'}), 1)
@@ -0,0 +1,69 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import connection, connections
+from sorl.thumbnail import get_thumbnail
+
+from . import images
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def pregenerate(image_name: str) -> int:
+    """Создаёт миниатюры из POST_THUMBNAIL_SIZES и варианты для srcset.
+
+    Возвращает число созданных файлов. Уже готовые миниатюры sorl
+    берёт из своего хранилища ключей и не пересчитывает.
+    """
+    if not image_name or not default_storage.exists(image_name):
+        return 0
+    for geometry, options in settings.POST_THUMBNAIL_SIZES:
+        get_thumbnail(image_name, geometry, **options)
+    variants = images.build_for_image(image_name)
+    return len(settings.POST_THUMBNAIL_SIZES) + variants
+
+
+def schedule(image_name: str) -> None:
+    """Ставит картинку в очередь фоновой генерации миниатюр.
+
+    Запрос не ждёт генерации: пока вариантов нет, шаблон выводит
+    миниатюру sorl, см. post_picture. Исключение - база SQLite в
+    памяти: она видна только этому процессу, а таблицы в общем кеше
+    блокируются без учёта busy_timeout, поэтому фоновая запись
+    мешала бы остальным соединениям. Тогда миниатюры создаются сразу.
+    """
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        _generate(image_name)
+    else:
+        _get_executor().submit(_run, image_name)
+
+
+def _run(image_name: str) -> None:
+    try:
+        _generate(image_name)
+    finally:
+        connections.close_all()
+
+
+def _generate(image_name: str) -> None:
+    try:
+        pregenerate(image_name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', image_name)
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+        return _executor
@@ -0,0 +1,165 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+
+from .follow_graph import following_ids
+from .models import AuthorStats, Follow, Post, TimelineEntry
+from .utils import get_page_obj
+
+FANOUT_ON_READ_AUTHORS_KEY = 'timeline:fanout_on_read_authors'
+
+
+def fanout_on_read_authors() -> set:
+    """Авторы, чьи посты не раскладываются по лентам подписчиков.
+
+    У таких авторов слишком много подписчиков, поэтому их посты
+    подмешиваются в ленту при чтении. Множество кешируется для чтения
+    лент; запись сверяется с флагом в базе, см. is_fanout_on_read.
+    """
+    author_ids = cache.get(FANOUT_ON_READ_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = set(AuthorStats.objects.filter(
+            fanout_on_read=True).values_list('user_id', flat=True))
+        cache.set(FANOUT_ON_READ_AUTHORS_KEY, author_ids,
+                  settings.TIMELINE_FANOUT_CACHE_TIMEOUT)
+    return author_ids
+
+
+def is_fanout_on_read(author_id: int) -> bool:
+    return AuthorStats.objects.filter(
+        user_id=author_id, fanout_on_read=True).exists()
+
+
+def followers_changed(*author_ids) -> None:
+    """Переключает авторов, пересёкших TIMELINE_FANOUT_MAX_FOLLOWERS.
+
+    Вызывается после изменения followers_count. Автор, ушедший ниже
+    порога, снова раскладывает посты по лентам, поэтому его посты
+    переносятся в ленты всех подписчиков: и посты, и подписки того
+    времени, когда ленты не заполнялись.
+    """
+    limit = settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    stats = AuthorStats.objects.filter(user_id__in=author_ids)
+    promoted = stats.filter(
+        fanout_on_read=False, followers_count__gt=limit,
+    ).update(fanout_on_read=True)
+    demoted = list(stats.filter(
+        fanout_on_read=True, followers_count__lte=limit,
+    ).values_list('user_id', flat=True))
+    if demoted:
+        AuthorStats.objects.filter(user_id__in=demoted).update(
+            fanout_on_read=False)
+        for author_id in demoted:
+            _backfill_followers(author_id)
+    if promoted or demoted:
+        cache.delete(FANOUT_ON_READ_AUTHORS_KEY)
+
+
+def sync_fanout_modes() -> None:
+    """Выставляет флаги всем авторам по текущему порогу, без лент."""
+    limit = settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+    AuthorStats.objects.filter(followers_count__gt=limit).update(
+        fanout_on_read=True)
+    AuthorStats.objects.filter(followers_count__lte=limit).update(
+        fanout_on_read=False)
+    cache.delete(FANOUT_ON_READ_AUTHORS_KEY)
+
+
+def fan_out_post(post: Post) -> None:
+    """Добавляет новый пост в ленты подписчиков автора."""
+    if is_fanout_on_read(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post.pk,
+                      author_id=post.author_id, pub_date=post.pub_date)
+        for user_id in followers.iterator()
+    )
+
+
+def backfill(user_id: int, author_id: int) -> None:
+    """Переносит в ленту пользователя посты автора после подписки."""
+    if is_fanout_on_read(author_id):
+        return
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for post_id, pub_date in _backfill_posts(author_id)
+    )
+
+
+def prune(user_id: int, author_id: int) -> None:
+    """Убирает из ленты пользователя посты автора после отписки."""
+    TimelineEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def prune_unfollowed(user_ids, author_ids) -> None:
+    """prune() после массового DELETE подписок, одним DELETE.
+
+    Убирает записи пользователей user_ids о постах авторов author_ids,
+    подписки на которых больше нет.
+    """
+    TimelineEntry.objects.filter(
+        user_id__in=user_ids, author_id__in=author_ids,
+    ).annotate(followed=Exists(Follow.objects.filter(
+        user_id=OuterRef('user_id'), author_id=OuterRef('author_id'),
+    ))).filter(followed=False).delete()
+
+
+def get_timeline_page(user, page_number, cursor=None):
+    """Страница ленты подписок пользователя.
+
+    Обычно это диапазон по индексу материализованной ленты. Если
+    пользователь подписан на авторов с fan-out-on-read, их посты
+    подмешиваются запросом к Post.
+    """
+    entries = TimelineEntry.objects.filter(user=user)
+    celebrities = fanout_on_read_authors()
+    followed_celebrities = set()
+    if celebrities:
+        followed_celebrities = following_ids(user) & set(celebrities)
+    if followed_celebrities:
+        posts = Post.objects.select_related('author', 'group').filter(
+            Q(id__in=entries.values('post_id'))
+            | Q(author_id__in=followed_celebrities)
+        ).prefetch_related('image_variants')
+        return get_page_obj(posts, page_number, cursor=cursor)
+
+    entries = entries.select_related(
+        'post__author', 'post__group',
+    ).prefetch_related('post__image_variants')
+    page_obj = get_page_obj(entries, page_number, cursor=cursor)
+    page_obj.object_list = [entry.post for entry in page_obj.object_list]
+    return page_obj
+
+
+def _backfill_followers(author_id: int) -> None:
+    posts = list(_backfill_posts(author_id))
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True)
+    _bulk_insert(
+        TimelineEntry(user_id=user_id, post_id=post_id,
+                      author_id=author_id, pub_date=pub_date)
+        for user_id in followers.iterator()
+        for post_id, pub_date in posts
+    )
+
+
+def _backfill_posts(author_id: int):
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date').values_list('id', 'pub_date')
+    if settings.TIMELINE_BACKFILL_POSTS is not None:
+        posts = posts[:settings.TIMELINE_BACKFILL_POSTS]
+    return posts.iterator()
+
+
+def _bulk_insert(entries) -> None:
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= settings.TIMELINE_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
@@ -0,0 +1,271 @@
+"""Потоковый импорт и экспорт групп, постов, комментариев и подписок.
+
+Данные читаются и пишутся построчно (NDJSON или CSV), в базу уходят
+пачками через bulk_create, поэтому память не зависит от размера
+файла. Пользователи и группы в файлах указываются по username и slug,
+посты и комментарии сохраняют свои id, чтобы комментарии ссылались
+на нужные посты и повторный импорт ничего не дублировал.
+"""
+import csv
+import json
+from dataclasses import dataclass
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import cache_tags, follow_graph, page_cache
+from .models import Comment, Follow, Group, Post, User
+
+FORMATS = ('ndjson', 'csv')
+
+# Сколько строк правит один UPDATE с датами: у каждой строки три
+# параметра, а старый SQLite принимает не больше 999.
+RESTORE_BATCH_SIZE = 300
+
+
+@dataclass
+class Kind:
+    model: type
+    # Колонка файла -> путь для values_list при экспорте.
+    columns: dict
+    # Наборы полей, по которым строка уже может быть в базе.
+    unique: tuple
+
+
+KINDS = {
+    'groups': Kind(Group, {
+        'id': 'id', 'title': 'title', 'slug': 'slug',
+        'description': 'description',
+    }, (('id',), ('slug',))),
+    'posts': Kind(Post, {
+        'id': 'id', 'text': 'text', 'pub_date': 'pub_date',
+        'author': 'author__username', 'group': 'group__slug',
+        'image': 'image',
+    }, (('id',),)),
+    'comments': Kind(Comment, {
+        'id': 'id', 'post': 'post_id', 'author': 'author__username',
+        'text': 'text', 'pub_date': 'pub_date',
+    }, (('id',),)),
+    'follows': Kind(Follow, {
+        'user': 'user__username', 'author': 'author__username',
+    }, (('user_id', 'author_id'),)),
+}
+
+
+def detect_format(path: str) -> str:
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+def export_rows(kind: str, batch_size: int):
+    """Строки для экспорта в порядке id, читаются порциями."""
+    columns = KINDS[kind].columns
+    rows = KINDS[kind].model.objects.order_by('id').values_list(
+        *columns.values())
+    for row in rows.iterator(chunk_size=batch_size):
+        yield dict(zip(columns, row))
+
+
+def write_rows(rows, file, data_format: str, kind: str):
+    """Пишет строки в файл, по одной отдавая счётчик записанных."""
+    if data_format == 'csv':
+        writer = csv.DictWriter(file, fieldnames=list(KINDS[kind].columns))
+        writer.writeheader()
+    for written, row in enumerate(rows, start=1):
+        row = {key: _dump(value) for key, value in row.items()}
+        if data_format == 'csv':
+            writer.writerow(
+                {key: '' if value is None else value
+                 for key, value in row.items()})
+        else:
+            file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        yield written
+
+
+def read_rows(file, data_format: str):
+    if data_format == 'csv':
+        for row in csv.DictReader(file):
+            yield {key: value if value != '' else None
+                   for key, value in row.items()}
+        return
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def import_batch(kind: str, rows: list) -> tuple:
+    """Сохраняет пачку строк одной транзакцией.
+
+    Возвращает (сохранено, пропущено). Пропускаются строки, которые
+    уже есть в базе или выше в пачке, и строки со ссылками на
+    несуществующие посты.
+    """
+    model = KINDS[kind].model
+    with transaction.atomic():
+        objects, tags = BUILDERS[kind](rows)
+        objects = _new_objects(kind, objects)
+        dates = _file_dates(model, objects)
+        model.objects.bulk_create(
+            objects, batch_size=len(rows) or None, ignore_conflicts=True)
+        _restore_dates(model, dates)
+    cache_tags.purge(*tags)
+    if kind == 'follows':
+        # bulk_create не шлёт сигналы, которые сбрасывают кеш подписок.
+        follow_graph.invalidate(*{follow.user_id for follow in objects})
+    return len(objects), len(rows) - len(objects)
+
+
+def reset_sequences(kinds) -> None:
+    """Сдвигает счётчики id после вставки строк с явными id."""
+    models = [KINDS[kind].model for kind in kinds]
+    statements = connection.ops.sequence_reset_sql(no_style(), models)
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def _build_groups(rows):
+    groups = [
+        Group(id=_int(row.get('id')), title=row['title'], slug=row['slug'],
+              description=row.get('description') or '')
+        for row in rows
+    ]
+    return groups, [page_cache.GLOBAL_FEED_TAG]
+
+
+def _build_posts(rows):
+    users = _users({row['author'] for row in rows})
+    slugs = {row['group'] for row in rows if row.get('group')}
+    groups = dict(Group.objects.filter(slug__in=slugs).values_list(
+        'slug', 'id'))
+    posts = [
+        Post(id=_int(row.get('id')), text=row['text'],
+             pub_date=_datetime(row.get('pub_date')),
+             author_id=users[row['author']],
+             group_id=groups.get(row.get('group')),
+             image=row.get('image') or '')
+        for row in rows
+    ]
+    tags = [page_cache.GLOBAL_FEED_TAG]
+    tags += [page_cache.author_tag(username) for username in users]
+    tags += [page_cache.group_tag(slug) for slug in groups]
+    return posts, tags
+
+
+def _build_comments(rows):
+    users = _users({row['author'] for row in rows})
+    post_ids = set(Post.objects.filter(
+        id__in={_int(row['post']) for row in rows}).values_list(
+        'id', flat=True))
+    comments = [
+        Comment(id=_int(row.get('id')), post_id=_int(row['post']),
+                author_id=users[row['author']], text=row['text'],
+                pub_date=_datetime(row.get('pub_date')))
+        for row in rows if _int(row['post']) in post_ids
+    ]
+    return comments, [page_cache.post_tag(post_id) for post_id in post_ids]
+
+
+def _build_follows(rows):
+    users = _users({row[column] for row in rows
+                    for column in ('user', 'author')})
+    follows = [
+        Follow(user_id=users[row['user']], author_id=users[row['author']])
+        for row in rows if row['user'] != row['author']
+    ]
+    return follows, [page_cache.author_tag(username) for username in users]
+
+
+BUILDERS = {
+    'groups': _build_groups,
+    'posts': _build_posts,
+    'comments': _build_comments,
+    'follows': _build_follows,
+}
+
+
+def _users(usernames) -> dict:
+    """username -> id; недостающие пользователи создаются без пароля."""
+    users = dict(User.objects.filter(username__in=usernames).values_list(
+        'username', 'id'))
+    missing = [username for username in usernames if username not in users]
+    if missing:
+        new_users = [User(username=username) for username in missing]
+        for user in new_users:
+            user.set_unusable_password()
+        User.objects.bulk_create(new_users, ignore_conflicts=True)
+        users.update(User.objects.filter(
+            username__in=missing).values_list('username', 'id'))
+    return users
+
+
+def _new_objects(kind: str, objects) -> list:
+    """Объекты, которых ещё нет ни в базе, ни раньше в пачке."""
+    model = KINDS[kind].model
+    taken = {key: _stored(model, key, objects) for key in KINDS[kind].unique}
+    new = []
+    for obj in objects:
+        values = {key: tuple(getattr(obj, field) for field in key)
+                  for key in taken}
+        values = {key: value for key, value in values.items()
+                  if None not in value}
+        if any(value in taken[key] for key, value in values.items()):
+            continue
+        for key, value in values.items():
+            taken[key].add(value)
+        new.append(obj)
+    return new
+
+
+def _stored(model, key, objects) -> set:
+    lookups = {
+        f'{field}__in': {getattr(obj, field) for obj in objects} - {None}
+        for field in key
+    }
+    if not all(lookups.values()):
+        return set()
+    return set(model.objects.filter(**lookups).values_list(*key))
+
+
+def _file_dates(model, objects) -> dict:
+    """{поле: {id: дата}} для полей auto_now_add.
+
+    bulk_create перезаписывает их текущим временем и в объектах, и в
+    базе, поэтому даты из файла запоминаются до вставки. Строки без
+    id получают время импорта.
+    """
+    return {
+        field.attname: {obj.pk: getattr(obj, field.attname)
+                        for obj in objects if obj.pk is not None}
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now_add', False)
+    }
+
+
+def _restore_dates(model, dates: dict) -> None:
+    """Возвращает даты из файла одним UPDATE на RESTORE_BATCH_SIZE строк."""
+    for name, by_pk in dates.items():
+        pks = list(by_pk)
+        for start in range(0, len(pks), RESTORE_BATCH_SIZE):
+            chunk = pks[start:start + RESTORE_BATCH_SIZE]
+            model.objects.filter(pk__in=chunk).update(**{name: Case(
+                *(When(pk=pk, then=Value(by_pk[pk])) for pk in chunk),
+                output_field=DateTimeField(),
+            )})
+
+
+def _dump(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _int(value):
+    return None if value is None else int(value)
+
+
+def _datetime(value):
+    return timezone.now() if value is None else parse_datetime(value)
@@ -0,0 +1,99 @@
+import os
+from functools import wraps
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadhandler import (
+    MemoryFileUploadHandler, TemporaryFileUploadHandler)
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from PIL import Image, ImageOps
+
+# Форматы, которые при загрузке пересохраняются без EXIF и уменьшаются.
+PROCESSED_FORMATS = ('JPEG', 'PNG', 'WEBP')
+
+
+class LimitedTemporaryFileUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загрузку во временный файл, но не больше лимита.
+
+    Всё, что пришло сверх POST_IMAGE_MAX_BYTES, не сохраняется, а
+    size файла остаётся настоящим, поэтому форма отклонит загрузку
+    по размеру, не держа её ни в памяти, ни целиком на диске. Ставится
+    только на view постов декоратором limit_uploads: остальные формы
+    не проверяют size и сохранили бы обрезанный файл.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received <= settings.POST_IMAGE_MAX_BYTES:
+            self.file.write(raw_data)
+
+
+def limit_uploads(view):
+    """Разбирает файлы запроса через LimitedTemporaryFileUploadHandler.
+
+    Обработчики нельзя менять после чтения request.POST, а
+    CsrfViewMiddleware читает его до view. Поэтому view исключается из
+    проверки middleware, а CSRF проверяется здесь, после замены
+    обработчиков.
+    """
+    protected = csrf_protect(view)
+
+    @csrf_exempt
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        request.upload_handlers = [
+            MemoryFileUploadHandler(request),
+            LimitedTemporaryFileUploadHandler(request),
+        ]
+        return protected(request, *args, **kwargs)
+    return wrapper
+
+
+def check_size(upload) -> None:
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        limit = settings.POST_IMAGE_MAX_BYTES // (1024 * 1024)
+        raise ValidationError(f'Картинка больше {limit} МБ.')
+
+
+def process_image(upload):
+    """Проверяет загруженную картинку и готовит её к сохранению.
+
+    Размеры читаются из заголовка, без декодирования пикселей.
+    Слишком большие по числу пикселей картинки отклоняются, а
+    остальные при необходимости поворачиваются по EXIF, уменьшаются
+    до POST_IMAGE_MAX_SIDE и пересохраняются без метаданных.
+    """
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                f'Картинка {width}x{height} слишком большая.')
+        image_format = image.format
+        if image_format not in PROCESSED_FORMATS:
+            upload.seek(0)
+            return upload
+        max_side = settings.POST_IMAGE_MAX_SIDE
+        oversized = max(width, height) > max_side
+        if not oversized and 'exif' not in image.info:
+            upload.seek(0)
+            return upload
+        if image_format == 'JPEG':
+            # Декодер JPEG умеет сразу уменьшать в 2, 4 или 8 раз.
+            image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        buffer = BytesIO()
+        options = {}
+        if image_format in ('JPEG', 'WEBP'):
+            options['quality'] = settings.POST_IMAGE_QUALITY
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue(), name=os.path.basename(upload.name))
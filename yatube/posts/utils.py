@@ -1,12 +1,234 @@
+import base64
+import binascii
+import json
+from collections.abc import Sequence
+
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.db.models import Case, F, Max, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils.functional import cached_property
+
+FEED_ORDERING = ('-pub_date', '-id')
+COMMENTS_ORDERING = ('pub_date', 'id')
+# Строк в одном UPDATE ... CASE: у строки три параметра, а старый SQLite
+# принимает не больше 999.
+SUBTRACT_BATCH_SIZE = 300
+
+
+class CursorPage(Sequence):
+    """Страница ленты, полученная по курсору.
+
+    Повторяет интерфейс django.core.paginator.Page, который нужен
+    шаблонам: итерация, len, has_next/has_previous/has_other_pages.
+    """
+
+    is_cursor = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<CursorPage of {len(self)} items>'
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """Keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Курсор - непрозрачная строка с ключом крайней записи страницы
+    и направлением обхода. Пустой или испорченный курсор означает
+    первую страницу.
+    """
+
+    def __init__(self, object_list, per_page, ordering=FEED_ORDERING):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.fields = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+
+    def get_page(self, cursor):
+        position = self.decode_cursor(cursor)
+        backwards = False
+        queryset = self.object_list
+        if position is not None:
+            backwards, values = position
+            queryset = queryset.filter(self._after(values, backwards))
+        items = list(
+            queryset.order_by(*self._ordering(backwards))[:self.per_page + 1]
+        )
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if not items and position is not None:
+            return self.get_page(None)
+        if backwards:
+            items.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+        return CursorPage(
+            items,
+            next_cursor=(
+                self.encode_cursor(items[-1]) if has_next else None),
+            previous_cursor=(
+                self.encode_cursor(items[0], backwards=True)
+                if has_previous else None),
+        )
+
+    def encode_cursor(self, item, backwards=False):
+        values = [self._value(item, name) for name, _ in self.fields]
+        payload = json.dumps(
+            [int(backwards)] + values,
+            cls=_CursorEncoder,
+            separators=(',', ':'),
+        )
+        token = base64.urlsafe_b64encode(payload.encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            backwards, *raw = json.loads(base64.urlsafe_b64decode(padded))
+            if len(raw) != len(self.fields):
+                return None
+            model = self.object_list.model
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for (name, _), value in zip(self.fields, raw)
+            ]
+        except (binascii.Error, ValueError, TypeError, ValidationError):
+            return None
+        if any(value is None for value in values):
+            return None
+        return bool(backwards), values
+
+    def _ordering(self, backwards):
+        return [
+            f'-{name}' if descending != backwards else name
+            for name, descending in self.fields
+        ]
+
+    def _after(self, values, backwards):
+        condition = Q()
+        for index, (name, descending) in enumerate(self.fields):
+            lookup = 'lt' if descending != backwards else 'gt'
+            clause = Q(**{f'{name}__{lookup}': values[index]})
+            for (prev_name, _), value in zip(self.fields, values[:index]):
+                clause &= Q(**{prev_name: value})
+            condition |= clause
+        return condition
+
+    @staticmethod
+    def _value(item, name):
+        if isinstance(item, dict):
+            return item[name]
+        return getattr(item, name)
+
+
+class FeedPaginator(Paginator):
+    """Paginator с заранее известным числом записей и окном страниц.
+
+    count можно передать из денормализованного счётчика, тогда
+    COUNT(*) не выполняется. Такой счётчик может немного отставать,
+    поэтому срез страницы от него не зависит. page_window - номера
+    страниц вокруг текущей, чтобы шаблон не перебирал весь page_range.
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            self.count = count
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        page = self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self)
+        page.page_window = self.get_page_window(page.number)
+        return page
+
+    def get_page_window(self, number, on_each_side=None):
+        if on_each_side is None:
+            on_each_side = settings.PAGINATOR_ON_EACH_SIDE
+        return range(max(number - on_each_side, 1),
+                     min(number + on_each_side, self.num_pages) + 1)
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для больших таблиц в админке.
+
+    Без фильтров число записей оценивается по наибольшему id - это
+    один шаг по первичному ключу вместо COUNT(*) по всей таблице.
+    Удалённые строки делают оценку завышенной, и последние страницы
+    могут оказаться пустыми. Отфильтрованный список считается точно.
+    """
+
+    @cached_property
+    def count(self):
+        if self.object_list.query.where:
+            return super().count
+        return self.object_list.aggregate(
+            estimate=Max('pk'))['estimate'] or 0
+
+
+class _CursorEncoder(json.JSONEncoder):
+    def default(self, o):
+        if hasattr(o, 'isoformat'):
+            return o.isoformat()
+        return super().default(o)
 
 
 def get_page_obj(posts: list,
                  page_number: int,
                  paginator_count_of_posts:
-                 int = settings.COUNT_OF_POSTS_DEFAULT
+                 int = settings.COUNT_OF_POSTS_DEFAULT,
+                 cursor: str = None,
+                 count: int = None,
                  ) -> int:
-    paginator = Paginator(posts, paginator_count_of_posts)
+    if cursor is not None or (
+            page_number is None and settings.FEED_CURSOR_PAGINATION):
+        paginator = CursorPaginator(posts, paginator_count_of_posts)
+        return paginator.get_page(cursor)
+    paginator = FeedPaginator(posts, paginator_count_of_posts, count=count)
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def bulk_subtract(model, key: str, field: str, amounts: dict) -> None:
+    """Вычитает amounts[значение key] из field, не опуская его ниже нуля.
+
+    Одним UPDATE ... CASE на SUBTRACT_BATCH_SIZE строк, сколько бы
+    строк ни было удалено.
+    """
+    output_field = model._meta.get_field(field)
+    keys = list(amounts)
+    for start in range(0, len(keys), SUBTRACT_BATCH_SIZE):
+        chunk = keys[start:start + SUBTRACT_BATCH_SIZE]
+        delta = Case(
+            *(When(**{key: value}, then=Value(amounts[value]))
+              for value in chunk),
+            default=Value(0), output_field=output_field,
+        )
+        model.objects.filter(**{f'{key}__in': chunk}).update(**{
+            field: Greatest(F(field) - delta, Value(0),
+                            output_field=output_field)})
@@ -1,18 +1,40 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
 from django.http import HttpResponse, HttpRequest
 from django.shortcuts import render, get_object_or_404, redirect
 
+from core.db_router import replica_reads
+from core.ratelimit import rate_limit
+from core.retry import retry_on_locked
+
+from .counters import get_author_posts_count, get_posts_total
+from .follow_graph import is_following
+from .groups import GROUPS_TAG, get_group
 from .forms import PostForm, CommentForm
+from .hot import HOT_ORDERING, HOT_TAG
 from .models import Post, Group, User, Follow
-from .utils import get_page_obj
-
-
+from .page_cache import (GLOBAL_FEED_TAG, USERS_TAG, author_tag,
+                         cache_anonymous_page, group_tag, post_tag)
+from .search import search as search_posts
+from .timeline import get_timeline_page
+from .uploads import limit_uploads
+from . import write_queue
+from .utils import (COMMENTS_ORDERING, CursorPaginator, FeedPaginator,
+                    get_page_obj)
+
+
+@replica_reads
+@cache_anonymous_page(lambda: [GLOBAL_FEED_TAG, USERS_TAG])
 def index(request: HttpRequest) -> HttpResponse:
     template = 'posts/index.html'
 
-    posts = Post.objects.select_related('author', 'group')
+    posts = Post.objects.select_related('author', 'group').prefetch_related(
+        'image_variants')
     page_number = request.GET.get('page')
-    page_obj = get_page_obj(posts, page_number)
+    page_obj = get_page_obj(posts, page_number,
+                            cursor=request.GET.get('cursor'),
+                            count=get_posts_total())
     context = {
         'index': template,
         'page_obj': page_obj,
@@ -20,13 +42,53 @@ def index(request: HttpRequest) -> HttpResponse:
     return render(request, template, context)
 
 
+@replica_reads
+@cache_anonymous_page(lambda: [GLOBAL_FEED_TAG, USERS_TAG, HOT_TAG])
+def hot_posts(request: HttpRequest) -> HttpResponse:
+    """Посты по убыванию hot_score, см. posts.hot."""
+    template = 'posts/index.html'
+
+    posts = Post.objects.select_related('author', 'group').prefetch_related(
+        'image_variants').order_by(*HOT_ORDERING)
+    # Только номера страниц: hot_score затухает и растёт между
+    # запросами, и курсор по нему пропускал бы или повторял посты.
+    paginator = FeedPaginator(posts, settings.COUNT_OF_POSTS_DEFAULT,
+                              count=get_posts_total())
+    page_obj = paginator.get_page(request.GET.get('page'))
+    context = {
+        'hot': template,
+        'page_obj': page_obj,
+    }
+    return render(request, template, context)
+
+
+@replica_reads
+@cache_anonymous_page(lambda: [GROUPS_TAG])
+def group_index(request: HttpRequest) -> HttpResponse:
+    """Каталог групп, данные берутся из GroupStats, см. posts.groups."""
+    template = 'posts/group_index.html'
+
+    groups = Group.objects.select_related('stats').order_by(
+        '-posts_count', 'title')
+    paginator = FeedPaginator(groups, settings.COUNT_OF_POSTS_DEFAULT)
+    context = {
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, template, context)
+
+
+@replica_reads
+@cache_anonymous_page(lambda slug: [group_tag(slug), USERS_TAG])
 def group_posts(request: HttpRequest, slug) -> HttpResponse:
     template = 'posts/group_list.html'
 
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
+    group = get_group(slug)
+    posts = group.posts.select_related('author').prefetch_related(
+        'image_variants')
     page_number = request.GET.get('page')
-    page_obj = get_page_obj(posts, page_number)
+    page_obj = get_page_obj(posts, page_number,
+                            cursor=request.GET.get('cursor'),
+                            count=group.posts_count)
 
     context = {
         'group': group,
@@ -35,19 +97,21 @@ def group_posts(request: HttpRequest, slug) -> HttpResponse:
     return render(request, template, context)
 
 
+@replica_reads
+@cache_anonymous_page(lambda username: [author_tag(username)])
 def profile(request: HttpRequest, username) -> HttpResponse:
     tempalate = 'posts/profile.html'
 
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('group')
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    posts = author.posts.select_related('group').prefetch_related(
+        'image_variants')
     page_number = request.GET.get('page')
-    page_obj = get_page_obj(posts, page_number)
+    page_obj = get_page_obj(posts, page_number,
+                            cursor=request.GET.get('cursor'),
+                            count=get_author_posts_count(author))
 
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(user=request.user,
-                                          author=author).exists()
-    else:
-        following = False
+    following = is_following(request.user, [author])[author.pk]
 
     context = {
         'following': following,
@@ -57,13 +121,17 @@ def profile(request: HttpRequest, username) -> HttpResponse:
     return render(request, tempalate, context)
 
 
+@replica_reads
+@cache_anonymous_page(lambda post_id: [post_tag(post_id), USERS_TAG])
 def post_detail(request: HttpRequest, post_id) -> HttpResponse:
     tempalate = 'posts/post_detail.html'
 
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
     author = post.author
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = get_comments_page(post, request.GET.get('comments'),
+                                 request.user)
     context = {
         'post': post,
         'author': author,
@@ -73,13 +141,77 @@ def post_detail(request: HttpRequest, post_id) -> HttpResponse:
     return render(request, tempalate, context)
 
 
+@replica_reads
+@cache_anonymous_page(lambda post_id: [post_tag(post_id), USERS_TAG])
+def post_comments(request: HttpRequest, post_id) -> HttpResponse:
+    """Следующая порция комментариев для кнопки «Показать ещё»."""
+    template = 'posts/includes/comments.html'
+
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': get_comments_page(post, request.GET.get('cursor'),
+                                      request.user),
+    }
+    return render(request, template, context)
+
+
+def get_comments_page(post, cursor, user):
+    """Порция комментариев поста по курсору, от старых к новым.
+
+    На последней странице пользователь видит и свои комментарии,
+    которые ещё ждут записи в posts.write_queue.
+    """
+    comments = post.comments.select_related('author').only(
+        'post', 'text', 'pub_date', 'author__username')
+    paginator = CursorPaginator(
+        comments, settings.COMMENTS_PER_PAGE, ordering=COMMENTS_ORDERING)
+    page = paginator.get_page(cursor)
+    if settings.WRITE_BEHIND and not page.has_next():
+        page.object_list = [*page.object_list,
+                            *write_queue.pending_comments(user, post)]
+    return page
+
+
+def search(request: HttpRequest) -> HttpResponse:
+    template = 'posts/search.html'
+
+    query = request.GET.get('q', '').strip()
+    group = author = None
+    if request.GET.get('group'):
+        group = get_object_or_404(Group, slug=request.GET['group'])
+    if request.GET.get('author'):
+        author = get_object_or_404(User, username=request.GET['author'])
+    results = search_posts(query, group=group, author=author)
+    # Результаты ранжированы, а не упорядочены по дате: курсор ленты
+    # к ним неприменим, поэтому всегда постранично.
+    paginator = FeedPaginator(results, settings.COUNT_OF_POSTS_DEFAULT)
+    page_obj = paginator.get_page(request.GET.get('page'))
+
+    page_query = request.GET.copy()
+    page_query.pop('page', None)
+    page_query.pop('cursor', None)
+    page_query = page_query.urlencode()
+    context = {
+        'query': query,
+        'group': group,
+        'author': author,
+        'groups': Group.objects.order_by('title'),
+        'page_obj': page_obj,
+        'page_query': f'{page_query}&' if page_query else '',
+    }
+    return render(request, template, context)
+
+
+@limit_uploads
 @login_required
+@rate_limit('post_create', methods=('POST',))
 def post_create(request: HttpRequest) -> HttpResponse:
     if request.method == 'POST':
         form = PostForm(request.POST or None, files=request.FILES or None)
         if form.is_valid():
             form.instance.author = request.user
-            form.save()
+            write(form.save)
             return redirect('posts:profile', username=request.user.username)
 
     form = PostForm()
@@ -103,7 +235,7 @@ def post_edit(request, post_id):
         request.POST or None,
         instance=post)
     if form.is_valid():
-        post.save()
+        write(post.save)
         return redirect('posts:post_detail', post_id=post_id)
 
     context = {
@@ -114,24 +246,27 @@ def post_edit(request, post_id):
 
 
 @login_required
+@rate_limit('add_comment', methods=('POST',))
 def add_comment(request, post_id):
-    post = Post.objects.get(id=post_id)
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        if settings.WRITE_BEHIND:
+            write_queue.add_comment(comment)
+        else:
+            write(comment.save)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    follow_author_posts = Post.objects.select_related('author').filter(
-        author__following__user=request.user)
     page_number = request.GET.get('page')
-    page_obj = get_page_obj(follow_author_posts, page_number)
+    page_obj = get_timeline_page(request.user, page_number,
+                                 cursor=request.GET.get('cursor'))
 
     context = {
         'follow': template,
@@ -141,15 +276,37 @@ def follow_index(request):
 
 
 @login_required
+@rate_limit('follow')
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if author != request.user:
-        Follow.objects.get_or_create(user=request.user, author=author)
+    if author != request.user and settings.WRITE_BEHIND:
+        write_queue.add_follow(request.user.pk, author.pk)
+    elif author != request.user:
+        write(Follow.objects.get_or_create, user=request.user, author=author)
     return redirect('posts:profile', request.user)
 
 
 @login_required
+@rate_limit('follow')
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    if settings.WRITE_BEHIND:
+        write_queue.remove_follow(request.user.pk, author.pk)
+    else:
+        write(Follow.objects.filter(user=request.user, author=author).delete)
     return redirect('posts:profile', request.user)
+
+
+@retry_on_locked
+@transaction.atomic
+def write(func, *args, **kwargs):
+    """Выполняет запись в базу отдельной транзакцией с повтором.
+
+    На SQLite транзакция начинается с BEGIN IMMEDIATE и сразу берёт
+    блокировку базы на запись, поэтому открывается только вокруг
+    самой записи: формы на GET и редиректы её не ждут. Повторяется
+    тоже только запись: загруженные файлы читаются один раз, при
+    проверке формы, и повтор всего view разбирал бы уже пустые
+    request.FILES.
+    """
+    return func(*args, **kwargs)
@@ -0,0 +1,452 @@
+"""Отложенная запись комментариев и подписок (WRITE_BEHIND).
+
+Вместо отдельной транзакции на каждый запрос view кладёт операцию в
+очередь процесса. Очередь записывается одной транзакцией с
+bulk_create: когда в ней набирается WRITE_BEHIND_BATCH_SIZE операций
+или через WRITE_BEHIND_FLUSH_INTERVAL секунд после первой.
+
+bulk_create не шлёт сигналов, поэтому flush() сам делает то же, что
+обработчики из posts.signals: счётчики, ленты, популярность, кеш
+подписок и страниц.
+
+Пока запись ждёт в очереди, автор видит её через кеш: его подписки
+добавляются к follow_graph.following_ids, а отписки вычитаются из
+них, комментарии - к последней странице комментариев поста. Дата
+комментария - время записи в базу, а не время запроса.
+
+Пачка, которую не удалось записать, возвращается в начало очереди, а
+её записи в кеше остаются до успешной записи. Операции, которые
+нарушают ограничения базы, отбрасываются с записью в лог. Чтобы
+очередь не пропала вместе с процессом (SIGKILL, падение), каждая операция ещё
+дописывается строкой в журнал процесса в WRITE_BEHIND_JOURNAL_DIR.
+Журналы процесса, который завершился, не успев их записать, забирает
+в свою очередь flush() любого другого процесса. Запись поэтому
+происходит хотя бы один раз: если процесс упадёт между записью пачки
+и удалением журнала, комментарии из неё запишутся повторно.
+"""
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from core.retry import retry_on_locked
+
+from . import cache_tags, counters, follow_graph, hot, page_cache, timeline
+from .models import Comment, Follow, Post, User
+
+try:
+    import fcntl
+except ImportError:
+    # Без flock (Windows) журналы пишутся, но чужие не забираются:
+    # нельзя отличить завершившийся процесс от работающего.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+PENDING_COMMENTS_KEY = 'write_queue:comments:{user_id}:{post_id}'
+
+# Операции - словари, как они лежат в журнале: {'op': 'comment', ...}.
+_queue = []
+_lock = threading.Lock()
+_timer = None
+# atexit-обработчик ставится с первой операцией в очереди, а не при
+# импорте: без WRITE_BEHIND модулю нечего сбрасывать при выходе.
+_exit_hook = False
+# Журнал процесса: файлы {owner}.{номер}.jsonl и блокировка {owner}.lock,
+# которую процесс держит, пока жив.
+_journal = {'pid': None, 'directory': None, 'owner': None, 'lock': None,
+            'segment': 0}
+# Номера файлов журнала, операции из которых сейчас в _queue.
+_segments = []
+
+
+def add_comment(comment: Comment) -> None:
+    """Ставит в очередь комментарий с заполненными post и author."""
+    comment.pub_date = timezone.now()
+    key = PENDING_COMMENTS_KEY.format(
+        user_id=comment.author_id, post_id=comment.post_id)
+    pending = cache.get(key, [])
+    pending.append((comment.text, comment.pub_date))
+    cache.set(key, pending, settings.WRITE_BEHIND_OVERLAY_TIMEOUT)
+    _enqueue({'op': 'comment', 'post_id': comment.post_id,
+              'author_id': comment.author_id, 'text': comment.text,
+              'pub_date': comment.pub_date.isoformat()})
+
+
+def add_follow(user_id: int, author_id: int) -> None:
+    at = time.time()
+    _set_follow_overlay(user_id, author_id, removed_at=None)
+    _enqueue({'op': 'follow', 'user_id': user_id, 'author_id': author_id,
+              'at': at})
+
+
+def remove_follow(user_id: int, author_id: int) -> None:
+    """Ставит в очередь отписку: DELETE выполнит _write().
+
+    В кеш кладётся отметка об отписке со временем запроса. Пока она
+    жива, following_ids() не видит автора, а _write() пропускает более
+    старые подписки на него, в том числе из очередей других процессов
+    и из пачек, которые уже пишутся.
+    """
+    at = time.time()
+    _set_follow_overlay(user_id, author_id, removed_at=at)
+    _enqueue({'op': 'unfollow', 'user_id': user_id, 'author_id': author_id,
+              'at': at})
+
+
+def _set_follow_overlay(user_id, author_id, removed_at) -> None:
+    pending_key = follow_graph.PENDING_KEY.format(user_id)
+    removed_key = follow_graph.REMOVED_KEY.format(user_id)
+    cached = cache.get_many((pending_key, removed_key))
+    pending = cached.get(pending_key, frozenset())
+    removed = dict(cached.get(removed_key, {}))
+    if removed_at is None:
+        pending |= {author_id}
+        removed.pop(author_id, None)
+    else:
+        pending -= {author_id}
+        removed[author_id] = removed_at
+    cache.set_many({pending_key: pending, removed_key: removed},
+                   settings.WRITE_BEHIND_OVERLAY_TIMEOUT)
+
+
+def pending_comments(user, post) -> list:
+    """Комментарии пользователя к посту, ещё не записанные в базу."""
+    if not user.is_authenticated:
+        return []
+    pending = cache.get(PENDING_COMMENTS_KEY.format(
+        user_id=user.pk, post_id=post.pk), [])
+    return [Comment(post=post, author=user, text=text, pub_date=pub_date)
+            for text, pub_date in pending]
+
+
+def flush() -> None:
+    """Записывает всё, что накопилось в очереди.
+
+    Если запись не удалась, пачка возвращается в очередь и будет
+    записана при следующем сбросе. Если пачка нарушает ограничения
+    базы, она пишется по одной операции через _write_each().
+    Чужие журналы забираются, только если WRITE_BEHIND включён.
+    """
+    global _timer
+    if settings.WRITE_BEHIND:
+        _recover()
+    with _lock:
+        batch, segments = _queue[:], _segments[:]
+        _queue.clear()
+        _segments.clear()
+        _journal['segment'] += 1
+        _timer = None
+    if not batch:
+        _remove_segments(segments)
+        return
+    try:
+        tags, failed = _write(batch), []
+    except IntegrityError:
+        logger.warning('Пачка из %d операций нарушает ограничения базы, '
+                       'она записывается по одной', len(batch))
+        tags, failed = _write_each(batch)
+    except Exception:
+        logger.exception('Не записана пачка из %d операций, она '
+                         'возвращена в очередь', len(batch))
+        tags, failed = [], batch
+    if failed:
+        with _lock:
+            _queue[:0] = failed
+            _segments[:0] = segments
+        _schedule_flush()
+    cache_tags.purge(*tags)
+    _forget_pending(batch[:len(batch) - len(failed)])
+    if not failed:
+        _remove_segments(segments)
+
+
+def _write_each(batch) -> tuple:
+    """Пишет пачку по одной операции.
+
+    Операция, которую база не принимает (например, комментарий
+    пользователя, удалённого после проверки в _write()), выбрасывается
+    с записью в лог: иначе пачка возвращалась бы в очередь бесконечно.
+    После другой ошибки остаток пачки возвращается в очередь.
+    Возвращает теги устаревших страниц и невыполненный остаток пачки.
+    """
+    tags = []
+    for index, op in enumerate(batch):
+        try:
+            tags += _write([op])
+        except IntegrityError:
+            logger.exception('Операция отброшена: %s',
+                             json.dumps(op, ensure_ascii=False))
+        except Exception:
+            logger.exception('Не записано операций: %d, они возвращены '
+                             'в очередь', len(batch) - index)
+            return tags, batch[index:]
+    return tags, []
+
+
+def _enqueue(op) -> None:
+    with _lock:
+        _append_to_journal(op)
+        _queue.append(op)
+        _register_shutdown()
+        full = len(_queue) >= settings.WRITE_BEHIND_BATCH_SIZE
+    if full:
+        # Не внутри транзакции view: её повтор поставил бы запись дважды.
+        transaction.on_commit(flush)
+    else:
+        _schedule_flush()
+
+
+def _schedule_flush() -> None:
+    global _timer
+    interval = settings.WRITE_BEHIND_FLUSH_INTERVAL
+    with _lock:
+        if _timer is None and interval is not None and _queue:
+            _timer = threading.Timer(interval, _flush_in_background)
+            _timer.daemon = True
+            _timer.start()
+
+
+def _flush_in_background() -> None:
+    try:
+        flush()
+    finally:
+        connections.close_all()
+
+
+def _forget_pending(batch) -> None:
+    """Убирает из кеша записанные операции; новые остаются видны.
+
+    Отметки об отписке не убираются: они истекают сами и до этого
+    отсекают старые подписки из других очередей.
+    """
+    with _lock:
+        queued = {(op['user_id'], op['author_id'])
+                  for op in _queue if op['op'] != 'comment'}
+    comments, follows = {}, {}
+    for op in batch:
+        if op['op'] == 'comment':
+            key = PENDING_COMMENTS_KEY.format(
+                user_id=op['author_id'], post_id=op['post_id'])
+            comments.setdefault(key, set()).add(
+                (op['text'], parse_datetime(op['pub_date'])))
+        elif op['op'] == 'follow' and (
+                op['user_id'], op['author_id']) not in queued:
+            key = follow_graph.PENDING_KEY.format(op['user_id'])
+            follows.setdefault(key, set()).add(op['author_id'])
+    stored = cache.get_many([*comments, *follows])
+    updated, emptied = {}, []
+    for key, written in comments.items():
+        left = [entry for entry in stored.get(key, [])
+                if tuple(entry) not in written]
+        if left:
+            updated[key] = left
+        else:
+            emptied.append(key)
+    for key, written in follows.items():
+        left = stored.get(key, frozenset()) - written
+        if left:
+            updated[key] = left
+        else:
+            emptied.append(key)
+    cache.set_many(updated, settings.WRITE_BEHIND_OVERLAY_TIMEOUT)
+    cache.delete_many(emptied)
+
+
+@retry_on_locked
+@transaction.atomic
+def _write(batch) -> list:
+    """Записывает пачку и возвращает теги страниц, которые устарели."""
+    comments = [Comment(post_id=op['post_id'], author_id=op['author_id'],
+                        text=op['text'])
+                for op in batch if op['op'] == 'comment']
+    post_ids = set(Post.objects.filter(
+        pk__in={comment.post_id for comment in comments},
+    ).values_list('pk', flat=True))
+    author_ids = set(User.objects.filter(
+        pk__in={comment.author_id for comment in comments},
+    ).values_list('pk', flat=True))
+    comments = [comment for comment in comments
+                if comment.post_id in post_ids
+                and comment.author_id in author_ids]
+    Comment.objects.bulk_create(
+        comments, batch_size=settings.WRITE_BEHIND_BATCH_SIZE)
+    post_counts = Counter(comment.post_id for comment in comments)
+    counters.comments_added(post_counts)
+    hot.comments_added(post_counts)
+
+    follows, unfollows = _follow_changes(batch)
+    if unfollows:
+        # Счётчики, ленты и кеши правят обработчики post_delete.
+        Follow.objects.filter(reduce(or_, (
+            Q(user_id=user_id, author_id=author_id)
+            for user_id, author_id in unfollows))).delete()
+    pairs = _new_follows(follows)
+    Follow.objects.bulk_create(
+        [Follow(user_id=user_id, author_id=author_id)
+         for user_id, author_id in pairs],
+        batch_size=settings.WRITE_BEHIND_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    counters.follows_added(pairs)
+    timeline.followers_changed(*{author_id for _, author_id in pairs})
+    for user_id, author_id in pairs:
+        timeline.backfill(user_id, author_id)
+    follow_graph.invalidate(*{user_id for user_id, _ in pairs})
+
+    usernames = User.objects.filter(
+        pk__in={user_id for pair in pairs for user_id in pair},
+    ).values_list('username', flat=True)
+    return [*map(page_cache.post_tag, post_counts),
+            *map(page_cache.author_tag, usernames)]
+
+
+def _follow_changes(batch) -> tuple:
+    """Множества пар (user_id, author_id): на что подписаться, от чего
+    отписаться.
+
+    Для пары действует последняя операция в пачке. Подписка старше
+    отметки об отписке в кеше пропускается: отписку уже записал или
+    запишет тот, кто её принял.
+    """
+    last = {}
+    for op in batch:
+        if op['op'] in ('follow', 'unfollow'):
+            last[op['user_id'], op['author_id']] = op
+    removed = cache.get_many({follow_graph.REMOVED_KEY.format(user_id)
+                              for user_id, _ in last})
+    follows, unfollows = set(), set()
+    for (user_id, author_id), op in last.items():
+        if op['op'] == 'unfollow':
+            unfollows.add((user_id, author_id))
+            continue
+        removed_at = removed.get(
+            follow_graph.REMOVED_KEY.format(user_id), {}).get(author_id)
+        if removed_at is None or removed_at < op['at']:
+            follows.add((user_id, author_id))
+    return follows, unfollows
+
+
+def _new_follows(pairs) -> list:
+    """Пары (user_id, author_id) без уже существующих."""
+    user_ids = {user_id for pair in pairs for user_id in pair}
+    existing_users = set(User.objects.filter(
+        pk__in=user_ids).values_list('pk', flat=True))
+    existing = set(Follow.objects.filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        author_id__in={author_id for _, author_id in pairs},
+    ).values_list('user_id', 'author_id'))
+    return sorted(
+        pair for pair in pairs - existing
+        if set(pair) <= existing_users)
+
+
+def _append_to_journal(op) -> None:
+    """Дописывает операцию в журнал; вызывается под _lock."""
+    if not _claim_journal():
+        return
+    number = _journal['segment']
+    with open(_segment_path(number), 'a') as file:
+        file.write(json.dumps(op, ensure_ascii=False) + '\n')
+    if number not in _segments:
+        _segments.append(number)
+
+
+def _claim_journal() -> bool:
+    """Заводит журнал процесса, в том числе заново после fork()."""
+    directory = settings.WRITE_BEHIND_JOURNAL_DIR
+    if directory is None:
+        return False
+    if (_journal['pid'], _journal['directory']) != (os.getpid(), directory):
+        os.makedirs(directory, exist_ok=True)
+        owner = f'{os.getpid()}-{uuid.uuid4().hex}'
+        lock = open(os.path.join(directory, f'{owner}.lock'), 'a')
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        _journal.update(pid=os.getpid(), directory=directory, owner=owner,
+                        lock=lock, segment=0)
+    return True
+
+
+def _recover() -> None:
+    """Забирает в очередь журналы процессов, которые уже завершились."""
+    directory = settings.WRITE_BEHIND_JOURNAL_DIR
+    if directory is None or fcntl is None or not os.path.isdir(directory):
+        return
+    own = _journal['owner'] if _journal['pid'] == os.getpid() else None
+    for lock_path in glob.glob(os.path.join(directory, '*.lock')):
+        owner = os.path.basename(lock_path)[:-len('.lock')]
+        if owner == own:
+            continue
+        with open(lock_path, 'a') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                continue
+            paths = sorted(
+                glob.glob(os.path.join(directory, f'{owner}.*.jsonl')),
+                key=lambda path: int(path.rsplit('.', 2)[1]))
+            ops = []
+            for path in paths:
+                with open(path) as file:
+                    ops += [json.loads(line) for line in file if line.strip()]
+            with _lock:
+                for op in ops:
+                    _append_to_journal(op)
+                    _queue.append(op)
+                _register_shutdown()
+            for path in paths:
+                os.remove(path)
+            os.remove(lock_path)
+        if ops:
+            logger.warning('Из журнала %s в очередь взято операций: %d',
+                           owner, len(ops))
+
+
+def _remove_segments(segments) -> None:
+    if _journal['pid'] != os.getpid():
+        return
+    for number in segments:
+        try:
+            os.remove(_segment_path(number))
+        except FileNotFoundError:
+            pass
+
+
+def _segment_path(number) -> str:
+    return os.path.join(_journal['directory'],
+                        f'{_journal["owner"]}.{number}.jsonl')
+
+
+def _register_shutdown() -> None:
+    """Ставит _shutdown() на выход из процесса; вызывается под _lock."""
+    global _exit_hook
+    if not _exit_hook:
+        atexit.register(_shutdown)
+        _exit_hook = True
+
+
+def _shutdown() -> None:
+    """При нормальном завершении: сброс очереди и уборка журнала."""
+    flush()
+    if _queue or _journal['pid'] != os.getpid():
+        return
+    _journal['lock'].close()
+    try:
+        os.remove(_journal['lock'].name)
+    except FileNotFoundError:
+        pass
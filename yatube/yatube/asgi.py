@@ -0,0 +1,20 @@
+"""
+ASGI config for yatube project.
+
+Django 2.2 has no native ASGI support, so the WSGI handler is served
+through core.asgi.WsgiToAsgi: the event loop holds the connections and
+views run in a bounded thread pool. The views themselves stay
+synchronous. Run it with any ASGI server, e.g.
+
+    uvicorn yatube.asgi:application
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+from core.asgi import WsgiToAsgi  # noqa: E402
+
+application = WsgiToAsgi(get_wsgi_application())
@@ -48,6 +48,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.QueryBudgetMiddleware',
+    'core.db_router.ReadYourWritesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,7 +64,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -84,11 +86,30 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 с WAL, прагмами и BEGIN IMMEDIATE, см. core.backends.
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение переживает запрос: прагмы и прогретый кеш страниц
+        # не теряются на каждом обращении.
+        'CONN_MAX_AGE': 60,
     }
 }
 
+# Реплики только для чтения. Локально второй SQLite-файл включается
+# переменной YATUBE_REPLICA_DB; его содержимое - копия db.sqlite3,
+# которую нужно обновлять самостоятельно.
+if os.environ.get('YATUBE_REPLICA_DB'):
+    DATABASES['replica'] = {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.environ['YATUBE_REPLICA_DB'],
+        'CONN_MAX_AGE': 60,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -154,3 +175,163 @@ INTERNAL_IPS = [
 ]
 
 COUNT_OF_POSTS_DEFAULT = 10
+
+# Ленты по умолчанию открываются в keyset-режиме (?cursor=) вместо ?page=
+FEED_CURSOR_PAGINATION = False
+
+# Лента подписок: авторы с большим числом подписчиков не раскладываются
+# по лентам при публикации, их посты подмешиваются при чтении.
+TIMELINE_FANOUT_MAX_FOLLOWERS = 1000
+
+TIMELINE_FANOUT_CACHE_TIMEOUT = 300
+
+# Сколько последних постов автора переносить в ленту при подписке
+# (None - все посты).
+TIMELINE_BACKFILL_POSTS = None
+
+TIMELINE_BATCH_SIZE = 500
+
+# Сколько секунд кешируется общее число постов для пагинатора главной.
+POSTS_TOTAL_CACHE_TIMEOUT = 60
+
+# Сколько номеров страниц показывать по обе стороны от текущей.
+PAGINATOR_ON_EACH_SIDE = 3
+
+COUNTERS_BATCH_SIZE = 500
+
+# Карточки постов кешируются надолго и сбрасываются сигналами.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Сколько секунд хранятся страницы, закешированные для анонимов.
+PAGE_CACHE_TIMEOUT = 60 * 5
+
+# Сколько постов ранжирует запасной поиск без FTS5.
+SEARCH_SCAN_LIMIT = 1000
+
+# Миниатюры картинок постов создаются в фоне сразу после загрузки.
+# Размеры должны совпадать с тегами {% thumbnail %} в шаблонах.
+THUMBNAIL_PREGENERATE = True
+
+THUMBNAIL_WORKERS = 2
+
+POST_THUMBNAIL_SIZES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+# Варианты картинок постов для srcset: ширины в пикселях, форматы
+# в порядке предпочтения (последний идёт в <img> как запасной).
+IMAGE_VARIANT_WIDTHS = (480, 960, 1440)
+
+IMAGE_VARIANT_FORMATS = ('avif', 'webp', 'jpeg')
+
+IMAGE_VARIANT_ASPECT = (960, 339)
+
+IMAGE_VARIANT_QUALITY = 80
+
+# Атрибут sizes: ширина карточки поста в разметке.
+IMAGE_VARIANT_SIZES = '(min-width: 1200px) 1110px, 100vw'
+
+POST_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+
+POST_IMAGE_MAX_PIXELS = 40 * 1000 * 1000
+
+# Картинки больше этой стороны уменьшаются один раз при загрузке.
+POST_IMAGE_MAX_SIDE = 2048
+
+POST_IMAGE_QUALITY = 85
+
+# Заголовок Server-Timing с числом запросов и временем SQL и шаблонов.
+QUERY_BUDGET_HEADER = DEBUG
+
+# Сколько запросов к базе может сделать view. Превышение пишется
+# в лог, а тесты проверяют бюджеты через assertQueryBudget.
+QUERY_BUDGETS = {
+    'posts:index': 6,
+    'posts:hot': 6,
+    'posts:group_index': 4,
+    'posts:group_list': 6,
+    'posts:profile': 7,
+    'posts:post_detail': 6,
+    'posts:search': 8,
+    'posts:follow_index': 8,
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.middleware': {
+            'handlers': ['console'],
+            'level': 'WARNING',
+        },
+    },
+}
+
+# Сколько комментариев показывать под постом за раз.
+COMMENTS_PER_PAGE = 20
+
+# Сколько секунд после записи пользователь читает с основной базы.
+REPLICA_PIN_SECONDS = 5
+
+# Сколько раз повторять изменяющий запрос, если SQLite занят другим
+# писателем дольше busy_timeout, и начальная пауза между попытками.
+DB_LOCKED_RETRIES = 3
+DB_LOCKED_RETRY_DELAY = 0.05
+
+# Наибольший размер страницы JSON API (?limit=).
+API_MAX_LIMIT = 100
+
+# Сколько запросов одновременно обрабатывает Django при запуске через
+# yatube.asgi. Соединений цикл событий держит сколько угодно.
+ASGI_THREADS = 16
+
+# Сколько секунд хранится множество подписок пользователя. Подписка
+# и отписка сбрасывают его сразу.
+FOLLOWING_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Лента «Популярное». Комментарий добавляет к счёту поста
+# HOT_COMMENT_WEIGHT, новый пост получает HOT_AUTHOR_WEIGHT * ln(1 +
+# подписчики автора). За HOT_HALF_LIFE секунд счёт уменьшается вдвое;
+# decay_hot_scores запускается по расписанию раз в HOT_DECAY_INTERVAL.
+HOT_COMMENT_WEIGHT = 1.0
+HOT_AUTHOR_WEIGHT = 0.5
+HOT_HALF_LIFE = 60 * 60 * 12
+HOT_DECAY_INTERVAL = 60 * 60
+HOT_SCORE_FLOOR = 0.01
+
+# Каталог групп: сколько самых активных авторов показывать у группы.
+GROUP_TOP_AUTHORS = 3
+# Кеш групп по slug в памяти процесса: срок жизни записи в секундах и
+# наибольшее число записей.
+GROUP_CACHE_TTL = 60 * 5
+GROUP_CACHE_SIZE = 1000
+
+# Ограничение частоты запросов, см. core.ratelimit: scope -> (сколько
+# запросов подряд, за сколько секунд ведро наполняется целиком).
+# Подписка и отписка делят одно ведро. Вёдра хранятся в кеше; при
+# LocMemCache он свой у каждого процесса, и лимит фактически
+# умножается на число процессов сервера. core.ratelimit.DatabaseStorage
+# держит вёдра в общей таблице, но каждый запрос пишет в базу.
+RATE_LIMIT_STORAGE = 'core.ratelimit.CacheStorage'
+RATE_LIMITS = {
+    'post_create': (10, 60),
+    'add_comment': (20, 60),
+    'follow': (30, 60),
+}
+
+# Отложенная запись комментариев и подписок, см. posts.write_queue.
+# Очередь процесса записывается пачкой, когда в ней набирается
+# WRITE_BEHIND_BATCH_SIZE объектов или через WRITE_BEHIND_FLUSH_INTERVAL
+# секунд (None - только по размеру). Свои ещё не записанные комментарии
+# и подписки пользователь видит из кеша до WRITE_BEHIND_OVERLAY_TIMEOUT
+# секунд.
+WRITE_BEHIND = False
+WRITE_BEHIND_BATCH_SIZE = 100
+WRITE_BEHIND_FLUSH_INTERVAL = 1.0
+WRITE_BEHIND_OVERLAY_TIMEOUT = 60
+# Журналы очередей: операция дописывается сюда до записи в базу, чтобы
+# очередь убитого процесса записал другой. None - без журнала.
+WRITE_BEHIND_JOURNAL_DIR = os.path.join(BASE_DIR, 'write_behind')